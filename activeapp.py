@@ -1,43 +1,18 @@
-import sqlite3
+import threading
+
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import re
-from shiny import App, reactive, render, ui
-from shinywidgets import output_widget, render_plotly
-
-# Function to load data from SQLite database
-def load_data_from_db():
-    # Connect to the SQLite database
-    conn = sqlite3.connect('siggi_timataka.db')
-
-    # Load data into DataFrames using SQL queries
-    summary_data = pd.read_sql_query("SELECT * FROM siggi_hlaup_summary", conn)
-    hlaup_data = pd.read_sql_query("SELECT * FROM timataka", conn)
-    ar_data = pd.read_sql_query("SELECT * FROM ar_id_table", conn)
-
-    # Close the database connection
-    conn.close()
-    
-    return summary_data, hlaup_data, ar_data
-
-# Function that filters data based on 'IDs' and 'hlaup_id'
-def get_filtered_data_for_ids(hlaup_data, ids_str):
-    ids_list = ids_str.split(", ")
-    ids_list = [int(id_) for id_ in ids_list]
-    filtered_data = hlaup_data[hlaup_data['hlaup_id'].isin(ids_list)]
-    # Sort data by 'hlaup_id' in ascending order
-    filtered_data = filtered_data.sort_values('hlaup_id')
-    return filtered_data
-
-# Function to convert time string to seconds
-def time_to_seconds(time_str):
-    try:
-        return pd.to_timedelta(time_str).total_seconds()
-    except:
-        try:
-            return pd.to_timedelta('00:' + time_str).total_seconds()
-        except:
-            return None
+from shiny import App, reactive, render, req, ui
+from shiny.types import SilentCancelOutputException
+
+from api import mount_api
+from background import BackgroundValue, background_calc, db_version, executor, watch_db_version
+from data_grid import page_count
+from downsample import level_of_detail, max_points, render_mode
+from figure_cache import background_plotly, cached_plotly_json
+from metrics import timed_calc, timed_output, with_metrics_route
+from race_data import get_race_data, store
+from trend import LinearTrend, rolling_trend, theil_sen
 
 # Function to format seconds into 'HH:MM:SS' format
 def format_seconds_to_hhmmss(seconds):
@@ -49,463 +24,819 @@ def format_seconds_to_hhmmss(seconds):
     secs = seconds % 60
     return f"{hours}:{minutes:02d}:{secs:02d}"
 
+# Sekúndur á sniðinu 'H:MM:SS', eða 'M:SS' ef tíminn er undir klukkustund
+def format_seconds(total_seconds):
+    if pd.isnull(total_seconds):
+        return None
+    total_seconds = int(total_seconds)
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    else:
+        return f"{minutes}:{seconds:02d}"
+
+# plotly.express og shinywidgets (sem sækir ipywidgets og IPython) eru ekki
+# sótt fyrr en fyrsta myndin er teiknuð eða síðan er fyrst sótt, svo að
+# ferlið sé fljótt að ræsa sig
+#
+# Línuritin taka við sýnilega bili x-ássins, 'x_range' (allur ásinn ef None),
+# og teikna aðeins punktana sem level_of_detail velur fyrir það bil.
+# Heildarfjöldi punkta er geymdur í 'layout.meta' svo að server viti hvort
+# sækja þurfi nánari gögn þegar notandinn þysjar (sjá follow_zoom).
+
+# Línurit fyrir 'Heim' flipann
+def build_home_chart(race, chart_type):
+    import plotly.express as px
+
+    summary_data = race.summary_data
+    if chart_type == 'Pie Chart':
+        fig = px.pie(summary_data, values='Count', names='Length', title="Hlutfall hlaupa eftir lengd")
+    else:
+        fig = px.bar(summary_data, x='Length', y='Count', title="Fjöldi hlaupa eftir lengd")
+    return fig
+
+# Línurit fyrir sæti miðað við fjölda keppenda í síðustu 'num_races'
+# hlaupunum, í tímaröð (sjá timataka_db.athlete_rank_metrics)
+def build_rank_plot(race, num_races, x_range=None):
+    import plotly.express as px
+
+    metrics = race.rank_metrics.tail(num_races)
+    data = level_of_detail(metrics, 'race_number', 'percentile', x_range)
+
+    fig = px.line(
+        data,
+        x='race_number',
+        y='percentile',
+        title="Röðun í hlaupum miðað við fjölda keppenda",
+        labels={'race_number': 'Hlaup (í tímaröð)', 'percentile': 'Á undan (% keppenda)'},
+        hover_data={
+            'hlaup_id': True,
+            'Sæti': [format_rank(rank, size) for rank, size in zip(data['rank'], data['field_size'])],
+            'Á eftir sigurvegara': data['gap_s'].map(format_seconds).to_numpy(),
+            'Breyting í röð': data['streak'].to_numpy(),
+        },
+        render_mode=render_mode(len(metrics)),
+    )
+    fig.update_traces(mode='lines+markers')
+    fig.update_layout(yaxis=dict(range=[0, 102]), meta=len(metrics))
+
+    return fig
+
+# Mesti fjöldi merkja á tíma-ás bætingaritsins
+max_tick_count = 20
+
+# Línurit fyrir bætingar yfir tíma. Hlaupin eru sneið af framvindu
+# hlauparans (race.progression), þegar í tímaröð með tímana í sekúndum.
+def build_improvement_line_chart(race, selected_length, x_range=None):
+    import plotly.express as px
+
+    data = race.progression.for_length(selected_length)
+    if data.empty:
+        return px.line(title="Engin gögn til að sýna.")
+
+    # Athuga hvort tímar séu til staðar, annars eru hringir sýndir
+    if data['time_s'].notna().any():
+        data = data[data['time_s'].notna()]
+        shown = level_of_detail(data, 'seq', 'time_s', x_range)
+
+        # Línurit með hlaupunum í tímaröð á x-ásnum og tímanum á y-ásnum
+        fig = px.line(
+            shown,
+            x='seq',
+            y='time_s',
+            title=f"Framvinda: Tími fyrir {selected_length}",
+            labels={'seq': 'Hlaup (í tímaröð)', 'time_s': 'Tími (HH:MM:SS)'},
+            hover_data={'hlaup_id': True, 'Ár': shown['year'].to_numpy(dtype=float, na_value=np.nan)},
+            render_mode=render_mode(len(data)),
+        )
+        fig.update_traces(mode='lines+markers')
+
+        # Bæta við formattaðri tímalengd í sveimaupplýsingum
+        fig.update_traces(
+            hovertemplate='Hlaup ID: %{customdata[0]}<br>Ár: %{customdata[1]}<br>Tími: %{text}',
+            text=shown['time_s'].map(format_seconds_to_hhmmss).to_numpy()
+        )
+
+        # Sérsníða y-ásinn til að sýna tímann í 'HH:MM:SS' sniði. Merkin eru
+        # reiknuð úr öllum gögnunum svo þau haldist þegar þysjað er, en ekki
+        # fleiri en 'max_tick_count'
+        y_ticks = np.unique(data['time_s'].to_numpy())
+        if len(y_ticks) > max_tick_count:
+            y_ticks = y_ticks[np.linspace(0, len(y_ticks) - 1, max_tick_count).astype(int)]
+        y_ticktext = [format_seconds_to_hhmmss(t) for t in y_ticks]
+
+        fig.update_yaxes(
+            tickmode='array',
+            tickvals=y_ticks,
+            ticktext=y_ticktext
+        )
+        fig.update_layout(meta=len(data))
+
+        return fig
+    elif data['laps'].notna().any():
+        # Fyrir 'Laps' gögn
+        data = data[data['laps'].notna()]
+        shown = level_of_detail(data, 'seq', 'laps', x_range)
+
+        fig = px.line(
+            shown,
+            x='seq',
+            y='laps',
+            title=f"Hringir fyrir {selected_length}",
+            labels={'seq': 'Hlaup (í tímaröð)', 'laps': 'Fjöldi hringja'},
+            hover_data={'hlaup_id': True, 'Ár': shown['year'].to_numpy(dtype=float, na_value=np.nan)},
+            render_mode=render_mode(len(data)),
+        )
+        fig.update_traces(
+            mode='lines+markers',
+            hovertemplate='Hlaup ID: %{customdata[0]}<br>Ár: %{customdata[1]}<br>Hringir: %{y}',
+        )
+        fig.update_layout(meta=len(data))
+
+        return fig
+    else:
+        return px.line(title="Engin gögn til að sýna.")
+
+# Sía eftir vegalengd fyrir 'Hraði' flipann
+def speed_data(race, distance_range):
+    # "5" er allar vegalengdir, annars síum við eftir vegalengdarflokki
+    return race.speed_series(None if distance_range == "5" else int(distance_range))
+
+# Fjöldi hlaupa í hlaupandi hallalínunni
+trend_window = 20
+
+# Hallalínur hraðans yfir sýnilega bilið: aðfallslína úr summum allra
+# vegalengdarflokka sem voru reiknaðar við innsetningu (race.speed_trends),
+# og hlaupandi og Theil–Sen línur úr öllum punktunum, faldar þar til smellt
+# er á þær í skýringunni. Ferlarnir eru alltaf jafn margir svo að follow_zoom
+# geti skipt gögnunum út.
+def add_speed_trends(fig, race, data, shown, x_range):
+    x, y = data['hlaup_id'].to_numpy(dtype=float), data['Speed_m_s'].to_numpy(dtype=float)
+    x_ends = shown['hlaup_id'].iloc[[0, -1]].to_numpy(dtype=float)
+    if race.speed_trends:
+        linear = sum(race.speed_trends.values(), LinearTrend())
+    else:
+        linear = LinearTrend.fit(x, y)
+
+    for name, coefficients, dash in (
+        ("Aðfallslína", linear.coefficients(), None),
+        ("Theil–Sen", theil_sen(x, y), 'dash'),
+    ):
+        slope, intercept = coefficients or (0.0, np.nan)
+        fig.add_scatter(
+            x=x_ends, y=slope * x_ends + intercept, mode='lines', name=name, line=dict(dash=dash),
+            hoverinfo='skip', visible=True if dash is None else 'legendonly',
+        )
+
+    rolling = level_of_detail(
+        pd.DataFrame({'hlaup_id': x, 'fit': rolling_trend(x, y, trend_window)}), 'hlaup_id', 'fit', x_range
+    )
+    fig.add_scatter(
+        x=rolling['hlaup_id'], y=rolling['fit'], mode='lines', name=f"Síðustu {trend_window} hlaup",
+        line=dict(dash='dot'), hoverinfo='skip', visible='legendonly',
+    )
+
+# Línurit fyrir hraða í 'Hraði' flipanum
+def build_speed_line_chart(race, distance_range, x_range=None):
+    import plotly.express as px
+
+    data = speed_data(race, distance_range)
+    if data.empty:
+        return px.scatter(title="Engin gögn til að sýna.")
+
+    # Formattaðri vegalengd og tíma er bætt við sveimaupplýsingarnar án þess
+    # að breyta gögnunum
+    shown = level_of_detail(data, 'hlaup_id', 'Speed_m_s', x_range)
+    hover_data = {
+        'Name': True,
+        'Distance_km': (shown['Distance_m'] / 1000).to_numpy(),
+        'Time_formatted': shown['Time_in_seconds'].map(format_seconds_to_hhmmss).to_numpy(),
+    }
+
+    if distance_range == "5":
+        # Fyrir allar vegalengdir, búa til punktarit með hallalínum (sjá add_speed_trends)
+        fig = px.scatter(
+            shown,
+            x='hlaup_id',
+            y='Speed_m_s',
+            title="Hraði (m/s) fyrir öll hlaup",
+            labels={'hlaup_id': 'Hlaup ID', 'Speed_m_s': 'Hraði (m/s)'},
+            hover_data=hover_data,
+            render_mode=render_mode(len(data)),
+        )
+        fig.update_traces(
+            hovertemplate='Hlaup ID: %{x}<br>Nafn: %{customdata[0]}<br>Vegalengd: %{customdata[1]:.2f} km<br>Tími: %{customdata[2]}<br>Hraði: %{y:.2f} m/s'
+        )
+        add_speed_trends(fig, race, data, shown, x_range)
+    else:
+        # Fyrir ákveðin vegalengdarbil, halda áfram með línurit
+        fig = px.line(
+            shown,
+            x='hlaup_id',
+            y='Speed_m_s',
+            title="Hraði (m/s) eftir hlaup ID",
+            labels={'hlaup_id': 'Hlaup ID', 'Speed_m_s': 'Hraði (m/s)'},
+            hover_data=hover_data,
+            markers=True,
+            render_mode=render_mode(len(data)),
+        )
+        fig.update_traces(
+            hovertemplate='Hlaup ID: %{x}<br>Nafn: %{customdata[0]}<br>Vegalengd: %{customdata[1]:.2f} km<br>Tími: %{customdata[2]}<br>Hraði: %{y:.2f} m/s'
+        )
+
+    # Snúa x-ásnum til að hafa hlaup_id í lækkandi röð
+    fig.update_layout(xaxis=dict(autorange='reversed'), meta=len(data))
+    return fig
+
+# Sæti af fjölda keppenda í hlaupinu, t.d. '3/120'
+def format_rank(rank, field_size):
+    if pd.isnull(rank):
+        return None
+    if pd.isnull(field_size):
+        return f"{int(rank)}"
+    return f"{int(rank)}/{int(field_size)}"
+
+# Heiti vegalengdarflokkanna (sjá race_metrics.distance_classes); 0 er utan flokka
+distance_class_labels = {
+    1: "1KM - 9.9KM",
+    2: "10KM - 19.9KM",
+    3: "20KM - 39.9KM",
+    4: "40KM - 100KM",
+    0: "Aðrar",
+}
+
+# Fjöldi hlaupa á hverju ári eftir vegalengdarflokki, úr samantektartöflunni
+def build_year_chart(rollups):
+    import plotly.express as px
+
+    if rollups.empty:
+        return px.bar(title="Engin gögn til að sýna.")
+    data = rollups.assign(Vegalengd=rollups['distance_class'].map(distance_class_labels))
+    fig = px.bar(
+        data,
+        x='year',
+        y='races',
+        color='Vegalengd',
+        category_orders={'Vegalengd': list(distance_class_labels.values())},
+        title="Fjöldi hlaupa eftir ári og vegalengd",
+        labels={'year': 'Ár', 'races': 'Fjöldi hlaupa'},
+    )
+    fig.update_xaxes(dtick=1)
+    return fig
+
+# Hraði á km (mín/km) á sniðinu 'M:SS'
+def format_pace(minutes):
+    if pd.isnull(minutes):
+        return None
+    seconds = int(round(minutes * 60))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+# Hlaup hlauparans sem hafa millitíma, sem {id niðurstöðu: lýsing}, nýjustu fyrst
+def split_choices(race):
+    data = race.hlaup_data
+    data = data[data['Has_split']].sort_values('hlaup_id', ascending=False)
+    choices = {}
+    for id_, hlaup_id, length, ar in zip(data['id'], data['hlaup_id'], data['Length'], data['ar']):
+        year = '' if pd.isnull(ar) else f" ({int(ar)})"
+        choices[str(id_)] = f"{hlaup_id}: {length if isinstance(length, str) else '?'}{year}"
+    return choices
+
+# Leggir einnar niðurstöðu ásamt miðgildi allra hlaupara í hlaupinu á hverjum legg
+def split_table(race, result_id):
+    row = race.hlaup_data[race.hlaup_data['id'] == result_id]
+    if row.empty:
+        return pd.DataFrame()
+    segments = store.race_splits(int(row['hlaup_id'].iloc[0]))
+    medians = segments.groupby('checkpoint_idx')[['segment_s', 'segment_pace_min_km']].median()
+    data = segments[segments['result_id'] == result_id].copy()
+    data['field_segment_s'] = data['checkpoint_idx'].map(medians['segment_s'])
+    data['field_pace_min_km'] = data['checkpoint_idx'].map(medians['segment_pace_min_km'])
+    data['label'] = [f"{idx + 1}. {name or '?'}" for idx, name in zip(data['checkpoint_idx'], data['checkpoint_name'])]
+    return data
+
+# Hraði hvers leggs (mín/km) borinn saman við miðgildi allra hlaupara, eða
+# tími leggsins ef vegalengdirnar koma ekki fram í nöfnum millitímapunktanna
+def build_split_chart(data):
+    import plotly.graph_objects as go
+
+    if data.empty:
+        return go.Figure(layout={'title': "Engir millitímar til að sýna."})
+    if data['segment_pace_min_km'].notna().all():
+        mine, field = data['segment_pace_min_km'], data['field_pace_min_km']
+        title, y_title = "Hraði á hverjum legg", "Hraði (mín/km)"
+    else:
+        mine, field = data['segment_s'] / 60, data['field_segment_s'] / 60
+        title, y_title = "Tími á hverjum legg", "Tími (mín)"
+
+    fig = go.Figure([
+        go.Bar(x=data['label'], y=mine, name="Hlaupari"),
+        go.Bar(x=data['label'], y=field, name="Miðgildi allra"),
+    ])
+    fig.update_layout(title=title, barmode='group', xaxis_title="Millitímapunktur", yaxis_title=y_title)
+    return fig
+
+# Töflurnar í 'Bætingar', 'Ár' og 'Millitímar' flipunum, úr sömu gögnum og
+# úttökin lesa, svo að render_all.py geti einnig flutt þær út
+
+# Tímar eða hringir með 'ar' og 'hlaup_id' úr framvindu einnar lengdar
+def improvement_table(data):
+    if data.empty:
+        return pd.DataFrame({"Skilaboð": ["Engin gögn til að sýna."]})
+
+    if data['time_s'].notna().any():
+        data = data.dropna(subset=['year', 'time_s'])
+
+        # Nota formattaða tímalengd
+        return pd.DataFrame({
+            'ar': data['year'].to_numpy(),
+            'hlaup_id': data['hlaup_id'].to_numpy(),
+            'Time_formatted': data['time_s'].map(format_seconds).to_numpy(),
+        })
+    elif data['laps'].notna().any():
+        # Fyrir 'Laps' gögn
+        data = data.dropna(subset=['year', 'laps'])
+        return pd.DataFrame({
+            'ar': data['year'].to_numpy(),
+            'hlaup_id': data['hlaup_id'].to_numpy(),
+            'Laps': data['laps'].to_numpy(),
+        })
+    else:
+        return pd.DataFrame({"Skilaboð": ["Engin gögn til að sýna."]})
+
+# Persónuleg met einnar lengdar í tímaröð, með bætingu frá fyrra meti og
+# sæti af fjölda í hlaupinu; línurnar eru merktar í framvindunni
+def pb_history(data):
+    timed = data['time_s'].notna().any()
+    data = data[data['is_pb'] & data['time_s' if timed else 'laps'].notna()]
+    if data.empty:
+        return pd.DataFrame({"Skilaboð": ["Engin met til að sýna."]})
+
+    if timed:
+        record = data['time_s'].map(format_seconds)
+        improvement = (-data['delta_time_s']).map(format_seconds)
+    else:
+        record = data['laps'].astype(str) + " hringir"
+        improvement = data['delta_laps'].map(lambda laps: None if pd.isnull(laps) else f"{int(laps):+d}")
+    return pd.DataFrame({
+        'Ár': data['year'].to_numpy(),
+        'Hlaup ID': data['hlaup_id'].to_numpy(),
+        'Met': record.to_numpy(),
+        'Bæting': improvement.to_numpy(),
+        'Sæti': [format_rank(rank, size) for rank, size in zip(data['rank'], data['field_size'])],
+    })
+
+# Samantekt eftir ári og vegalengdarflokki (store.rollups)
+def year_summary(rollups):
+    if rollups.empty:
+        return pd.DataFrame({"Skilaboð": ["Engin gögn til að sýna."]})
+    return pd.DataFrame({
+        'Ár': rollups['year'],
+        'Vegalengd': rollups['distance_class'].map(distance_class_labels),
+        'Hlaup': rollups['races'],
+        'Besti tími': rollups['best_time_s'].apply(format_seconds_to_hhmmss),
+        'Miðgildi hraða (km/klst)': (rollups['median_speed_m_s'] * 3.6).round(1),
+        'Besta sæti': rollups['best_rank'].astype('Int64'),
+    })
+
+# Leggir einnar niðurstöðu (split_table) ásamt miðgildum allra hlaupara
+def split_summary(data):
+    if data.empty:
+        return pd.DataFrame({"Skilaboð": ["Engir millitímar til að sýna."]})
+    return pd.DataFrame({
+        'Millitímapunktur': data['label'],
+        'Tími': data['elapsed_s'].apply(format_seconds_to_hhmmss),
+        'Leggur': data['segment_s'].apply(format_seconds_to_hhmmss),
+        'Vegalengd (km)': (data['segment_m'] / 1000).round(2),
+        'Hraði (mín/km)': data['segment_pace_min_km'].apply(format_pace),
+        'Miðgildi leggs': data['field_segment_s'].apply(format_seconds_to_hhmmss),
+        'Miðgildi hraða': data['field_pace_min_km'].apply(format_pace),
+    })
+
+# Plotly myndirnar og öll möguleg gildi inntaksins sem hver þeirra tekur
+figure_builders = {
+    'home_chart': build_home_chart,
+    'rank_plot': build_rank_plot,
+    'improvement_line_chart': build_improvement_line_chart,
+    'speed_line_chart': build_speed_line_chart,
+}
+
+def figure_choices(race):
+    return {
+        'home_chart': ['Pie Chart', 'Bar Chart'],
+        'rank_plot': list(range(5, 101)),
+        'improvement_line_chart': list(race.summary_data['Length']),
+        'speed_line_chart': ['1', '2', '3', '4', '5'],
+    }
+
+# Plotly mynd fyrir eitt inntaksgildi, úr skyndiminninu ef hún er þar,
+# annars búin til í bakgrunnsþræði úttaksins ('background')
+def figure_for(race, name, value, background):
+    key = (name, value, race.key)
+    return background_plotly(background, key, lambda: figure_builders[name](race, value))
+
+# (hlaupari, útgáfa) gagnanna sem búið er að hita upp eða er verið að hita upp
+_warmed_versions = set()
+_warm_up_lock = threading.Lock()
+
+# Reikna allar samsetningar myndanna fyrirfram í bakgrunnsþræði, einu sinni
+# fyrir hvern hlaupara og útgáfu gagnanna. Session sem biður um mynd áður en hún er
+# tilbúin teiknar hana sjálft og setur í skyndiminnið.
+def warm_up_figures(race):
+    with _warm_up_lock:
+        if race.key in _warmed_versions:
+            return
+        _warmed_versions.add(race.key)
+
+    def warm_up():
+        for name, values in figure_choices(race).items():
+            for value in values:
+                key = (name, value, race.key)
+                cached_plotly_json(key, lambda: figure_builders[name](race, value))
+
+    threading.Thread(target=warm_up, name='warm_up_figures', daemon=True).start()
+
+# Fjöldi hlaupara sem nafnaleitin sýnir
+athlete_search_limit = 20
+
 # UI - Notendaviðmót
-app_ui = ui.page_fluid(
-    ui.tags.style("""
-        table.dataframe {
-            width: 100%;
-            border-collapse: collapse;
-        }
-        table.dataframe th, table.dataframe td {
-            border: 1px solid #ddd;
-            padding: 8px;
-        }
-        table.dataframe tr:nth-child(even) {
-            background-color: #f2f2f2;
-        }
-        table.dataframe tr:hover {
-            background-color: #ddd;
-        }
-        table.dataframe th {
-            padding-top: 12px;
-            padding-bottom: 12px;
-            text-align: left;
-            background-color: #4CAF50;
-            color: white;
-        }
-    """),
-    ui.navset_tab(
-        ui.nav_panel(
-            "Heim",
-            ui.layout_sidebar(
-                ui.sidebar(
-                    ui.h3("Valmöguleikar"),
-                    ui.input_slider("num_races", "Fjöldi hlaupa í Rank línuriti:", min=5, max=100, value=10),
-                    ui.input_radio_buttons("chart_type", "Veldu grafgerð:", choices=['Pie Chart', 'Bar Chart'], selected='Pie Chart'),
-                ),
-                ui.div(
-                    output_widget("home_chart"),
-                    output_widget("rank_plot"),
-                )
-            )
+# Fall frekar en fast gildi svo að shinywidgets sé aðeins sótt þegar síðan er fyrst sótt
+def app_ui(request):
+    from shinywidgets import output_widget
+
+    return ui.page_fluid(
+        ui.tags.style("""
+            table.dataframe {
+                width: 100%;
+                border-collapse: collapse;
+            }
+            table.dataframe th, table.dataframe td {
+                border: 1px solid #ddd;
+                padding: 8px;
+            }
+            table.dataframe tr:nth-child(even) {
+                background-color: #f2f2f2;
+            }
+            table.dataframe tr:hover {
+                background-color: #ddd;
+            }
+            table.dataframe th {
+                padding-top: 12px;
+                padding-bottom: 12px;
+                text-align: left;
+                background-color: #4CAF50;
+                color: white;
+            }
+        """),
+        # Aðeins niðurstöður nafnaleitarinnar (sjá timataka_db.search_athletes)
+        # eru sendar í vafrann, svo listinn yfir hlaupara er aldrei allur
+        # sendur. Leitin tekur ekki eftir broddstöfum eða smávægilegum
+        # stafsetningarvillum ('sigurjon sturluson').
+        ui.row(
+            ui.column(4, ui.input_text("athlete_query", "Leita að hlaupara:", placeholder="Nafn hlaupara")),
+            ui.column(4, ui.input_selectize("athlete", "Hlaupari:", choices=[])),
         ),
-        ui.nav_panel(
-            "Bætingar",
-            ui.layout_sidebar(
-                ui.sidebar(
-                    ui.input_select("length_select", "Veldu hlaup:", choices=[]),
-                ),
-                ui.div(
-                    ui.h2("Bætingar yfir tíma"),
-                    ui.row(
-                        ui.column(6, output_widget("improvement_line_chart")),
-                        ui.column(6, ui.output_table("improvement_time_table"))
+        ui.navset_tab(
+            ui.nav_panel(
+                "Heim",
+                ui.layout_sidebar(
+                    ui.sidebar(
+                        ui.h3("Valmöguleikar"),
+                        ui.input_slider("num_races", "Fjöldi hlaupa í Rank línuriti:", min=5, max=100, value=10),
+                        ui.input_radio_buttons("chart_type", "Veldu grafgerð:", choices=['Pie Chart', 'Bar Chart'], selected='Pie Chart'),
+                    ),
+                    ui.div(
+                        output_widget("home_chart"),
+                        output_widget("rank_plot"),
                     )
                 )
-            )
-        ),
-        ui.nav_panel(
-            "Hraði",
-            ui.layout_sidebar(
-                ui.sidebar(
-                    ui.h3("Veldu vegalengd"),
-                    ui.input_radio_buttons(
-                        "distance_range",
-                        "Veldu bil:",
-                        choices={
-                            "1": "1KM - 9.9KM",
-                            "2": "10KM - 19.9KM",
-                            "3": "20KM - 39.9KM",
-                            "4": "40KM - 100KM",
-                            "5": "Allar vegalengdir"
-                        },
-                        selected="1"
+            ),
+            ui.nav_panel(
+                "Bætingar",
+                ui.layout_sidebar(
+                    ui.sidebar(
+                        ui.input_select("length_select", "Veldu hlaup:", choices=[]),
+                    ),
+                    ui.div(
+                        ui.h2("Bætingar yfir tíma"),
+                        ui.row(
+                            ui.column(6, output_widget("improvement_line_chart")),
+                            ui.column(6, ui.output_table("improvement_time_table"))
+                        ),
+                        ui.h3("Persónuleg met"),
+                        ui.output_table("pb_history_table"),
                     )
-                ),
+                )
+            ),
+            ui.nav_panel(
+                "Hraði",
+                ui.layout_sidebar(
+                    ui.sidebar(
+                        ui.h3("Veldu vegalengd"),
+                        ui.input_radio_buttons(
+                            "distance_range",
+                            "Veldu bil:",
+                            choices={**{str(k): v for k, v in distance_class_labels.items() if k}, "5": "Allar vegalengdir"},
+                            selected="1"
+                        )
+                    ),
+                    ui.div(
+                        output_widget("speed_line_chart")
+                    )
+                )
+            ),
+            ui.nav_panel(
+                "Ár",
                 ui.div(
-                    output_widget("speed_line_chart")
+                    output_widget("year_chart"),
+                    ui.output_table("year_table"),
                 )
-            )
-        ),
-        ui.nav_panel(
-            "Gögn",
-            ui.h2("Gögn um hlaup"),
-            ui.input_select("table_select", "Veldu töflu:", choices=['hlaup_data', 'summary_data', 'ar_data']),
-            ui.output_table("selected_data_table")
-        ),
-        ui.nav_panel(
-            "Um",
-            ui.h2("Um þetta forrit"),
-            ui.p("Þetta er fágað Shiny forrit sem sýnir gögn um hlaup Sigurjóns Ernis frá Timataka.net.")
+            ),
+            ui.nav_panel(
+                "Millitímar",
+                ui.layout_sidebar(
+                    ui.sidebar(
+                        ui.input_select("split_result", "Veldu hlaup:", choices=[]),
+                    ),
+                    ui.div(
+                        output_widget("split_chart"),
+                        ui.output_table("split_time_table"),
+                    )
+                )
+            ),
+            ui.nav_panel(
+                "Gögn",
+                ui.h2("Gögn um hlaup"),
+                ui.input_select("table_select", "Veldu töflu:", choices=['hlaup_data', 'summary_data', 'ar_data']),
+                ui.row(
+                    ui.column(3, ui.input_select("table_sort", "Raða eftir:", choices=[])),
+                    ui.column(3, ui.input_radio_buttons("table_order", "Röð:", choices={"asc": "Hækkandi", "desc": "Lækkandi"}, selected="asc", inline=True)),
+                    ui.column(2, ui.input_text("table_filter", "Sía:", "")),
+                    ui.column(2, ui.input_select("table_page_size", "Línur á síðu:", choices=['25', '50', '100'], selected='25')),
+                    ui.column(2, ui.input_numeric("table_page", "Síða:", value=1, min=1)),
+                ),
+                ui.output_text("table_page_info"),
+                ui.output_table("selected_data_table")
+            ),
+            ui.nav_panel(
+                "Um",
+                ui.h2("Um þetta forrit"),
+                ui.p("Þetta er fágað Shiny forrit sem sýnir gögn um hlaup Sigurjóns Ernis og annarra hlaupara frá Timataka.net.")
+            ),
         ),
-    ),
-    title="Sigurjón Ernir á Timataka.net",
-)
+        title="Sigurjón Ernir á Timataka.net",
+    )
 
 # Server - Bakendinn
 def server(input, output, session):
-    # Hlaða gögnum úr SQLite gagnagrunninum
-    summary_data, hlaup_data, ar_data = load_data_from_db()
-
-    # Endurnefna 'id' í 'hlaup_id' ef nauðsyn krefur
-    if 'id' in ar_data.columns:
-        ar_data = ar_data.rename(columns={'id': 'hlaup_id'})
-    elif 'hlaupID' in ar_data.columns:
-        ar_data = ar_data.rename(columns={'hlaupID': 'hlaup_id'})
-    else:
-        # Ef 'hlaup_id' dálkurinn finnst ekki
-        raise KeyError("'hlaup_id' column not found in ar_data")
-
-    # Gakktu úr skugga um að 'hlaup_id' sé til staðar í hlaup_data
-    if 'hlaup_id' not in hlaup_data.columns:
-        raise KeyError("'hlaup_id' column not found in hlaup_data")
-
-    # Gera 'hlaup_id' dálkinn að sama gagnagerð
-    hlaup_data['hlaup_id'] = hlaup_data['hlaup_id'].astype(int)
-    ar_data['hlaup_id'] = ar_data['hlaup_id'].astype(int)
-
-    # Sameina hlaup_data og ar_data til að fá 'ar' fyrir hvert 'hlaup_id'
-    hlaup_data = hlaup_data.merge(ar_data[['hlaup_id', 'ar']], on='hlaup_id', how='left')
-
-    # --- Nýr kóði til að nota lengdartöfluna ---
-
-    # Búa til streng með töflunni
-    length_table_str = """
-Length	Count	IDs
-10KM	8	1002, 1145, 1170, 1223, 1229, 1260, 74, 808
-12KM	1	175
-14KM	1	1214
-17.5KM	3	1072, 1219, 566
-17.6KM	1	196
-19KM	1	711
-21KM	4	1076, 66, 69, 96
-22KM	0	1003
-23KM	1	828
-24KM	2	1005, 554
-27KM	1	1167
-28KM	1	748
-30.6KM	1	557
-32.7KM	2	738, 924
-32KM	1	13
-37KM	1	36
-42KM	6	222, 227, 655, 837, 963, 974
-50KM	3	210, 61, 679
-53KM	1	237
-55KM	1	487
-5KM	4	1110, 1156, 185, 261
-63KM	1	3
-8.3KM	1	573
-Backyard	3	317, 360, 469
-Puffin	4	110, 375, 585, 617
-Unknown	4	127, 437, 525, 548
-"""
-
-    # Lesa strenginn inn í DataFrame
-    from io import StringIO
-    length_df = pd.read_csv(StringIO(length_table_str), sep='\t')
-
-    # Útvíkka 'IDs' dálkinn til að fá einn 'hlaup_id' á hverja línu
-    length_df_expanded = length_df.drop('Count', axis=1).copy()
-    length_df_expanded = length_df_expanded.assign(
-        hlaup_id=length_df_expanded['IDs'].str.split(', ')
-    ).explode('hlaup_id')
-    length_df_expanded = length_df_expanded.drop('IDs', axis=1)
-    length_df_expanded['hlaup_id'] = length_df_expanded['hlaup_id'].astype(int)
-
-    # Búa til 'Distance_m' dálk úr 'Length'
-    def length_to_meters(length_str):
-        try:
-            match = re.search(r'(\d+(?:\.\d+)?)', length_str)
-            if match:
-                distance_km = float(match.group(1))
-                distance_m = distance_km * 1000
-                return distance_m
-            else:
-                return None
-        except:
-            return None
+    from shinywidgets import render_plotly
 
-    length_df_expanded['Distance_m'] = length_df_expanded['Length'].apply(length_to_meters)
+    # Gögn eru lesin og myndir búnar til í bakgrunnsþráðum (sjá background.py)
+    # og ný gögn sótt þegar gagnagrunnurinn breytist
+    watch_db_version()
 
-    # Sameina við hlaup_data á 'hlaup_id'
-    hlaup_data = hlaup_data.merge(length_df_expanded[['hlaup_id', 'Distance_m']], on='hlaup_id', how='left')
+    # Myndir sjálfgefna hlauparans eru reiknaðar fyrirfram; annarra þegar um þær er beðið
+    executor.submit(lambda: warm_up_figures(get_race_data()))
 
-    # --- Lok nýs kóða ---
+    # Valmöguleikarnir eru niðurstöður leitarinnar; valinn hlaupari er alltaf
+    # fremstur svo að hann breytist ekki fyrr en annar er valinn úr listanum
+    @reactive.Effect
+    def update_athletes():
+        db_version()
+        query = input.athlete_query()
+        athletes = store.athletes()
+        with reactive.isolate():
+            selected = int(input.athlete()) if input.athlete.is_set() and input.athlete() else None
+        if selected not in athletes:
+            selected = store.default_athlete()
+        choices = {selected: athletes[selected]}
+        if query.strip():
+            choices.update(store.search_athletes(query, athlete_search_limit))
+        ui.update_selectize(
+            "athlete",
+            choices={str(athlete_id): name for athlete_id, name in choices.items()},
+            selected=str(selected),
+        )
 
-    # Umbreyta 'Time' í sekúndur
-    hlaup_data['Time_in_seconds'] = hlaup_data['Time'].apply(time_to_seconds)
+    # Sækja sameiginlegu gögnin fyrir valinn hlaupara; þau eru lesin einu
+    # sinni fyrir allt ferlið og deilt á milli session-a, svo þeim má ekki breyta hér
+    def load_race_data(athlete, version):
+        return get_race_data(int(athlete) if athlete else None)
 
-    # Reikna hraða (m/s)
-    hlaup_data['Speed_m_s'] = hlaup_data.apply(
-        lambda row: row['Distance_m'] / row['Time_in_seconds'] if pd.notnull(row['Distance_m']) and pd.notnull(row['Time_in_seconds']) and row['Time_in_seconds'] > 0 else None,
-        axis=1
+    # Sjálfgefinn hlaupari þar til vafrinn hefur sent valið
+    race_data = background_calc(
+        lambda: (input.athlete() if input.athlete.is_set() else None, db_version()),
+        load_race_data,
     )
 
-    # Fall til að formatta sekúndur í 'HH:MM:SS' snið
-    def format_seconds(total_seconds):
-        if pd.isnull(total_seconds):
-            return None
-        total_seconds = int(total_seconds)
-        hours, remainder = divmod(total_seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        if hours > 0:
-            return f"{hours}:{minutes:02d}:{seconds:02d}"
-        else:
-            return f"{minutes}:{seconds:02d}"
-
     # Uppfæra valmöguleika í dropdown þegar forritið byrjar
     @reactive.Effect
     def update_dropdown():
-        ui.update_select("length_select", choices=list(summary_data['Length']))
+        ui.update_select("length_select", choices=list(race_data().summary_data['Length']))
 
-    # Sía gögnin eftir völdu hlaupi
+    # Framvinda hlauparans fyrir valda lengd (sneið, í tímaröð)
     @reactive.Calc
+    @timed_calc
     def filtered_data():
         selected_length = input.length_select()
-        ids_str_series = summary_data[summary_data['Length'] == selected_length]["IDs"]
-        if ids_str_series.empty:
-            return pd.DataFrame()
-        ids_str = ids_str_series.values[0]
-        data = get_filtered_data_for_ids(hlaup_data, ids_str)
-        return data
+        return race_data().progression.for_length(selected_length)
+
+    # Myndirnar eru sóttar úr skyndiminninu; sjá build_* föllin hér að ofan
+    figures = {name: BackgroundValue(__name__, name) for name in ('year_chart', 'split_chart', *figure_builders)}
 
-    # Línurit fyrir 'Heim' flipann
     @output
+    @timed_output
     @render_plotly
     def home_chart():
-        chart_type = input.chart_type()
-        if chart_type == 'Pie Chart':
-            fig = px.pie(summary_data, values='Count', names='Length', title="Hlutfall hlaupa eftir lengd")
-        else:
-            fig = px.bar(summary_data, x='Length', y='Count', title="Fjöldi hlaupa eftir lengd")
-        return fig
+        return figure_for(race_data(), 'home_chart', input.chart_type(), figures['home_chart'])
 
-    # Línurit fyrir bætingar yfir tíma
     @output
+    @timed_output
     @render_plotly
     def improvement_line_chart():
-        data = filtered_data()
-        if data.empty:
-            return px.line(title="Engin gögn til að sýna.")
-
-        # Athuga hvort 'Time' gögn séu til staðar
-        if 'Time' in data.columns and not data['Time'].isnull().all():
-            # Umbreyta 'Time' í sekúndur
-            data['Time_in_seconds'] = data['Time'].apply(time_to_seconds)
-
-            # Umbreyta 'ar' og 'hlaup_id' í Int64 til að leyfa NaN gildi
-            data['ar'] = data['ar'].astype('Int64')
-            data['hlaup_id'] = data['hlaup_id'].astype('Int64')
-            data = data.dropna(subset=['hlaup_id', 'Time_in_seconds'])
-            data = data.sort_values('hlaup_id')
-
-            # Bæta við dálki með tíma í 'HH:MM:SS' sniði
-            data['Time_formatted'] = data['Time_in_seconds'].apply(format_seconds_to_hhmmss)
-
-            # Línurit með 'hlaup_id' á x-ásnum og 'Time_in_seconds' á y-ásnum
-            fig = px.line(
-                data,
-                x='hlaup_id',
-                y='Time_in_seconds',
-                title=f"Framvinda: Tími fyrir {input.length_select()}",
-                labels={'hlaup_id': 'Hlaup ID', 'Time_in_seconds': 'Tími (HH:MM:SS)'}
-            )
-            fig.update_traces(mode='lines+markers')
-
-            # Bæta við formattaðri tímalengd í sveimaupplýsingum
-            fig.update_traces(
-                hovertemplate='Hlaup ID: %{x}<br>Tími: %{text}',
-                text=data['Time_formatted']
-            )
+        return figure_for(race_data(), 'improvement_line_chart', input.length_select(), figures['improvement_line_chart'])
 
-            # Sérsníða y-ásinn til að sýna tímann í 'HH:MM:SS' sniði
-            y_ticks = sorted(data['Time_in_seconds'].unique())
-            y_ticktext = [format_seconds_to_hhmmss(t) for t in y_ticks]
+    @output
+    @timed_output
+    @render_plotly
+    def rank_plot():
+        return figure_for(race_data(), 'rank_plot', input.num_races(), figures['rank_plot'])
 
-            fig.update_yaxes(
-                tickmode='array',
-                tickvals=y_ticks,
-                ticktext=y_ticktext
+    @output
+    @timed_output
+    @render_plotly
+    def speed_line_chart():
+        return figure_for(race_data(), 'speed_line_chart', input.distance_range(), figures['speed_line_chart'])
+
+    # Þegar notandinn þysjar inn á mynd sem var teiknuð með færri punktum en
+    # gögnin hafa, eru punktarnir fyrir sýnilega bilið reiknaðir aftur og
+    # ferlunum í myndinni skipt út (sama fjöldi og tegund ferla, aðeins gögnin).
+    # Myndin er búin til í bakgrunnsþræði eins og í fyrstu teikningu; ef
+    # notandinn þysjar aftur á meðan er fyrri útreikningnum hætt.
+    def follow_zoom(renderer, name, value):
+        # Bilið sem beðið var um sem (x_range,), eða None ef ekki hefur verið þysjað
+        requested = reactive.Value(None)
+        zoom = BackgroundValue(__name__, f'{name}_zoom')
+
+        @reactive.Effect
+        def _():
+            widget = renderer.widget
+            with reactive.isolate():
+                requested.set(None)
+            if (widget.layout.meta or 0) <= max_points:
+                return
+
+            # Vafrinn sendir aðeins nýja bilið þegar þysjað er, svo 'autorange' er
+            # sett á False hér; annars sæist ekki breyting þegar ásinn er endurstilltur
+            def zoomed(layout, x_range):
+                if x_range is not None:
+                    requested.set((tuple(x_range),))
+                    layout.xaxis.autorange = False
+
+            def reset(layout, autorange):
+                if autorange:
+                    requested.set((None,))
+
+            widget.layout.on_change(zoomed, 'xaxis.range')
+            widget.layout.on_change(reset, 'xaxis.autorange')
+
+        @reactive.Effect
+        def _():
+            request = requested()
+            if request is None:
+                return
+            (x_range,) = request
+            with reactive.isolate():
+                widget, race, current = renderer.widget, race_data(), value()
+            try:
+                fig = zoom((race.key, current, x_range), lambda: figure_builders[name](race, current, x_range))
+            except SilentCancelOutputException:
+                # Fyrra bilinu var hætt og nýja bilið bíður í röðinni
+                return
+            # Myndin var búin til án staðfestingar (figure_cache.plotly_widget), og
+            # þá sendir trace.update() ekkert í vafrann; plotly_restyle gerir það alltaf
+            traces = list(range(min(len(widget.data), len(fig.data))))
+            widget.plotly_restyle(
+                {prop: [fig.data[i][prop] for i in traces] for prop in ('x', 'y', 'customdata', 'text')},
+                trace_indexes=traces,
             )
 
-            # Snúa x-ásnum til að hafa hlaup_id í lækkandi röð
-            fig.update_layout(xaxis=dict(autorange='reversed'))
-
-            return fig
-        else:
-            # Reyna að finna 'Laps' dálkinn
-            laps_col = None
-            for col in data.columns:
-                if col.lower() == 'laps':
-                    laps_col = col
-                    break
-            if laps_col and not data[laps_col].isnull().all():
-                # Fyrir 'Laps' gögn
-                data['ar'] = data['ar'].astype('Int64')
-                data['hlaup_id'] = data['hlaup_id'].astype('Int64')
-                data = data.dropna(subset=['hlaup_id', laps_col])
-                data = data.sort_values('hlaup_id')
-
-                fig = px.line(
-                    data,
-                    x='hlaup_id',
-                    y=laps_col,
-                    title=f"Hringir fyrir {input.length_select()}",
-                    labels={'hlaup_id': 'Hlaup ID', laps_col: 'Fjöldi hringja'}
-                )
-                fig.update_traces(mode='lines+markers')
-
-                # Snúa x-ásnum til að hafa hlaup_id í lækkandi röð
-                fig.update_layout(xaxis=dict(autorange='reversed'))
-
-                return fig
-            else:
-                return px.line(title="Engin gögn til að sýna.")
+    follow_zoom(rank_plot, 'rank_plot', input.num_races)
+    follow_zoom(improvement_line_chart, 'improvement_line_chart', input.length_select)
+    follow_zoom(speed_line_chart, 'speed_line_chart', input.distance_range)
 
     # Tafla sem sýnir tíma eða hringi með 'ar' og 'hlaup_id'
     @output
+    @timed_output
     @render.table
     def improvement_time_table():
-        data = filtered_data()
-        if data.empty:
-            return pd.DataFrame({"Skilaboð": ["Engin gögn til að sýna."]})
-
-        if 'Time' in data.columns and not data['Time'].isnull().all():
-            # Umbreyta 'Time' í sekúndur
-            data['Time_in_seconds'] = data['Time'].apply(time_to_seconds)
-
-            # Umbreyta 'ar' og 'hlaup_id' í Int64 til að leyfa NaN gildi
-            data['ar'] = data['ar'].astype('Int64')
-            data['hlaup_id'] = data['hlaup_id'].astype('Int64')
-            data = data.dropna(subset=['ar', 'hlaup_id', 'Time_in_seconds'])
-
-            # Nota formattaða tímalengd
-            data['Time_formatted'] = data['Time_in_seconds'].apply(format_seconds)
-
-            return data[['ar', 'hlaup_id', 'Time_formatted']].reset_index(drop=True)
-        else:
-            # Reyna að finna 'Laps' dálkinn
-            laps_col = None
-            for col in data.columns:
-                if col.lower() == 'laps':
-                    laps_col = col
-                    break
-            if laps_col and not data[laps_col].isnull().all():
-                # Fyrir 'Laps' gögn
-                data['ar'] = data['ar'].astype('Int64')
-                data['hlaup_id'] = data['hlaup_id'].astype('Int64')
-                data = data.dropna(subset=['ar', 'hlaup_id', laps_col])
-                return data[['ar', 'hlaup_id', laps_col]].reset_index(drop=True)
-            else:
-                return pd.DataFrame({"Skilaboð": ["Engin gögn til að sýna."]})
-
-    # Línurit fyrir Rank eftir hlaup_id
+        return improvement_table(filtered_data())
+
+    # Persónuleg met fyrir valda lengd
     @output
+    @timed_output
+    @render.table
+    def pb_history_table():
+        return pb_history(filtered_data())
+
+    # Samantekt eftir ári og vegalengd er reiknuð við innsetningu, svo hér
+    # eru aðeins lesnar nokkrar línur
+    def load_rollups(key):
+        athlete_id, version = key
+        return store.rollups(athlete_id)
+
+    rollups = background_calc(lambda: (race_data().key,), load_rollups)
+
+    @output
+    @timed_output
     @render_plotly
-    def rank_plot():
-        filtered_rank_data = hlaup_data.nlargest(input.num_races(), 'hlaup_id')
-        filtered_rank_data = filtered_rank_data.sort_values('hlaup_id')
+    def year_chart():
+        data = rollups()
+        key = ('year_chart', race_data().key)
+        return background_plotly(figures['year_chart'], key, lambda: build_year_chart(data))
 
-        fig = px.line(
-            filtered_rank_data,
-            x='hlaup_id',
-            y='Rank',
-            title="Röðun í hlaupum eftir hlaup ID",
-            labels={'hlaup_id': 'Hlaup ID', 'Rank': 'Röðun'}
-        )
-        fig.update_traces(mode='lines+markers')
+    @output
+    @timed_output
+    @render.table
+    def year_table():
+        return year_summary(rollups())
 
-        # Snúa x-ásnum til að hafa hlaup_id í lækkandi röð
-        fig.update_layout(xaxis=dict(autorange='reversed'))
+    # Millitímar eru þáttaðir við innsetningu ('split' taflan), svo hér eru
+    # aðeins lesnar línur eins hlaups
+    @reactive.Effect
+    def update_split_choices():
+        ui.update_select("split_result", choices=split_choices(race_data()))
 
-        return fig
+    split_data = background_calc(lambda: (race_data(), int(req(input.split_result()))), split_table)
 
-    # Úttak fyrir valda töflu í 'Gögn' flipanum
     @output
+    @timed_output
+    @render_plotly
+    def split_chart():
+        data = split_data()
+        key = ('split_chart', input.split_result(), race_data().key)
+        return background_plotly(figures['split_chart'], key, lambda: build_split_chart(data))
+
+    @output
+    @timed_output
     @render.table
-    def selected_data_table():
-        selected_table = input.table_select()
-        if selected_table == 'hlaup_data':
-            return hlaup_data.sort_values('hlaup_id', ascending=True)
-        elif selected_table == 'summary_data':
-            return summary_data
-        elif selected_table == 'ar_data':
-            return ar_data
-        else:
-            return pd.DataFrame()
+    def split_time_table():
+        return split_summary(split_data())
 
-    # Reactive filter fyrir vegalengd fyrir 'Hraði' flipann
+    # Taflan í 'Gögn' flipanum er síðuskipt: röðun og síun eru gerðar hér á
+    # þjóninum og aðeins línurnar á valinni síðu eru sendar í vafrann
     @reactive.Calc
-    def speed_filtered_data():
-        distance_range = input.distance_range()
-        if distance_range == "1":
-            min_dist, max_dist = 1 * 1000, 9.9 * 1000
-        elif distance_range == "2":
-            min_dist, max_dist = 10 * 1000, 19.9 * 1000
-        elif distance_range == "3":
-            min_dist, max_dist = 20 * 1000, 39.9 * 1000
-        elif distance_range == "4":
-            min_dist, max_dist = 40 * 1000, 100 * 1000
-        elif distance_range == "5":
-            min_dist, max_dist = None, None  # Engin síun
-        else:
-            min_dist, max_dist = 0, float('inf')
-
-        data = hlaup_data.dropna(subset=['Distance_m', 'Time_in_seconds', 'Speed_m_s'])
-
-        if min_dist is not None and max_dist is not None:
-            data = data[(data['Distance_m'] >= min_dist) & (data['Distance_m'] <= max_dist)]
-        # Ef min_dist og max_dist eru None, síum við ekki eftir vegalengd
-
-        data = data.sort_values('hlaup_id')
-        return data
-
-    # Línurit fyrir hraða í 'Hraði' flipanum
+    @timed_calc
+    def table_view():
+        return race_data().table_view(input.table_select())
+
+    # Uppfæra dálkana sem hægt er að raða eftir þegar skipt er um töflu
+    @reactive.Effect
+    def update_table_sort():
+        view = table_view()
+        if view is not None:
+            ui.update_select("table_sort", choices=view.columns, selected=view.default_sort)
+
+    # Byrja aftur á fyrstu síðu þegar röðun, sía eða tafla breytist
+    @reactive.Effect
+    @reactive.event(input.athlete, input.table_select, input.table_sort, input.table_order, input.table_filter, input.table_page_size)
+    def reset_table_page():
+        ui.update_numeric("table_page", value=1)
+
+    @reactive.Calc
+    @timed_calc
+    def table_rows():
+        view = table_view()
+        if view is None:
+            return None
+        return view.rows(input.table_sort(), input.table_order() == "asc", input.table_filter())
+
+    def table_page():
+        page_size = int(input.table_page_size())
+        pages = page_count(len(table_rows()), page_size)
+        page = min(max(int(input.table_page() or 1), 1), pages)
+        return page, pages, page_size
+
     @output
-    @render_plotly
-    def speed_line_chart():
-        data = speed_filtered_data()
-        if data.empty:
-            return px.scatter(title="Engin gögn til að sýna.")
-        
-        # Bæta við formattaðri vegalengd og tíma
-        data['Distance_km'] = data['Distance_m'] / 1000
-        data['Time_formatted'] = data['Time_in_seconds'].apply(format_seconds_to_hhmmss)
-        
-        distance_range = input.distance_range()
-
-        if distance_range == "5":
-            # Fyrir allar vegalengdir, búa til punktarit með hallalínu
-            fig = px.scatter(
-                data,
-                x='hlaup_id',
-                y='Speed_m_s',
-                trendline='ols',
-                title="Hraði (m/s) fyrir öll hlaup",
-                labels={'hlaup_id': 'Hlaup ID', 'Speed_m_s': 'Hraði (m/s)'},
-                hover_data={'Name': True, 'Distance_km': True, 'Time_formatted': True},
-            )
-            fig.update_traces(
-                hovertemplate='Hlaup ID: %{x}<br>Nafn: %{customdata[0]}<br>Vegalengd: %{customdata[1]:.2f} km<br>Tími: %{customdata[2]}<br>Hraði: %{y:.2f} m/s'
-            )
-        else:
-            # Fyrir ákveðin vegalengdarbil, halda áfram með línurit
-            fig = px.line(
-                data,
-                x='hlaup_id',
-                y='Speed_m_s',
-                title="Hraði (m/s) eftir hlaup ID",
-                labels={'hlaup_id': 'Hlaup ID', 'Speed_m_s': 'Hraði (m/s)'},
-                hover_data={'Name': True, 'Distance_km': True, 'Time_formatted': True},
-                markers=True
-            )
-            fig.update_traces(
-                hovertemplate='Hlaup ID: %{x}<br>Nafn: %{customdata[0]}<br>Vegalengd: %{customdata[1]:.2f} km<br>Tími: %{customdata[2]}<br>Hraði: %{y:.2f} m/s'
-            )
+    @timed_output
+    @render.text
+    def table_page_info():
+        if table_rows() is None:
+            return ""
+        page, pages, page_size = table_page()
+        return f"Síða {page} af {pages} ({len(table_rows())} línur)"
 
-        # Snúa x-ásnum til að hafa hlaup_id í lækkandi röð
-        fig.update_layout(xaxis=dict(autorange='reversed'))
-        return fig
+    # Úttak fyrir valda töflu í 'Gögn' flipanum
+    @output
+    @timed_output
+    @render.table
+    def selected_data_table():
+        rows = table_rows()
+        if rows is None:
+            return pd.DataFrame()
+        page, pages, page_size = table_page()
+        return table_view().page(rows, page, page_size)
 
 # Keyra Shiny appið
-app = App(app_ui, server)
+# /metrics sýnir tímamælingarnar (sjá metrics.py) og /api gögnin á JSON, CSV eða Arrow sniði (sjá api.py)
+app = mount_api(with_metrics_route(App(app_ui, server)))
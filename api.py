@@ -0,0 +1,271 @@
+# Gögn appanna á JSON, CSV eða Arrow sniði fyrir önnur forrit, undir /api
+# við hlið Shiny appsins (sjá mount_api), svo að ekki þurfi að opna session
+# og lesa HTML töflur til að sækja þau.
+#
+#   GET /api/athletes                              hlauparar (id, name)
+#   GET /api/athletes/{id}/results                 niðurstöður ('hlaup_data')
+#   GET /api/athletes/{id}/summary                 fjöldi hlaupa eftir lengd
+#   GET /api/athletes/{id}/progression             framvinda og persónuleg met
+#   GET /api/athletes/{id}/speed?distance_class=N  hraði eftir hlaupum (N = 1-4, allar ef sleppt)
+#   GET /api/athletes/{id}/ranks                   sæti miðað við fjölda keppenda
+#
+# Færibreytur: format=json|csv|arrow (sjálfgefið json; arrow krefst pakkans
+# 'pyarrow'), limit (línur á síðu, mest 'max_limit') og after.
+#
+# Síðuskipting er eftir lykli (keyset): línunum er raðað eftir lykladálkum
+# hverrar töflu og 'after' er bendill á síðustu línu fyrri síðu. Bendillinn
+# á næstu síðu er í 'next' í JSON svarinu og í 'Link' hausnum (rel="next").
+#
+# ETag er reiknað úr slóðinni, færibreytunum og útgáfu gagnanna sem 'store'
+# afgreiðir (store.version), svo að If-None-Match fær 304 án þess að gögnin
+# séu lesin. Á meðan ný staða er lesin í bakgrunni afgreiðir 'store' enn
+# eldri útgáfuna, og svarið fær þá ETag hennar, ekki nýjustu útgáfu
+# gagnagrunnsins. Hvert svar er búið til einu sinni fyrir hverja útgáfu og
+# geymt þjappað (gzip, eða brotli ef 'brotli' er sett upp og biðlarinn
+# styður það) í LRU skyndiminni.
+import base64
+import binascii
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import time
+
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from lru_cache import LRUCache
+from metrics import registry
+from race_data import store
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Sjálfgefinn og mesti fjöldi lína á síðu
+default_limit = 1000
+max_limit = 10000
+# Minni svör eru ekki þjöppuð
+min_compress_size = 500
+
+media_types = {
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# Svör eftir (ETag, þjöppun): (innihald, bendill á næstu síðu)
+responses = LRUCache(maxsize=512)
+
+class ApiError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+def speed_series(race, params):
+    distance_class = params.get('distance_class')
+    if distance_class is None:
+        return race.speed_series()
+    if distance_class not in ('1', '2', '3', '4'):
+        raise ApiError(400, "distance_class á að vera 1, 2, 3 eða 4")
+    return race.speed_series(int(distance_class))
+
+# Töflur hvers hlaupara: nafn -> (fall sem skilar töflunni úr (race, færibreytum), lykladálkar)
+resources = {
+    'results': (lambda race, params: race.hlaup_data, ['id']),
+    'summary': (lambda race, params: race.summary_data, ['Length']),
+    'progression': (lambda race, params: race.progression.data, ['length_label', 'seq']),
+    'speed': (speed_series, ['hlaup_id', 'id']),
+    'ranks': (lambda race, params: race.rank_metrics, ['race_number']),
+}
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, keys):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ApiError(400, "Ógildur bendill í 'after'")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ApiError(400, "Ógildur bendill í 'after'")
+    return values
+
+# Línur á eftir lyklinum 'after' (í röð lykladálkanna) og bendill á næstu
+# síðu, eða None ef þetta er síðasta síðan
+def keyset_page(data, keys, after, limit):
+    data = data.sort_values(keys, kind='stable')
+    if after is not None:
+        later = pd.Series(False, index=data.index)
+        equal = pd.Series(True, index=data.index)
+        try:
+            for key, value in zip(keys, after):
+                column = data[key].astype(object)
+                later |= equal & (column > value)
+                equal &= column == value
+        except TypeError:
+            raise ApiError(400, "Ógildur bendill í 'after'")
+        data = data[later]
+    page = data.iloc[:limit]
+    if len(data) <= limit:
+        return page, None
+    last = page.iloc[-1]
+    return page, encode_cursor([last[key].item() if hasattr(last[key], 'item') else last[key] for key in keys])
+
+def serialize(page, fmt, next_cursor):
+    if fmt == 'csv':
+        return page.to_csv(index=False).encode('utf-8')
+    if fmt == 'arrow':
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(page, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    body = page.to_json(orient='records', force_ascii=False)
+    return f'{{"data":{body},"next":{json.dumps(next_cursor)}}}'.encode('utf-8')
+
+# Besta þjöppunin sem biðlarinn leyfir ('Accept-Encoding'), eða None
+def choose_encoding(accept_encoding):
+    accepted = set()
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+def query_params(request):
+    params = dict(request.query_params)
+    fmt = params.pop('format', 'json')
+    if fmt not in media_types:
+        raise ApiError(400, f"format á að vera eitt af: {', '.join(media_types)}")
+    if fmt == 'arrow' and importlib.util.find_spec('pyarrow') is None:
+        raise ApiError(406, "Arrow snið krefst pakkans 'pyarrow'")
+    try:
+        limit = int(params.pop('limit', default_limit))
+    except ValueError:
+        raise ApiError(400, "limit á að vera heiltala")
+    if not 1 <= limit <= max_limit:
+        raise ApiError(400, f"limit á að vera á bilinu 1 til {max_limit}")
+    return fmt, limit, params.pop('after', None), params
+
+def make_etag(request, version):
+    query = sorted(request.query_params.multi_items())
+    return 'W/"' + hashlib.sha256(repr((request.url.path, query, version)).encode()).hexdigest()[:32] + '"'
+
+# Svar fyrir eina töflu: 'table(params)' skilar (töflu, lykladálkum, útgáfu
+# gagnanna í töflunni) og er aðeins kallað ef svarið er ekki í skyndiminninu.
+# 'check()', ef gefið, er kallað fyrst og getur hafnað beiðninni með ApiError.
+async def table_response(request, name, table, check=None):
+    start = time.perf_counter()
+    fmt, limit, after, params = query_params(request)
+    if_none_match = request.headers.get('if-none-match', '')
+    encoding = choose_encoding(request.headers.get('accept-encoding', ''))
+
+    # Allt sem les gögnin (eða bíður eftir þeim) keyrir í einum þræði, svo
+    # að atburðalykkjan stöðvist ekki á meðan; skilar (ETag, svari úr
+    # skyndiminninu eða nýju svari, fjölda lína), með svarið None fyrir 304
+    def respond():
+        if check is not None:
+            check()
+        # Útgáfan sem 'store' afgreiðir núna (sjá RaceDataStore.refresh); aðeins
+        # fyrsti lesturinn bíður eftir gögnunum
+        version = store.refresh(wait=store.version is None)
+        etag = make_etag(request, version)
+        if etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*':
+            return etag, None, None
+        cached = responses.get((etag, encoding))
+        if cached is not None:
+            return etag, cached, None
+
+        data, keys, served = table(params)
+        page, next_cursor = keyset_page(data, keys, decode_cursor(after, keys) if after else None, limit)
+        body = serialize(page, fmt, next_cursor)
+        if encoding and len(body) >= min_compress_size:
+            cached = compress(body, encoding), encoding, next_cursor
+        else:
+            cached = body, None, next_cursor
+        # Ný staða gæti hafa tekið við á meðan taflan var lesin; svarið fær
+        # ETag útgáfunnar sem það var búið til úr
+        if served != version:
+            etag = make_etag(request, served)
+        responses.put((etag, encoding), cached)
+        return etag, cached, len(page)
+
+    etag, cached, rows = await run_in_threadpool(respond)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if cached is None:
+        return Response(status_code=304, headers=headers)
+
+    content, content_encoding, next_cursor = cached
+    if content_encoding:
+        headers['Content-Encoding'] = content_encoding
+    if next_cursor:
+        headers['Link'] = f'<{request.url.include_query_params(after=next_cursor)}>; rel="next"'
+    registry.observe('api', 'api', name, None, time.perf_counter() - start, rows, len(content))
+    return Response(content, media_type=media_types[fmt], headers=headers)
+
+async def athletes_endpoint(request):
+    def table(params):
+        # Útgáfan er lesin á undan listanum, svo listinn er aldrei eldri en hún
+        version = store.version
+        athletes = store.athletes()
+        return pd.DataFrame({'id': list(athletes), 'name': list(athletes.values())}), ['id'], version
+
+    return await table_response(request, 'athletes', table)
+
+async def athlete_endpoint(request):
+    athlete_id = request.path_params['athlete_id']
+    name = request.path_params['resource']
+    if name not in resources:
+        raise ApiError(404, f"Engin tafla '{name}'; í boði eru: {', '.join(resources)}")
+    fn, keys = resources[name]
+
+    def check():
+        if athlete_id not in store.athletes():
+            raise ApiError(404, f"Enginn hlaupari með id {athlete_id}")
+
+    def table(params):
+        race = store.get(athlete_id)
+        return fn(race, params), keys, race.version
+
+    return await table_response(request, name, table, check)
+
+async def api_error(request, error):
+    return JSONResponse({'error': str(error)}, status_code=error.status_code)
+
+api_app = Starlette(
+    routes=[
+        Route('/athletes', athletes_endpoint),
+        Route('/athletes/{athlete_id:int}/{resource}', athlete_endpoint),
+    ],
+    exception_handlers={ApiError: api_error},
+)
+
+# Bæta /api við Starlette app Shiny appsins og skila því
+def mount_api(app):
+    from starlette.routing import Mount
+
+    app.starlette_app.router.routes.insert(0, Mount('/api', app=api_app))
+    return app
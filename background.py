@@ -0,0 +1,95 @@
+# Þungir útreikningar appanna (lestur gagna, myndir sem eru ekki í
+# skyndiminni) eru keyrðir í bakgrunnsþræði. Shiny vinnur skilaboð og
+# útreikninga allra session-a undir einum sameiginlegum lás
+# (reactive.lock), svo 'await' inni í úttaki eða reactive.Calc stoppar samt
+# önnur session; reactive.ExtendedTask keyrir hins vegar utan lássins.
+#
+#   race_data = background_calc(lambda: (input.athlete(), db_version()), load_race)
+#
+# 'args()' er lesið í reactive samhengi og 'load_race(*args)' keyrt í þræði.
+# Úttök sem lesa race_data() sýna að verið sé að reikna og halda fyrra gildi
+# á meðan. Ef inntökin breytast á meðan er fyrri útreikningnum hætt: hann er
+# tekinn úr biðröðinni ef hann er ekki byrjaður, annars er niðurstöðunni hent.
+#
+# watch_db_version() ræsir eitt verk fyrir allt ferlið sem les útgáfu
+# gagnagrunnsins (mtime) á nokkurra sekúndna fresti. Ef hún breytist eru nýju
+# gögnin lesin í þræði og skipt inn í RaceDataStore í einu lagi (sjá
+# RaceDataStore.refresh), og svo er 'db_version' sett svo að aðeins þau
+# reiknigildi og úttök sem lesa það eru reiknuð aftur.
+import asyncio
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from shiny import reactive, req
+
+import timataka_db
+from metrics import timed_task
+from race_data import store
+
+executor = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) + 2), thread_name_prefix='background')
+
+# Gildi sem er reiknað í bakgrunnsþræði og lesið úr reactive samhengi
+# (úttaki eða reactive.Calc). Kallið skilar gildinu fyrir 'key' ef það er
+# tilbúið; annars er 'create()' sett af stað og samhengið bíður (eins og
+# ExtendedTask.result) og er reiknað aftur þegar gildið er tilbúið. Eitt
+# tilvik fyrir hvert úttak í hverju session; 'app' og 'name' eru fyrir /metrics.
+class BackgroundValue:
+    def __init__(self, app, name):
+        self.app = app
+        self.name = name
+        self._task = reactive.ExtendedTask(self._run)
+        self._key = None
+
+    async def _run(self, create):
+        return await asyncio.get_running_loop().run_in_executor(executor, create)
+
+    def __call__(self, key, create):
+        if key != self._key:
+            self._key = key
+            self._task.cancel()
+            self._task.invoke(timed_task(self.app, self.name, create))
+        # Hætt var við fyrri útreikning og sá nýi bíður í röðinni
+        if self._task.status() == 'cancelled':
+            req(False, cancel_output='progress')
+        return self._task.result()
+
+# reactive.Calc sem skilar 'fn(*args())', reiknað í bakgrunnsþræði
+def background_calc(args, fn):
+    value = BackgroundValue(fn.__module__, fn.__name__)
+
+    @reactive.Calc
+    def calc():
+        values = args()
+        return value(values, lambda: fn(*values))
+
+    return calc
+
+# Útgáfa gagnagrunnsins sem session-in sjá; None þar til watch_db_version er ræst
+db_version = reactive.Value(None)
+_watcher = None
+
+# Ræsa vaktina ef hún er ekki þegar í gangi; kallað úr server föllunum
+def watch_db_version(interval=2.0):
+    global _watcher
+    if _watcher is not None:
+        return
+    with reactive.isolate():
+        db_version.set(timataka_db.data_version())
+    _watcher = asyncio.get_running_loop().create_task(_watch(interval))
+
+async def _watch(interval):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            version = await loop.run_in_executor(executor, lambda: store.refresh(preload=True))
+        except Exception:
+            traceback.print_exc()
+            continue
+        async with reactive.lock():
+            with reactive.isolate():
+                changed = version != db_version()
+            if changed:
+                db_version.set(version)
+                await reactive.flush()
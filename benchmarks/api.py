@@ -0,0 +1,64 @@
+# Biðtími (p50/p99) /api svara (sjá api.py) fyrir valda hlaupara: fyrsta
+# svar hverrar töflu (gögnin lesin og svarið búið til), sama svar úr
+# skyndiminninu og 304 svar við If-None-Match. Einnig stærð svaranna með og
+# án gzip.
+#
+# Keyrsla:  python -m benchmarks.api --rows 100000 --athletes 20
+import argparse
+import random
+import tempfile
+import time
+
+import numpy as np
+from starlette.testclient import TestClient
+
+import api
+import race_data
+import timataka_db
+from benchmarks.athlete_load import enlarged_copy
+
+def timed(client, url, headers=None):
+    start = time.perf_counter()
+    response = client.get(url, headers=headers or {})
+    return time.perf_counter() - start, response
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=0)
+    parser.add_argument('--athletes', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = enlarged_copy(args.rows, directory) if args.rows else timataka_db.DB_PATH
+        timataka_db.pool = timataka_db.ConnectionPool(db_path)
+        api.store = race_data.RaceDataStore(timataka_db.pool)
+        api.data_version = lambda: timataka_db.data_version(db_path)
+        client = TestClient(api.api_app)
+
+        ids = list(api.store.athletes())
+        athletes = random.Random(0).sample(ids, min(args.athletes, len(ids)))
+        gzip_headers = {'Accept-Encoding': 'gzip'}
+        times = {'fyrsta svar': [], 'úr skyndiminni': [], '304': []}
+        raw_bytes = gzip_bytes = 0
+        for athlete_id in athletes:
+            for name in api.resources:
+                url = f'/athletes/{athlete_id}/{name}'
+                seconds, response = timed(client, url, gzip_headers)
+                times['fyrsta svar'].append(seconds)
+                raw_bytes += len(response.content)
+                gzip_bytes += int(response.headers.get('content-length', len(response.content)))
+                seconds, _ = timed(client, url, gzip_headers)
+                times['úr skyndiminni'].append(seconds)
+                seconds, response = timed(client, url, {**gzip_headers, 'If-None-Match': response.headers['etag']})
+                assert response.status_code == 304
+                times['304'].append(seconds)
+        timataka_db.pool.close_all()
+
+    print(f"{len(athletes)} hlauparar x {len(api.resources)} töflur")
+    for label, values in times.items():
+        p50, p99 = np.percentile(values, [50, 99]) * 1000
+        print(f"  {label:<16} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+    print(f"  stærð: {raw_bytes / 1024:.0f} KB, {gzip_bytes / 1024:.0f} KB með gzip")
+
+if __name__ == '__main__':
+    main()
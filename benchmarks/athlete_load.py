@@ -0,0 +1,74 @@
+# Tími sem það tekur að lesa og byggja gögn eins hlaupara (það sem activeapp
+# gerir þegar hlaupari er valinn) eftir því sem 'timataka' stækkar. Nýju
+# línurnar fá ný hlaup_id og ný nöfn (nafnið með númeri afritsins aftan við),
+# svo hver hlaupari hefur jafn margar niðurstöður og áður en taflan er stærri.
+#
+# Keyrsla:  python -m benchmarks.athlete_load --rows 10000 100000 1000000
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+import race_data
+import timataka_db
+
+def enlarged_copy(rows, directory):
+    path = os.path.join(directory, f'timataka_{rows}.db')
+    shutil.copy(timataka_db.DB_PATH, path)
+    conn = sqlite3.connect(path)
+    columns = 'Rank, BIB, Split, Time, Behind, "Race Time", Laps, time_s, behind_s'
+    copy = 0
+    while conn.execute("SELECT COUNT(*) FROM timataka").fetchone()[0] < rows:
+        copy += 1
+        offset = conn.execute("SELECT MAX(hlaup_id) FROM timataka").fetchone()[0]
+        conn.execute(f"""
+            INSERT INTO timataka (hlaup_id, Name, {columns})
+            SELECT hlaup_id + ?, Name || ' ' || ?, {columns} FROM timataka
+        """, (offset, copy))
+        conn.execute(f"""
+            INSERT OR IGNORE INTO race_length (hlaup_id, length_label, distance_m)
+            SELECT hlaup_id + ?, length_label, distance_m FROM race_length
+        """, (offset,))
+    timataka_db.assign_athletes(conn)
+    timataka_db.refresh_splits(conn)
+    timataka_db.refresh_rollups(conn)
+    conn.commit()
+    conn.close()
+    return path
+
+def measure(db_path, loads):
+    timataka_db.pool = timataka_db.ConnectionPool(db_path)
+    store = race_data.RaceDataStore(timataka_db.pool)
+    athlete_ids = list(store.athletes())
+    rng = random.Random(0)
+    latencies = []
+    for _ in range(loads):
+        # Nýtt skyndiminni í hvert skipti svo að gögnin séu alltaf lesin úr grunninum
+        store._cache.clear()
+        athlete_id = rng.choice(athlete_ids)
+        start = time.perf_counter()
+        store.get(athlete_id)
+        latencies.append(time.perf_counter() - start)
+    timataka_db.pool.close_all()
+    return len(athlete_ids), np.percentile(latencies, [50, 99]) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--loads', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in [0] + args.rows:
+            db_path = enlarged_copy(rows, directory) if rows else timataka_db.DB_PATH
+            total = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM timataka").fetchone()[0]
+            athletes, (p50, p99) = measure(db_path, args.loads)
+            print(f"{total:>10,} línur  {athletes:>8,} hlauparar   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
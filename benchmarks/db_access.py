@@ -0,0 +1,92 @@
+# Biðtími (p50/p99) gagnasóknar fyrir siggi_app.improvement_plot þegar mörg
+# session sækja gögn samtímis: gamla leiðin (ný tenging og f-strengur með
+# IN (...) í hvert skipti) borin saman við timataka_db (tengingasafn og
+# fyrirspurnir með bundnum færibreytum).
+#
+# Keyrsla:  python -m benchmarks.db_access --sessions 16 --renders 50 --rows 1000000
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import timataka_db
+
+# Gamla útgáfan úr siggi_app.improvement_plot
+def old_results_for_length(db_path, summary_df, selected_length):
+    selected_ids = summary_df[summary_df['Length'] == selected_length]['IDs'].values[0]
+    ids_list = selected_ids.split(", ")
+    query = f"SELECT Time, Laps FROM timataka WHERE hlaup_id IN ({','.join(ids_list)})"
+    conn = sqlite3.connect(db_path)
+    timataka_df = pd.read_sql_query(query, conn)
+    conn.close()
+    return timataka_df
+
+# Afrit af gagnagrunninum þar sem 'timataka' hefur verið stækkuð í 'rows' línur.
+# Nýju línurnar fá ný hlaup_id, svo hver lengd skilar jafn mörgum línum og
+# áður en taflan sem þarf að leita í er stór. Flutningar (og þar með vísirinn
+# á hlaup_id) eru ekki keyrðir fyrr en á eftir gömlu leiðinni.
+def enlarged_copy(rows, directory):
+    path = os.path.join(directory, 'siggi_timataka.db')
+    shutil.copy(timataka_db.DB_PATH, path)
+    conn = sqlite3.connect(path)
+    conn.execute("DROP INDEX IF EXISTS idx_timataka_hlaup_id")
+    conn.execute("PRAGMA user_version = 1")
+    columns = 'Rank, BIB, Name, Split, Time, Behind, "Race Time", Laps'
+    while conn.execute("SELECT COUNT(*) FROM timataka").fetchone()[0] < rows:
+        offset = conn.execute("SELECT MAX(hlaup_id) FROM timataka").fetchone()[0]
+        conn.execute(f"INSERT INTO timataka (hlaup_id, {columns}) SELECT hlaup_id + ?, {columns} FROM timataka", (offset,))
+    conn.commit()
+    conn.close()
+    return path
+
+def run(label, func, lengths, sessions, renders):
+    def session(seed):
+        rng = random.Random(seed)
+        latencies = []
+        for _ in range(renders):
+            start = time.perf_counter()
+            func(rng.choice(lengths))
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(sessions) as executor:
+        latencies = np.concatenate(list(executor.map(session, range(sessions))))
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f'{label:<28} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   {len(latencies) / elapsed:8.0f} fyrirspurnir/s')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=16)
+    parser.add_argument('--renders', type=int, default=50)
+    parser.add_argument('--rows', type=int, default=0, help="stækka 'timataka' í svona margar línur")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = timataka_db.DB_PATH
+        if args.rows:
+            db_path = enlarged_copy(args.rows, directory)
+            print(f"'timataka' stækkuð í {args.rows:,} línur")
+
+        summary_df = pd.read_sql_query("SELECT Length, Count, IDs FROM siggi_hlaup_summary", sqlite3.connect(db_path))
+        lengths = list(summary_df['Length'])
+
+        run('ný tenging + f-strengur', lambda length: old_results_for_length(db_path, summary_df, length),
+            lengths, args.sessions, args.renders)
+
+        if args.rows:
+            timataka_db.migrate(db_path)
+        timataka_db.pool = timataka_db.ConnectionPool(db_path, size=args.sessions)
+        run('tengingasafn + færibreytur', timataka_db.results_for_length, lengths, args.sessions, args.renders)
+        timataka_db.pool.close_all()
+
+if __name__ == '__main__':
+    main()
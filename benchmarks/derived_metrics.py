@@ -0,0 +1,54 @@
+# Samanburður á race_metrics.add_derived_metrics og gamla hraðaútreikningnum
+# sem notaði DataFrame.apply(..., axis=1) á hverja línu.
+#
+# Keyrsla:  python -m benchmarks.derived_metrics --rows 10000 100000 1000000
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from race_metrics import add_derived_metrics
+
+# Gamla útgáfan úr activeapp.server
+def speed_with_apply(data):
+    return data.apply(
+        lambda row: row['Distance_m'] / row['Time_in_seconds'] if pd.notnull(row['Distance_m']) and pd.notnull(row['Time_in_seconds']) and row['Time_in_seconds'] > 0 else None,
+        axis=1
+    )
+
+# Búa til töflu sem líkist hlaup_data: vegalengdir úr lengdartöflunni
+# (sumar óþekktar) og tímar sem passa við vegalengdina
+def synthetic_results(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = np.array([5000, 8300, 10000, 17500, 21000, 32700, 42000, 50000, 63000, np.nan])
+    distance = rng.choice(lengths, rows)
+    speed = rng.uniform(2.0, 5.5, rows)
+    seconds = np.round(distance / speed)
+    seconds[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        'hlaup_id': rng.integers(1, 1300, rows),
+        'Distance_m': distance,
+        'Time_in_seconds': seconds,
+    })
+
+def timed(func, data):
+    start = time.perf_counter()
+    result = func(data)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f'{"raðir":>10} {"add_derived_metrics":>20} {"DataFrame.apply":>16} {"hröðun":>8}')
+    for rows in args.rows:
+        data = synthetic_results(rows)
+        new_time, new = timed(add_derived_metrics, data)
+        old_time, old = timed(speed_with_apply, data)
+        assert np.allclose(new['Speed_m_s'], old.astype('float64'), equal_nan=True)
+        print(f'{rows:>10,} {new_time:>18.3f} s {old_time:>14.3f} s {old_time / new_time:>7.0f}x')
+
+if __name__ == '__main__':
+    main()
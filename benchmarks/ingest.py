@@ -0,0 +1,71 @@
+# Innsetning með ingest.py á tilbúinni CSV skrá með mörgum niðurstöðum, á
+# afriti af gagnagrunninum: fyrsta innsetning, óbreytt skrá (sleppt) og
+# endurinnsetning þar sem allar línur eru uppfærðar. Hver 50. niðurstaða er
+# án rásnúmers, og athugað er að engin lína tapist og engin tvöfaldist.
+#
+# Keyrsla:  python -m benchmarks.ingest --rows 1000000
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import ingest
+import timataka_db
+
+# CSV skrá á sama sniði og CSV/siggi_hlaup.csv, með ný hlaup_id
+def synthetic_results_csv(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(15 * 60, 6 * 3600, rows)
+    bibs = np.arange(rows) % 500 + 1.0
+    bibs[::50] = np.nan
+    hours, rest = np.divmod(seconds, 3600)
+    minutes, secs = np.divmod(rest, 60)
+    frame = pd.DataFrame({
+        'Rank': np.arange(rows) % 500 + 1.0,
+        'BIB': bibs,
+        'Name': 'Hlaupari ' + pd.Series(np.arange(rows) % 50_000).astype(str),
+        'Split': '',
+        'Time': [f'{h:02d}:{m:02d}:{s:02d}' for h, m, s in zip(hours, minutes, secs)],
+        'Behind': '',
+        'hlaup_id': 100_000 + np.arange(rows) // 500,
+        'Race time': '',
+        'Laps': np.nan,
+    })
+    frame.to_csv(path, index=False)
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f'{label:<36} {time.perf_counter() - start:8.2f} s  ({result})')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'siggi_timataka.db')
+        csv_path = os.path.join(directory, 'results.csv')
+        shutil.copy(timataka_db.DB_PATH, db_path)
+        timataka_db.migrate(db_path)
+        synthetic_results_csv(csv_path, args.rows)
+
+        conn = sqlite3.connect(db_path)
+        timed('bundnu CSV skrárnar', lambda: [ingest.ingest_file(conn, os.path.join('CSV', name))
+                                              for name in ('siggi_hlaup.csv', 'siggi_hlaup_summary.csv')])
+        before = conn.execute("SELECT COUNT(*) FROM timataka").fetchone()[0]
+        timed(f'{args.rows:,} nýjar línur', lambda: ingest.ingest_file(conn, csv_path))
+        timed('sama skrá aftur (óbreytt)', lambda: ingest.ingest_file(conn, csv_path))
+        timed('sama skrá aftur (--force, uppfærsla)', lambda: ingest.ingest_file(conn, csv_path, force=True))
+        count = conn.execute("SELECT COUNT(*) FROM timataka").fetchone()[0]
+        print('línur í timataka:', count)
+        assert count == before + args.rows, (before, count)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# Álagspróf: appið er ræst með uvicorn í sér ferli og N hermd session tengjast
+# því yfir websocket eins og vafri gerir. Hvert session breytir inntökum með
+# hléum á milli (eins og notandi sem skoðar mælaborðið) og við mælum tímann
+# frá því að breyting er send þar til ný úttök berast. Fyrir hvern fjölda
+# session er prentað: uppfærslur á sekúndu, p50/p95/p99 biðtími og minnisnotkun
+# (RSS) þjónsins. Allt keyrir á localhost, svo prófið þarf ekki netsamband.
+#
+# Keyrsla:  python -m benchmarks.load_test --app activeapp --sessions 1 5 10 20 --duration 20
+#           python -m benchmarks.load_test --app siggi_app --rows 1000000 --snapshot
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+
+import snapshot
+import timataka_db
+from benchmarks.athlete_load import enlarged_copy
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ---- Hvað hvert hermt session gerir ----
+
+# Inntök sem vafrinn sendir þegar síðan opnast
+def initial_inputs(app, choices):
+    if app == 'activeapp':
+        return {
+            'num_races': 10, 'chart_type': 'Pie Chart', 'length_select': choices['lengths'][0],
+            'distance_range': '1', 'table_select': 'hlaup_data', 'table_sort': 'hlaup_id',
+            'table_order': 'asc', 'table_filter': '', 'table_page_size': '25', 'table_page': 1,
+        }
+    return {'length_choice': choices['lengths'][0]}
+
+outputs = {
+    'activeapp': ['home_chart', 'rank_plot', 'improvement_line_chart', 'improvement_time_table',
+                  'speed_line_chart', 'table_page_info', 'selected_data_table'],
+    'siggi_app': ['rank_plot', 'summary_plot', 'improvement_plot'],
+}
+
+# Næsta aðgerð notandans sem listi af uppfærslum sem eru sendar hver á
+# eftir annarri (t.d. sleði sem er dreginn sendir mörg gildi í röð)
+def next_action(app, rng, choices):
+    if app == 'siggi_app':
+        return [{'length_choice': rng.choice(choices['lengths'])}]
+
+    kind = rng.choices(
+        ['num_races', 'chart_type', 'length_select', 'distance_range', 'table_select', 'table_page', 'athlete'],
+        weights=[25, 10, 25, 20, 10, 8, 2],
+    )[0]
+    if kind == 'num_races':
+        start, stop = rng.randint(5, 100), rng.randint(5, 100)
+        step = 1 if stop >= start else -1
+        values = list(range(start, stop + step, step))
+        return [{'num_races': value} for value in values[::max(1, len(values) // 5)]]
+    if kind == 'chart_type':
+        return [{'chart_type': rng.choice(['Pie Chart', 'Bar Chart'])}]
+    if kind == 'length_select':
+        return [{'length_select': rng.choice(choices['lengths'])}]
+    if kind == 'distance_range':
+        return [{'distance_range': rng.choice(['1', '2', '3', '4', '5'])}]
+    if kind == 'table_select':
+        return [{'table_select': rng.choice(['hlaup_data', 'summary_data', 'ar_data'])}]
+    if kind == 'table_page':
+        return [{'table_page': rng.randint(1, 3)}]
+    return [{'athlete': str(rng.choice(choices['athletes']))}]
+
+# ---- Þjónninn ----
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# Ræsa 'app' með uvicorn í möppunni 'directory' (þar sem siggi_timataka.db er)
+def start_server(app, directory, port):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'{app}:app', '--app-dir', root,
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=directory,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{app} svaraði ekki á porti {port}")
+
+# Minnisnotkun ferlis í MB (aðeins á Linux; annars None)
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+# ---- Hermt session ----
+
+# Shiny sendir 'values' til allra session í hvert sinn sem eitthvert þeirra
+# klárar útreikning, svo þau skilaboð segja ekki hvenær okkar breyting er
+# búin. Þjónninn vinnur skilaboð hvers session í röð, svo við sendum strax á
+# eftir breytingunni beiðni sem hann þekkir ekki og svarar með villu: þegar
+# svarið berst eru úttökin sem breytingin hafði áhrif á komin, nema þau sem
+# bíða eftir bakgrunnsþræði (sjá background.py). Þau eru merkt með
+# 'persistent' progress skilaboðum og við bíðum líka eftir 'recalculated' frá þeim.
+async def send_and_wait(ws, message, tag):
+    await ws.send(json.dumps(message))
+    await ws.send(json.dumps({'method': 'loadTestMarker', 'tag': tag, 'args': []}))
+    errors = 0
+    answered = False
+    pending = set()
+    while True:
+        message = json.loads(await ws.recv())
+        errors += len(message.get('errors') or {})
+        progress = message.get('progress') or {}
+        if progress.get('type') == 'binding' and progress['message'].get('persistent'):
+            pending.add(progress['message']['id'])
+        recalculating = message.get('recalculating') or {}
+        if recalculating.get('status') == 'recalculated':
+            pending.discard(recalculating['name'])
+        answered = answered or message.get('response', {}).get('tag') == tag
+        if answered and not pending:
+            return errors
+
+async def session(app, port, choices, seed, deadline, think, results):
+    rng = random.Random(seed)
+    await asyncio.to_thread(lambda: urllib.request.urlopen(f'http://127.0.0.1:{port}/').read())
+
+    inputs = dict(initial_inputs(app, choices), **{'.clientdata_pixelratio': 1})
+    for name in outputs[app]:
+        inputs[f'.clientdata_output_{name}_hidden'] = False
+        inputs[f'.clientdata_output_{name}_width'] = 800
+        inputs[f'.clientdata_output_{name}_height'] = 400
+
+    async with websockets.connect(f'ws://127.0.0.1:{port}/websocket/', max_size=None) as ws:
+        start = time.perf_counter()
+        results['errors'] += await send_and_wait(ws, {'method': 'init', 'data': inputs}, 0)
+        results['init'].append(time.perf_counter() - start)
+        tag = 0
+
+        while time.time() < deadline:
+            await asyncio.sleep(rng.expovariate(1 / think))
+            for update in next_action(app, rng, choices):
+                # Vafrinn sendir ekki gildi sem hefur ekki breyst
+                update = {name: value for name, value in update.items() if inputs.get(name) != value}
+                if not update:
+                    continue
+                inputs.update(update)
+                tag += 1
+                start = time.perf_counter()
+                results['errors'] += await send_and_wait(ws, {'method': 'update', 'data': update}, tag)
+                results['latency'].append(time.perf_counter() - start)
+                # Á milli gilda þegar sleði er dreginn
+                await asyncio.sleep(0.05)
+
+async def run_step(app, port, pid, choices, sessions, duration, think):
+    results = {'init': [], 'latency': [], 'errors': 0}
+    baseline = rss_mb(pid)
+    peak = baseline
+    deadline = time.time() + duration
+
+    async def sample_rss():
+        nonlocal peak
+        while True:
+            current = rss_mb(pid)
+            if current is not None:
+                peak = max(peak, current)
+            await asyncio.sleep(0.25)
+
+    sampler = asyncio.create_task(sample_rss())
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        session(app, port, choices, seed, deadline, think, results) for seed in range(sessions)
+    ))
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+
+    latency = np.array(results['latency']) * 1000
+    p50, p95, p99 = np.percentile(latency, [50, 95, 99]) if len(latency) else (np.nan,) * 3
+    init_p50 = np.percentile(results['init'], 50) * 1000
+    rss = f"{peak:7.0f} MB  (+{(peak - baseline) / sessions:5.1f} MB/session)" if baseline is not None else '-'
+    print(f"{sessions:>4} session  {len(latency) / elapsed:7.1f} uppf./s   "
+          f"p50 {p50:7.1f}  p95 {p95:7.1f}  p99 {p99:7.1f} ms   opnun p50 {init_p50:7.1f} ms   "
+          f"RSS {rss}   villur {results['errors']}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--app', choices=sorted(outputs), default='activeapp')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--duration', type=float, default=15, help="sekúndur fyrir hvern fjölda session")
+    parser.add_argument('--think', type=float, default=1.0, help="meðalhlé notanda á milli aðgerða (s)")
+    parser.add_argument('--rows', type=int, default=0, help="stækka 'timataka' í svona margar línur")
+    parser.add_argument('--snapshot', action='store_true', help="byggja dálkaskrá fyrir gagnagrunninn")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.rows:
+            os.replace(enlarged_copy(args.rows, directory), os.path.join(directory, timataka_db.DB_PATH))
+        else:
+            directory = root
+        db_path = os.path.join(directory, timataka_db.DB_PATH)
+        if args.snapshot and not snapshot.is_current(db_path):
+            snapshot.build_snapshot(db_path)
+
+        conn = sqlite3.connect(db_path)
+        choices = {
+            'lengths': sorted({label for (label,) in conn.execute("SELECT length_label FROM race_length")}),
+            'athletes': [id_ for (id_,) in conn.execute("SELECT id FROM athlete ORDER BY id LIMIT 1000")],
+        }
+        total = conn.execute("SELECT COUNT(*) FROM timataka").fetchone()[0]
+        conn.close()
+        print(f"{args.app}: {total:,} línur, dálkaskrá {'já' if snapshot.is_current(db_path) else 'nei'}")
+
+        port = free_port()
+        server = start_server(args.app, directory, port)
+        try:
+            # Eitt session sem er ekki mælt, svo að innflutningur pakka og
+            # fyrsti lestur gagnanna lendi ekki á fyrsta mælda skrefinu
+            asyncio.run(session(args.app, port, choices, -1, 0, args.think, {'init': [], 'latency': [], 'errors': 0}))
+            for sessions in args.sessions:
+                asyncio.run(run_step(args.app, port, server.pid, choices, sessions, args.duration, args.think))
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# Minni sem gögn hlaupara taka (RaceData: 'hlaup_data', 'ar_data',
+# 'summary_data' og röðunin eftir lengd) með gagnagerðunum í
+# race_metrics.hlaup_schema, borið saman við gömlu framsetninguna (allir dálkar
+# eins og þeir komu úr SQLite, float64/int64, og raðað afrit af 'hlaup_data').
+# Mælt fyrir allar niðurstöður í einu lagi og fyrir hvern valinn hlaupara.
+# Keyrslan stöðvast með villu ef minnið fer yfir 'row_budget' bæti á línu
+# (auk 'dataset_budget' bæta fyrir hvert gagnasett, t.d. heiti lengdanna) eða
+# minnkar ekki a.m.k. 'min_ratio'-falt.
+#
+# Keyrsla:  python -m benchmarks.memory --rows 1000000 --athletes 20
+import argparse
+import random
+import sqlite3
+import tempfile
+
+import pandas as pd
+
+import race_data
+import timataka_db
+from benchmarks.athlete_load import enlarged_copy
+
+# Mesta leyfða minni (bæti) á hverja línu í 'hlaup_data' og á hvert gagnasett,
+# og minnsta leyfða minnkun
+row_budget = 80
+dataset_budget = 8 * 1024
+min_ratio = 4
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(deep=True, index=True).sum())
+
+# Minni RaceData eins og það er geymt í skyndiminni RaceDataStore
+def race_bytes(race):
+    return (frame_bytes(race.hlaup_data) + frame_bytes(race.ar_data) + frame_bytes(race.summary_data)
+            + race._by_length.nbytes + race._length_codes.nbytes)
+
+# Gamla framsetningin: sameinuðu töflurnar án gagnagerðanna ásamt afritinu
+# sem var raðað eftir ('Length', 'hlaup_id')
+def legacy_bytes(hlaup_data, ar_data, summary_data):
+    by_length = hlaup_data.dropna(subset=['Length']).sort_values(['Length', 'hlaup_id'])
+    return frame_bytes(hlaup_data) + frame_bytes(by_length) + frame_bytes(ar_data) + frame_bytes(summary_data)
+
+def read_tables(db_path, athlete_id=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        hlaup_data = pd.read_sql_query(
+            "SELECT * FROM timataka WHERE athlete_id IS NOT NULL AND (?1 IS NULL OR athlete_id = ?1) ORDER BY athlete_id, id",
+            conn, params=(athlete_id,),
+        )
+        ar_data = pd.read_sql_query("SELECT * FROM ar_id_table", conn)
+        length_data = pd.read_sql_query(
+            "SELECT hlaup_id, length_label AS Length, distance_m AS Distance_m FROM race_length", conn
+        )
+    finally:
+        conn.close()
+    return hlaup_data, ar_data, length_data
+
+# Minni í gömlu og nýju framsetningunni fyrir sömu línurnar
+def measure(db_path, athlete_id=None):
+    hlaup_data, ar_data, length_data = read_tables(db_path, athlete_id)
+    legacy, legacy_ar = race_data.join_race_tables(hlaup_data, ar_data, length_data)
+    legacy = race_data.add_derived_metrics(legacy)
+    legacy_ar = legacy_ar[legacy_ar['hlaup_id'].isin(legacy['hlaup_id'])]
+    summary_data = race_data.summarize_lengths(legacy)
+
+    compact = race_data.RaceData(
+        summary_data,
+        race_data.apply_schema(legacy, race_data.hlaup_schema),
+        race_data.apply_schema(legacy_ar, race_data.ar_schema),
+    )
+    return len(legacy), legacy_bytes(legacy, legacy_ar, summary_data), race_bytes(compact)
+
+def report(label, datasets, rows, before, after):
+    print(f"{label:<24} {rows:>10,} línur   áður {before / 2**20:9.2f} MB ({before / rows:6.0f} B/línu)"
+          f"   nú {after / 2**20:9.2f} MB ({after / rows:6.0f} B/línu)   {before / after:5.1f}x")
+    limit = datasets * dataset_budget + rows * row_budget
+    assert after <= limit, f"{label}: {after:,} bæti, yfir {limit:,}"
+    assert before / after >= min_ratio, f"{label}: minnið minnkaði aðeins {before / after:.1f}-falt"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--athletes', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = enlarged_copy(args.rows, directory) if args.rows else timataka_db.DB_PATH
+        ids = [id_ for (id_,) in sqlite3.connect(db_path).execute("SELECT id FROM athlete")]
+
+        report('allir hlauparar', 1, *measure(db_path))
+
+        athletes = random.Random(0).sample(ids, min(args.athletes, len(ids)))
+        rows = before = after = 0
+        for athlete_id in athletes:
+            n, b, a = measure(db_path, athlete_id)
+            rows, before, after = rows + n, before + b, after + a
+        report(f'{len(athletes)} hlauparar', len(athletes), rows, before, after)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Biðtími (p50/p99) nafnaleitarinnar (timataka_db.search_athletes) eftir því
+# sem hlaupurum fjölgar. Nöfnin eru búin til úr fáum algengum íslenskum
+# nöfnum og föðurnöfnum, svo hvert orð kemur fyrir í mörgum nöfnum. Leitað
+# er að upphafi nafns og hluta föðurnafns eins og í innsláttarleit, og að
+# öllu nafninu án broddstafa og með einum staf of lítið í föðurnafninu;
+# fyrir síðustu tvær gerðirnar er einnig talið hversu oft rétti hlauparinn
+# er meðal niðurstaðnanna. Til samanburðar er leitað að nafninu án
+# broddstafa með LIKE '%...%' í 'athlete.name', sem les alla töfluna og
+# finnur ekkert.
+#
+# Keyrsla:  python -m benchmarks.name_search --athletes 10000 100000 1000000
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+import timataka_db
+
+first_names = """
+    Sigurjón Jón Guðrún Anna Ólafur Þórður Ægir Kristín Sigríður Helga Guðmundur Einar Björn Árni
+    Ásdís Þóra Halldór Magnús Stefán Jóhanna Ragnheiður Eyþór Ísak Óskar Hrafnhildur Bjarki Daði
+    Baldur Úlfur Sæunn Ernir Gunnar Katrín Margrét Þorsteinn Hildur Dagný Kári Arnar Elín Bergþóra
+    Hjördís Auður Snorri Tómas Védís Aðalsteinn Íris Ómar Unnur Brynja Fríða Haukur Valdís Þórey
+""".split()
+father_names = """
+    Sturlu Jóns Guðmundar Ólafs Þórðar Einars Björns Árna Halldórs Magnúsar Stefáns Kristjáns
+    Sigurðar Gunnars Helga Péturs Ragnars Eyþórs Óskars Baldurs Þorsteins Hauks Snorra Tómasar
+    Ómars Kára Arnars Aðalsteins Daða Bjarka Úlfs Ægis Sigurjóns Ásgeirs Hjálmars Friðriks
+""".split()
+
+def random_names(count, rng):
+    names = set()
+    while len(names) < count:
+        words = [rng.choice(first_names) for _ in range(rng.choice((1, 2, 2, 3)))]
+        words.append(rng.choice(father_names) + rng.choice(('son', 'dóttir')))
+        names.add(' '.join(words))
+    return sorted(names)
+
+def name_db(count, directory):
+    path = os.path.join(directory, f'athletes_{count}.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE athlete (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    names = random_names(count, random.Random(count))
+    random.Random(0).shuffle(names)
+    conn.executemany("INSERT INTO athlete (name) VALUES (?)", ((name,) for name in names))
+    timataka_db.create_athlete_search(conn)
+    conn.commit()
+    conn.close()
+    return path
+
+def like_search(query, limit=20):
+    return timataka_db.read_frame("SELECT id, name FROM athlete WHERE name LIKE ? LIMIT ?", (f'%{query}%', limit))
+
+# Leitarstrengir af hverri gerð fyrir nafnið 'name'
+def queries(name):
+    words = name.split()
+    key = timataka_db.search_key(name)
+    last = key.split()[-1]
+    return {
+        'upphaf': name[:len(words[0]) + 3],
+        'föðurnafn': words[-1][:6],
+        'án broddstafa': key,
+        'stafsetningarvilla': key[:-len(last)] + last[:3] + last[4:],
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--athletes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--like-queries', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.athletes:
+            start = time.perf_counter()
+            db_path = name_db(count, directory)
+            build_s = time.perf_counter() - start
+            timataka_db.pool = timataka_db.ConnectionPool(db_path)
+            with timataka_db.pool.connection() as conn:
+                # Orð sem byrja á leitarorðinu eru fundin í gegnum vísinn á 'search_word(word)'
+                plan = conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT word FROM search_word WHERE word >= ? AND word < ? ORDER BY word LIMIT ?",
+                    ('a', 'b', 10),
+                ).fetchall()
+                assert all('INDEX' in detail for *_, detail in plan), plan
+                targets = conn.execute(
+                    "SELECT id, name FROM athlete ORDER BY random() LIMIT ?", (args.queries,)
+                ).fetchall()
+
+            print(f"{count:>10,} hlauparar (vísir byggður á {build_s:.1f} s)")
+            for kind in queries(targets[0][1]):
+                times = []
+                hits = 0
+                for athlete_id, name in targets:
+                    start = time.perf_counter()
+                    found = timataka_db.search_athletes(queries(name)[kind])
+                    times.append(time.perf_counter() - start)
+                    hits += athlete_id in set(found['id'])
+                p50, p99 = np.percentile(times, [50, 99]) * 1000
+                recall = f"   rétti hlauparinn fannst í {hits / len(targets):.0%}" if kind in ('án broddstafa', 'stafsetningarvilla') else ''
+                print(f"  {kind:<20} p50 {p50:6.2f} ms  p99 {p99:6.2f} ms{recall}")
+
+            times = []
+            for _, name in targets[:args.like_queries]:
+                start = time.perf_counter()
+                like_search(queries(name)['án broddstafa'])
+                times.append(time.perf_counter() - start)
+            p50, p99 = np.percentile(times, [50, 99]) * 1000
+            print(f"  {'LIKE án broddstafa':<20} p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+            timataka_db.pool.close_all()
+
+if __name__ == '__main__':
+    main()
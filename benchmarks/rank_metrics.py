@@ -0,0 +1,86 @@
+# Biðtími (p50/p99) timataka_db.athlete_rank_metrics (sæti miðað við fjölda
+# keppenda, reiknað með gluggaföllum í SQLite) eftir því sem 'timataka'
+# stækkar, borið saman við að lesa allar línur hlaupanna og reikna sömu
+# stærðir í pandas. Fyrirspurnin á aðeins að lesa hlaup hlauparans í gegnum
+# vísana; keyrslan stöðvast með villu ef áætlun hennar skannar 'timataka'.
+#
+# Keyrsla:  python -m benchmarks.rank_metrics --rows 10000 100000 1000000
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import timataka_db
+from benchmarks.athlete_load import enlarged_copy
+from race_metrics import parse_times
+
+# Gamla leiðin: allar línur hlaupanna sóttar og unnið úr þeim í pandas
+def pandas_rank_metrics(athlete_id):
+    field = timataka_db.read_frame("""
+        SELECT t.id, t.hlaup_id, t.athlete_id, t.Rank, t.Time, t.Behind, h.fjoldi
+        FROM timataka t
+        LEFT JOIN hlaup h ON h.id = t.hlaup_id
+        WHERE t.hlaup_id IN (SELECT hlaup_id FROM timataka WHERE athlete_id = ?)
+    """, (athlete_id,))
+    field['Rank'] = pd.to_numeric(field['Rank'], errors='coerce')
+    field['fjoldi'] = field['fjoldi'].astype(float)
+    field = field[field['Rank'] >= 1].sort_values(['hlaup_id', 'Rank'])
+    field['time_s'] = parse_times(field['Time'])
+    races = field.groupby('hlaup_id')
+    field['percent_rank'] = (races['Rank'].rank(method='min') - 1) / (races['Rank'].transform('size') - 1).clip(lower=1)
+    field['winner_s'] = races['time_s'].transform('first')
+    data = field[field['athlete_id'] == athlete_id].sort_values(['hlaup_id', 'id'])
+    data['percentile'] = 100 * (1 - np.where(data['fjoldi'] >= data['Rank'],
+                                             (data['Rank'] - 1) / (data['fjoldi'] - 1).clip(lower=1),
+                                             data['percent_rank']))
+    data['gap_s'] = parse_times(data['Behind'])
+    data['rank_change'] = data['Rank'].shift() - data['Rank']
+    direction = np.sign(data['percentile'].diff().fillna(0))
+    run = (direction != direction.shift()).cumsum()
+    data['streak'] = direction * (direction.groupby(run).cumcount() + 1)
+    return data
+
+def latencies(fn, athlete_ids):
+    times = []
+    for athlete_id in athlete_ids:
+        start = time.perf_counter()
+        fn(athlete_id)
+        times.append(time.perf_counter() - start)
+    return np.percentile(times, [50, 99]) * 1000
+
+# Áætlun fyrirspurnarinnar má ekki skanna 'timataka' án vísis
+def check_plan(conn):
+    plan = conn.execute("EXPLAIN QUERY PLAN " + timataka_db.rank_metrics_query, (1,)).fetchall()
+    scans = [detail for *_, detail in plan if detail.startswith('SCAN t') and 'INDEX' not in detail]
+    assert not scans, f"Fyrirspurnin skannar töfluna: {scans}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--loads', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in [0] + args.rows:
+            db_path = enlarged_copy(rows, directory) if rows else timataka_db.DB_PATH
+            conn = sqlite3.connect(db_path)
+            total = conn.execute("SELECT COUNT(*) FROM timataka").fetchone()[0]
+            ids = [id_ for (id_,) in conn.execute("SELECT id FROM athlete")]
+            conn.close()
+
+            timataka_db.pool = timataka_db.ConnectionPool(db_path)
+            with timataka_db.pool.connection() as conn:
+                check_plan(conn)
+            athlete_ids = random.Random(0).choices(ids, k=args.loads)
+            sql_p50, sql_p99 = latencies(timataka_db.athlete_rank_metrics, athlete_ids)
+            pandas_p50, pandas_p99 = latencies(pandas_rank_metrics, athlete_ids)
+            timataka_db.pool.close_all()
+            print(f"{total:>10,} línur   SQL p50 {sql_p50:7.2f} ms  p99 {sql_p99:7.2f} ms"
+                  f"   pandas p50 {pandas_p50:7.2f} ms  p99 {pandas_p99:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Kaldræsing gagnanna í öppunum: tími frá tómu RaceDataStore þar til gögn
+# sjálfgefna hlauparans og tiltekins fjölda annarra hlaupara eru tilbúin,
+# lesin beint úr SQLite annars vegar og úr dálkaskránni hins vegar.
+# Gagnagrunnurinn er stækkaður eins og í benchmarks.athlete_load.
+#
+# Keyrsla:  python -m benchmarks.snapshot --rows 1000000 --athletes 20
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+
+import race_data
+import snapshot
+import timataka_db
+from benchmarks.athlete_load import enlarged_copy
+
+def cold_start(db_path, use_snapshot, athletes):
+    timataka_db.pool = timataka_db.ConnectionPool(db_path)
+    start = time.perf_counter()
+    store = race_data.RaceDataStore(timataka_db.pool, use_snapshot=use_snapshot)
+    store.get()
+    first = time.perf_counter() - start
+    for athlete_id in athletes:
+        store.get(athlete_id)
+    total = time.perf_counter() - start
+    timataka_db.pool.close_all()
+    return first, total
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--athletes', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = enlarged_copy(args.rows, directory) if args.rows else timataka_db.DB_PATH
+        total = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM timataka").fetchone()[0]
+        ids = [id_ for (id_,) in sqlite3.connect(db_path).execute("SELECT id FROM athlete")]
+        athletes = random.Random(0).sample(ids, min(args.athletes, len(ids)))
+        print(f"{total:,} línur, {len(ids):,} hlauparar")
+
+        start = time.perf_counter()
+        snapshot.build_snapshot(db_path)
+        print(f"{'dálkaskrá byggð':<20} {time.perf_counter() - start:8.3f} s")
+
+        for label, use_snapshot in (('SQLite', False), ('dálkaskrá', True)):
+            first, all_ = cold_start(db_path, use_snapshot, athletes)
+            print(f"{label:<20} fyrsti hlaupari {first * 1000:8.2f} ms   +{len(athletes)} hlauparar {all_ * 1000:8.2f} ms")
+
+if __name__ == '__main__':
+    main()
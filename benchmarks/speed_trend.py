@@ -0,0 +1,70 @@
+# Kostnaður hallalínunnar í 'Hraði' flipanum (allar vegalengdir) við hverja
+# teikningu: gamla leiðin (px.scatter(..., trendline='ols'), sem sækir
+# statsmodels og scipy og metur líkan í hvert skipti) borin saman við
+# trend.py: stuðla úr summum sem voru reiknaðar fyrirfram, og hlaupandi og
+# Theil–Sen línurnar sem eru reiknaðar úr punktunum. Einnig er athugað að
+# summurnar, bæði reiknaðar í einu lagi og bættar við í bunkum, gefi sömu
+# línu og numpy.polyfit.
+#
+# Keyrsla:  python -m benchmarks.speed_trend --points 1000 10000 100000
+import argparse
+import importlib.util
+import time
+
+import numpy as np
+import pandas as pd
+
+from trend import LinearTrend, rolling_trend, theil_sen
+
+def best_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    import plotly.express as px
+
+    has_statsmodels = importlib.util.find_spec('statsmodels') is not None
+    if has_statsmodels:
+        start = time.perf_counter()
+        px.scatter(pd.DataFrame({'x': [0.0, 1.0], 'y': [0.0, 1.0]}), x='x', y='y', trendline='ols')
+        print(f"fyrsta trendline='ols' (sækir statsmodels og scipy): {(time.perf_counter() - start) * 1000:.0f} ms")
+    else:
+        print("statsmodels er ekki sett upp; gamla leiðin er ekki mæld")
+
+    rng = np.random.default_rng(0)
+    for points in args.points:
+        x = np.sort(rng.uniform(1, 1500, points))
+        y = 3 + 0.0005 * x + rng.normal(0, 0.5, points)
+        frame = pd.DataFrame({'x': x, 'y': y})
+
+        # Summurnar eiga að gefa sömu línu og polyfit, hvort sem þær eru reiknaðar í einu lagi eða í bunkum
+        expected = np.polyfit(x, y, 1)
+        incremental = LinearTrend()
+        for chunk in np.array_split(np.arange(points), 10):
+            incremental.add(x[chunk], y[chunk])
+        for trend in (LinearTrend.fit(x, y), incremental):
+            assert np.allclose(trend.coefficients(), expected, rtol=1e-6), (trend.coefficients(), expected)
+
+        stored = LinearTrend.fit(x, y)
+        timings = {
+            "stuðlar úr summum": best_ms(stored.coefficients, args.repeat),
+            "hlaupandi (20)": best_ms(lambda: rolling_trend(x, y, 20), args.repeat),
+            "Theil–Sen (200)": best_ms(lambda: theil_sen(x, y), args.repeat),
+        }
+        if has_statsmodels:
+            timings["trendline='ols'"] = best_ms(
+                lambda: px.scatter(frame, x='x', y='y', trendline='ols'), args.repeat
+            ) - best_ms(lambda: px.scatter(frame, x='x', y='y'), args.repeat)
+        print(f"{points:>9,} punktar   " + "   ".join(f"{name} {ms:8.3f} ms" for name, ms in timings.items()))
+
+if __name__ == '__main__':
+    main()
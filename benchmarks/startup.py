@@ -0,0 +1,82 @@
+# Ræsingartími appanna mældur með 'python -X importtime'. Hvert app er sótt
+# í nýju ferli nokkrum sinnum og besti tíminn borinn saman við hámark
+# (budget). Einnig er athugað að þungir pakkar séu ekki sóttir við ræsingu;
+# þeir eiga aðeins að vera sóttir þegar úttakið sem þarf þá er fyrst teiknað.
+# Skilar villukóða 1 ef eitthvað app fer yfir hámarkið.
+#
+# Keyrsla:  python -m benchmarks.startup --repeat 5
+import argparse
+import os
+import subprocess
+import sys
+
+# Hámarkstími (ms) fyrir 'import <app>' og pakkar sem mega ekki vera sóttir
+budgets = {
+    'activeapp': (900, ['matplotlib', 'plotly', 'shinywidgets', 'ipywidgets', 'IPython', 'statsmodels', 'scipy']),
+    'siggi_app': (900, ['matplotlib', 'plotly', 'statsmodels', 'scipy']),
+}
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Keyra 'import module' í nýju ferli; skilar línum importtime sem
+# (self µs, cumulative µs, nafn) og öllum pökkum sem voru sóttir
+def import_profile(module):
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=root, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows, set(result.stdout.split())
+
+# importtime skrifar pakka á eftir þeim sem þeir sóttu, svo pakkar einu
+# stigi neðar sem koma á undan línu 'module' (og á eftir fyrri línu á efsta
+# stigi) voru sóttir beint af 'module'
+def direct_imports(rows, module):
+    children = []
+    for _, cumulative, name in rows:
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                return children
+            children = []
+        elif depth == 1:
+            children.append((cumulative, name.strip()))
+    return []
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="sýna svona marga hægustu pakka")
+    args = parser.parse_args()
+
+    failed = False
+    for module, (budget_ms, forbidden) in budgets.items():
+        best = None
+        for _ in range(args.repeat):
+            rows, modules = import_profile(module)
+            total_ms = next(cumulative for _, cumulative, name in rows if name.strip() == module) / 1000
+            if best is None or total_ms < best[0]:
+                best = (total_ms, rows, modules)
+        total_ms, rows, modules = best
+
+        loaded = [name for name in forbidden if name in modules]
+        ok = total_ms <= budget_ms and not loaded
+        failed |= not ok
+        print(f"{module:<10} {total_ms:8.1f} ms  (hámark {budget_ms} ms)  {'í lagi' if ok else 'YFIR'}")
+        if loaded:
+            print(f"  sótt við ræsingu: {', '.join(loaded)}")
+
+        # Pakkarnir sem appið sækir beint, eftir heildartíma
+        for cumulative, name in sorted(direct_imports(rows, module), reverse=True)[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
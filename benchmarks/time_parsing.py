@@ -0,0 +1,75 @@
+# Samanburður á vektorvæddu tímaþáttuninni (race_metrics.parse_times) og gömlu
+# föllunum sem unnu eina línu í einu með Series.apply.
+#
+# Keyrsla:  python -m benchmarks.time_parsing --rows 1000000
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from race_metrics import parse_times
+
+# Gamla útgáfan úr activeapp.py
+def time_to_seconds(time_str):
+    try:
+        return pd.to_timedelta(time_str).total_seconds()
+    except:
+        try:
+            return pd.to_timedelta('00:' + time_str).total_seconds()
+        except:
+            return None
+
+# Gamla útgáfan úr siggi_app.py
+def convert_to_seconds(time_str):
+    try:
+        if '.' in time_str:
+            h, m, s = map(float, time_str.split(':'))
+        else:
+            h, m, s = map(int, time_str.split(':'))
+        return h * 3600 + m * 60 + s
+    except Exception:
+        return None
+
+# Búa til dálk af strengjum sem líkjast 'Time', 'Race Time' og 'Behind' á timataka.net
+def synthetic_times(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    total = rng.integers(10 * 60, 24 * 3600, rows)
+    hours, rest = np.divmod(total, 3600)
+    minutes, seconds = np.divmod(rest, 60)
+    hhmmss = pd.Series([f'{h:02d}:{m:02d}:{s:02d}' for h, m, s in zip(hours, minutes, seconds)])
+    fraction = pd.Series([f'.{c:02d}' for c in rng.integers(0, 100, rows)])
+    behind = pd.Series([f'+{m:02d}:{s:02d}' for m, s in zip(minutes, seconds)])
+
+    kind = rng.integers(0, 10, rows)
+    values = hhmmss.where(kind < 6, hhmmss + fraction)
+    values = values.where(kind < 8, behind)
+    values = values.where(kind < 9, '')
+    return values
+
+def timed(label, func, values):
+    start = time.perf_counter()
+    result = func(values)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<40} {elapsed:8.3f} s  ({len(values) / elapsed:,.0f} raðir/s)')
+    return np.asarray(result, dtype='float64')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    values = synthetic_times(args.rows)
+    print(f'{args.rows:,} tímastrengir, {values.nunique():,} einstakir')
+
+    new = timed('parse_times (vektorvætt)', parse_times, values)
+    old = timed('time_to_seconds (Series.apply)', lambda v: v.apply(time_to_seconds), values)
+    timed('convert_to_seconds (Series.apply)', lambda v: v.apply(convert_to_seconds), values)
+
+    # Gamla fallið skilar NaN fyrir '+MM:SS' strengi sem það skilur ekki,
+    # svo við berum aðeins saman línur þar sem það fann gildi
+    both = ~np.isnan(old)
+    assert np.allclose(new[both], old[both]), 'parse_times og time_to_seconds eru ósammála'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import threading
+
+import pandas as pd
+
+# Tafla sem er birt síðu fyrir síðu. Röðun eftir hverjum dálki er reiknuð
+# einu sinni (þegar fyrst er beðið um hana) og geymd, svo að það að fletta,
+# raða eða sía þýðir aðeins að velja línur úr tilbúnum röðunum. Aðeins
+# línurnar á síðunni sem er skoðuð eru sendar í vafrann.
+class TableView:
+    def __init__(self, frame, default_sort=None):
+        self.frame = frame.reset_index(drop=True)
+        self.default_sort = default_sort if default_sort in self.frame.columns else self.frame.columns[0]
+        self._orders = {}
+        self._search_text = None
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self):
+        return list(self.frame.columns)
+
+    # Línunúmer töflunnar raðað eftir 'column'; NaN og tóm gildi aftast
+    def sort_order(self, column, ascending=True):
+        key = (column, ascending)
+        order = self._orders.get(key)
+        if order is None:
+            values = self.frame[column]
+            try:
+                order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+            except TypeError:
+                # Dálkar með blönduðum gerðum (t.d. tölur og tómir strengir)
+                order = values.astype(str).sort_values(ascending=ascending, kind='stable').index.to_numpy()
+            with self._lock:
+                self._orders[key] = order
+        return order
+
+    # Allir dálkar línunnar í einum lágstafastreng, notað til að sía
+    def _search(self):
+        if self._search_text is None:
+            columns = [self.frame[column].astype(str) for column in self.frame.columns]
+            text = columns[0]
+            for column in columns[1:]:
+                text = text + '\t' + column
+            self._search_text = text.str.lower().to_numpy(dtype=object)
+        return self._search_text
+
+    # Línunúmer sem passa við síuna, í þeirri röð sem beðið er um
+    def rows(self, sort_column=None, ascending=True, filter_text=''):
+        if sort_column not in self.frame.columns:
+            sort_column = self.default_sort
+        order = self.sort_order(sort_column, ascending)
+        filter_text = (filter_text or '').strip().lower()
+        if not filter_text:
+            return order
+        mask = pd.Series(self._search()).str.contains(filter_text, regex=False).to_numpy()
+        return order[mask[order]]
+
+    # Ein síða af töflunni út frá línunúmerum sem 'rows' skilaði
+    def page(self, rows, page, page_size):
+        start = (page - 1) * page_size
+        return self.frame.iloc[rows[start:start + page_size]]
+
+# Fjöldi síðna fyrir 'total_rows' línur, a.m.k. ein
+def page_count(total_rows, page_size):
+    return max(1, -(-total_rows // page_size))
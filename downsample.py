@@ -0,0 +1,81 @@
+# Fækkun punkta í línuritum svo að stærð myndanna og teiknitími í vafranum
+# haldist takmörkuð óháð því hve mörg hlaup eru í gögnunum. Aðeins sá hluti
+# x-ássins sem sést ('x_range') er tekinn með og honum fækkað í 'max_points'
+# punkta með LTTB (Largest-Triangle-Three-Buckets), sem heldur lögun línunnar.
+# Mjög stórar raðir eru fyrst minnkaðar með lággildi/hágildi hvers bils svo
+# að LTTB lykkjan fari yfir fáa punkta.
+import numpy as np
+
+# Mesti fjöldi punkta sem sendur er í vafrann fyrir hverja mynd
+max_points = 2000
+# Yfir þessum fjölda punkta er teiknað með WebGL (scattergl) í stað SVG
+webgl_threshold = 1000
+
+# Vísar punktanna sem LTTB heldur; fyrsti og síðasti punkturinn eru alltaf með
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Punktunum á milli fyrsta og síðasta er skipt í threshold - 2 bil
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(int), n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Meðaltal næsta bils (síðasta punktsins fyrir síðasta bilið)
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Punkturinn sem myndar stærsta þríhyrninginn með síðasta valda punkti og meðaltalinu
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+# Vísar lággildis og hágildis 'y' í hverju af 'buckets' jafnstórum bilum
+def minmax_indices(y, buckets):
+    n = len(y)
+    size = -(-n // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    # Aftasta bilin geta verið tóm ef n gengur ekki upp í 'buckets'
+    filled = ~np.isnan(rows).all(axis=1)
+    offsets = np.arange(buckets)[filled] * size
+    rows = rows[filled]
+    return np.unique(np.concatenate([
+        offsets + np.nanargmin(rows, axis=1),
+        offsets + np.nanargmax(rows, axis=1),
+        [0, n - 1],
+    ]))
+
+# Línurnar í 'data' (raðað eftir 'x') sem á að teikna fyrir sýnilega bilið
+# 'x_range' (allur ásinn ef None). Einum punkti utan bilsins er haldið hvorum
+# megin svo að línan nái út að jöðrunum.
+def level_of_detail(data, x, y, x_range=None, points=max_points):
+    if x_range is not None:
+        low, high = sorted(x_range)
+        xs = data[x].to_numpy(dtype=float)
+        start = max(int(np.searchsorted(xs, low, 'left')) - 1, 0)
+        end = min(int(np.searchsorted(xs, high, 'right')) + 1, len(xs))
+        data = data.iloc[start:end]
+    if len(data) <= points:
+        return data
+
+    data = data[data[y].notna()]
+    xs = data[x].to_numpy(dtype=float)
+    ys = data[y].to_numpy(dtype=float)
+    index = np.arange(len(data))
+    if len(data) > 4 * points:
+        index = minmax_indices(ys, 2 * points)
+    index = index[lttb_indices(xs[index], ys[index], points)]
+    return data.iloc[index]
+
+# Teiknihamur fyrir plotly.express eftir heildarfjölda punkta. Hann fer eftir
+# öllum gögnunum en ekki sýnilega bilinu svo að tegund ferlanna (scatter eða
+# scattergl) haldist sú sama þegar notandinn þysjar.
+def render_mode(points):
+    return 'webgl' if points > webgl_threshold else 'auto'
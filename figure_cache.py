@@ -0,0 +1,125 @@
+import base64
+import io
+import json
+import threading
+
+from shiny import render
+from shiny.session import require_active_session
+
+from background import BackgroundValue
+from lru_cache import LRUCache
+
+# Teiknaðar PNG myndir (sem data: URI) fyrir öll session í ferlinu
+png_cache = LRUCache(maxsize=256)
+
+# Ný matplotlib mynd af tiltekinni stærð í pixlum, án pyplot stöðu. Myndin
+# er ekki skráð neins staðar svo hún losnar um leið og hún er ekki lengur í notkun.
+# matplotlib er ekki sótt fyrr en fyrsta myndin er teiknuð.
+def new_figure(width_px, height_px, dpi=100):
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi, layout='tight')
+
+# Vista mynd sem PNG og skila sem data: URI
+def figure_to_data_uri(fig, dpi):
+    with io.BytesIO() as buf:
+        fig.savefig(buf, format='png', dpi=dpi)
+        data_str = base64.b64encode(buf.getvalue()).decode('utf-8')
+    return "data:image/png;base64," + data_str
+
+# Eins og @render.plot nema fallið skilar (key, draw) í stað myndar.
+# 'draw(fig)' teiknar á tóma mynd og er aðeins kallað ef PNG myndin fyrir
+# (key, stærð ílátsins, pixlahlutfall) er ekki þegar í 'png_cache'. 'key'
+# á að innihalda nafn myndarinnar, valin inntök og útgáfu gagnanna. Mynd
+# sem er ekki í skyndiminninu er teiknuð í bakgrunnsþræði (sjá background.py).
+class cached_plot(render.plot):
+    def __init__(self, _fn=None, **kwargs):
+        super().__init__(_fn, **kwargs)
+        self._app = getattr(_fn, '__module__', '')
+        self._drawing = None
+
+    async def render(self):
+        session = require_active_session(None)
+        name = session.ns(self.output_id)
+        inputs = session.root_scope().input
+
+        pixelratio = inputs[".clientdata_pixelratio"]()
+        width = inputs[f".clientdata_output_{name}_width"]()
+        height = inputs[f".clientdata_output_{name}_height"]()
+
+        key, draw = await self.fn()
+
+        def create():
+            fig = new_figure(width, height)
+            draw(fig)
+            return figure_to_data_uri(fig, fig.get_dpi() * pixelratio)
+
+        key = (key, width, height, pixelratio)
+        src = png_cache.get(key)
+        if src is None:
+            if self._drawing is None:
+                self._drawing = BackgroundValue(self._app, self.output_id)
+            src = self._drawing(key, lambda: png_cache.get_or_create(key, create))
+
+        res = {
+            "src": src,
+            "width": "100%",
+            "height": "100%",
+        }
+        if self.alt is not None:
+            res["alt"] = self.alt
+        return res
+
+# Plotly myndir sem JSON strengir, deilt á milli allra session-a
+plotly_cache = LRUCache(maxsize=512)
+
+# plotly.express býr til hluti í sameiginlega sniðmátinu (template) þegar
+# þeir eru fyrst lesnir og það er ekki óhætt í tveimur þráðum samtímis. Áður
+# en fyrsta myndin er búin til er því ein mynd af hverri tegund sem öppin
+# nota búin til í einum þræði; eftir það er sniðmátið aðeins lesið.
+_template_lock = threading.Lock()
+_template_ready = False
+
+def prepare_plotly_template():
+    global _template_ready
+    if _template_ready:
+        return
+    with _template_lock:
+        if not _template_ready:
+            import pandas as pd
+            import plotly.express as px
+
+            data = pd.DataFrame({'x': [1, 2], 'y': [1, 2]})
+            for chart in (px.line, px.scatter):
+                chart(data, x='x', y='y')
+                chart(data, x='x', y='y', render_mode='webgl')
+            px.bar(data, x='x', y='y')
+            px.pie(data, values='y', names='x')
+            _template_ready = True
+
+# JSON fyrir Plotly mynd; 'build()' er aðeins kallað ef 'key' er ekki í skyndiminninu
+def cached_plotly_json(key, build):
+    def create():
+        prepare_plotly_template()
+        return build().to_json()
+
+    return plotly_cache.get_or_create(key, create)
+
+# FigureWidget úr JSON, tilbúin fyrir @render_plotly. JSON var þegar
+# staðfest þegar myndin var búin til, svo við sleppum staðfestingunni hér;
+# hún er dýrasti hlutinn af því að búa til FigureWidget. Stærð JSON fylgir
+# myndinni ('_payload_bytes') svo metrics.py þurfi ekki að búa það til aftur.
+def plotly_widget(json_str):
+    import plotly.graph_objects as go
+
+    widget = go.FigureWidget(json.loads(json_str), _validate=False)
+    widget._payload_bytes = len(json_str)
+    return widget
+
+# Plotly mynd úr skyndiminninu; mynd sem er ekki í skyndiminninu er búin til
+# í bakgrunnsþræði. 'background' er BackgroundValue úttaksins. Kallað úr úttaki.
+def background_plotly(background, key, build):
+    json_str = plotly_cache.get(key)
+    if json_str is None:
+        json_str = background(key, lambda: cached_plotly_json(key, build))
+    return plotly_widget(json_str)
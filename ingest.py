@@ -0,0 +1,259 @@
+# Setja CSV skrár frá timataka.net inn í siggi_timataka.db.
+#
+# Keyrsla:  python ingest.py CSV/siggi_hlaup.csv CSV/siggi_hlaup_summary.csv
+#
+# Tegund hverrar skráar er fundin út frá dálkaheitunum:
+#   niðurstöður  (hlaup_id, BIB, Rank, Name, Time, ...)  -> timataka
+#   lengdir      (Length, IDs)                           -> race_length
+#   hlaup        (id, nafn, upphaf, fjoldi)              -> hlaup og ar_id_table
+#   ár           (ar, id)                                -> ar_id_table
+#
+# Línur eru settar inn í bunkum með executemany, einni færslu (transaction)
+# á hvern bunka. Niðurstöður eru uppfærðar eftir (hlaup_id, BIB) svo það er
+# óhætt að keyra sömu skrá aftur; niðurstöður án rásnúmers eru uppfærðar
+# eftir (hlaup_id, Name, Time). SHA-256 af hverri skrá er geymt í
+# 'ingested_file' og óbreyttum skrám er sleppt. Nýjar niðurstöður eru
+# tengdar við hlaupara í 'athlete' töflunni eftir nafni eða samnefni
+# ('athlete_alias'), millitímar þeirra þáttaðir í 'split' töfluna og
+# tímarnir í sekúndur ('time_s', 'behind_s'). Aðeins þær línur í
+# 'siggi_hlaup_summary' sem tilheyra lengdum sem breyttust eru
+# endurreiknaðar, og aðeins samantekt ('athlete_year_rollup'), summur
+# hallalínu hraðans ('speed_trend') og nafnaleit ('athlete_search') þeirra
+# hlaupara sem eiga niðurstöður í hlaupunum. Í framvindu hlauparanna
+# ('athlete_progression') eru aðeins línurnar frá fyrsta breytta hlaupinu
+# reiknaðar aftur.
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import snapshot
+import timataka_db
+
+chunk_size = 50_000
+
+# Dálkar í 'timataka' og nöfnin sem þeir geta haft í CSV skránum (lágstafir)
+result_columns = {
+    'hlaup_id': 'hlaup_id',
+    'rank': 'Rank',
+    'bib': 'BIB',
+    'name': 'Name',
+    'split': 'Split',
+    'time': 'Time',
+    'behind': 'Behind',
+    'race time': 'Race Time',
+    'laps': 'Laps',
+}
+
+# SHA-256 af skrá, lesin í bútum
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Finna tegund skráar út frá dálkaheitunum
+def detect_kind(columns):
+    columns = {column.strip().lower() for column in columns}
+    if {'hlaup_id', 'bib'} <= columns:
+        return 'results'
+    if {'length', 'ids'} <= columns:
+        return 'lengths'
+    if {'id', 'nafn'} <= columns:
+        return 'races'
+    if {'ar', 'id'} <= columns:
+        return 'years'
+    raise ValueError(f"Þekki ekki dálkana {sorted(columns)}")
+
+# Talnadálkar (lágstafir) sem fá NULL ef gildið vantar. 'bib' er ekki með:
+# niðurstöður án rásnúmers eru auðkenndar með BIB = '' (sjá
+# timataka_db.create_result_keys), en NULL myndi aldrei rekast á lykil.
+numeric_columns = {'hlaup_id', 'rank', 'laps', 'id', 'fjoldi', 'ar'}
+
+# Gildi sem vantar verða NULL í talnadálkum og tómur strengur í
+# textadálkum, og tölur eru heiltölur; pandas les þær sem fleytitölur ef
+# eitthvað vantar
+def clean_chunk(chunk):
+    chunk = chunk.rename(columns=lambda column: column.strip().lower())
+    for column in chunk.columns:
+        values = chunk[column]
+        if values.dtype.kind == 'f':
+            whole = values.dropna()
+            if (whole == whole.round()).all():
+                values = values.astype('Int64')
+        chunk[column] = values.astype(object).where(values.notna(), None if column in numeric_columns else '')
+    return chunk
+
+def ingest_results(conn, chunk, changed):
+    missing = [name for name in result_columns if name not in chunk.columns]
+    for name in missing:
+        chunk[name] = None if name in numeric_columns else ''
+    # Hlauparar sem áttu niðurstöður í hlaupunum fyrir innsetningu; nafn
+    # gæti hafa breyst svo samantekt þeirra er einnig reiknuð aftur
+    hlaup_ids = {int(id_) for id_ in chunk['hlaup_id'].unique()}
+    changed['athlete_ids'].update(timataka_db.athletes_in_races(conn, hlaup_ids))
+    columns = ', '.join(f'"{column}"' for column in result_columns.values())
+    # Niðurstöður án rásnúmers eru auðkenndar með nafni og tíma í staðinn
+    # (sjá timataka_db.create_result_keys)
+    no_bib = chunk['bib'].astype(str).str.strip() == ''
+    for rows, key in ((chunk[~no_bib], ('hlaup_id', 'BIB')), (chunk[no_bib], ('hlaup_id', 'Name', 'Time'))):
+        if rows.empty:
+            continue
+        updates = ', '.join(f'"{column}" = excluded."{column}"' for column in result_columns.values() if column not in key)
+        condition = "BIB <> ''" if 'BIB' in key else "BIB = ''"
+        # Nafnið gæti hafa breyst, svo uppfærðar línur eru tengdar aftur við hlaupara
+        conn.executemany(f"""
+            INSERT INTO timataka ({columns}) VALUES ({', '.join('?' * len(result_columns))})
+            ON CONFLICT({', '.join(f'"{column}"' for column in key)}) WHERE {condition}
+            DO UPDATE SET {updates}, athlete_id = NULL
+        """, rows[list(result_columns)].itertuples(index=False, name=None))
+    timataka_db.assign_athletes(conn)
+    timataka_db.refresh_splits(conn, hlaup_ids)
+    timataka_db.refresh_result_seconds(conn, hlaup_ids)
+    changed['hlaup_ids'].update(hlaup_ids)
+
+def ingest_lengths(conn, chunk, changed):
+    rows = []
+    for length_label, ids_str in zip(chunk['length'], chunk['ids']):
+        for id_ in str(ids_str).split(','):
+            if id_.strip():
+                rows.append((int(id_), length_label, timataka_db.length_to_meters(length_label)))
+        changed['labels'].add(length_label)
+    changed['race_ids'].update(id_ for id_, _, _ in rows)
+    conn.executemany("""
+        INSERT INTO race_length (hlaup_id, length_label, distance_m) VALUES (?, ?, ?)
+        ON CONFLICT(hlaup_id) DO UPDATE SET length_label = excluded.length_label, distance_m = excluded.distance_m
+    """, rows)
+
+def ingest_races(conn, chunk, changed):
+    for column in ('upphaf', 'fjoldi'):
+        if column not in chunk.columns:
+            chunk[column] = None if column in numeric_columns else ''
+    rows = list(chunk[['id', 'nafn', 'upphaf', 'fjoldi']].itertuples(index=False, name=None))
+    conn.executemany("""
+        INSERT INTO hlaup (id, nafn, upphaf, fjoldi) VALUES (?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET nafn = excluded.nafn, upphaf = excluded.upphaf, fjoldi = excluded.fjoldi
+    """, rows)
+    years = [(timataka_db.year_from_name(nafn), id_) for id_, nafn, _, _ in rows]
+    replace_years(conn, [(year, id_) for year, id_ in years if year is not None])
+    ids = {int(id_) for id_, _, _, _ in rows}
+    timataka_db.refresh_race_years(conn, ids)
+    changed['race_ids'].update(ids)
+
+def ingest_years(conn, chunk, changed):
+    rows = list(chunk[['ar', 'id']].itertuples(index=False, name=None))
+    replace_years(conn, rows)
+    ids = {int(id_) for _, id_ in rows}
+    timataka_db.refresh_race_years(conn, ids)
+    changed['race_ids'].update(ids)
+
+# 'ar_id_table' hefur engan einkvæman lykil, svo við eyðum fyrst línum hlaupanna
+def replace_years(conn, rows):
+    ids = json.dumps([int(id_) for _, id_ in rows])
+    conn.execute("DELETE FROM ar_id_table WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+    conn.executemany("INSERT INTO ar_id_table (ar, id) VALUES (?, ?)", rows)
+
+ingesters = {
+    'results': ingest_results,
+    'lengths': ingest_lengths,
+    'races': ingest_races,
+    'years': ingest_years,
+}
+
+# Endurreikna línur 'siggi_hlaup_summary' fyrir lengdirnar sem breyttust.
+# Línur sem eru til eru uppfærðar á sínum stað svo röðin í töflunni haldist.
+# Taflan er fyrir sjálfgefna hlauparann (timataka_db.default_athlete), svo
+# 'Count' telur aðeins niðurstöður hans; önnur gögn hvers hlaupara eru
+# reiknuð úr 'timataka' (timataka_db.athlete_summary).
+def refresh_summary(conn, changed):
+    labels = set(changed['labels'])
+    if changed['hlaup_ids']:
+        ids = json.dumps(sorted(changed['hlaup_ids']))
+        labels.update(label for (label,) in conn.execute(
+            "SELECT DISTINCT length_label FROM race_length WHERE hlaup_id IN (SELECT value FROM json_each(?))", (ids,)
+        ))
+
+    athlete_id = conn.execute("""
+        SELECT coalesce(
+            (SELECT id FROM athlete WHERE name = ?1),
+            (SELECT athlete_id FROM athlete_alias WHERE name = ?1),
+            (SELECT min(id) FROM athlete)
+        )
+    """, (timataka_db.default_athlete,)).fetchone()[0]
+    for label in sorted(labels):
+        hlaup_ids = [id_ for (id_,) in conn.execute("SELECT hlaup_id FROM race_length WHERE length_label = ?", (label,))]
+        count = conn.execute("""
+            SELECT COUNT(*) FROM race_length r JOIN timataka t ON t.hlaup_id = r.hlaup_id
+            WHERE r.length_label = ? AND t.athlete_id = ?
+        """, (label, athlete_id)).fetchone()[0]
+        ids_str = ', '.join(sorted(str(id_) for id_ in hlaup_ids))
+        updated = conn.execute("UPDATE siggi_hlaup_summary SET Count = ?, IDs = ? WHERE Length = ?", (count, ids_str, label))
+        if updated.rowcount == 0:
+            conn.execute("INSERT INTO siggi_hlaup_summary (Length, Count, IDs) VALUES (?, ?, ?)", (label, count, ids_str))
+    return labels
+
+# Setja eina skrá inn; skilar fjölda lína eða None ef skránni var sleppt
+def ingest_file(conn, path, force=False):
+    key = os.path.abspath(path)
+    checksum = file_checksum(path)
+    previous = conn.execute("SELECT sha256 FROM ingested_file WHERE path = ?", (key,)).fetchone()
+    if previous and previous[0] == checksum and not force:
+        return None
+
+    changed = {'hlaup_ids': set(), 'labels': set(), 'race_ids': set(), 'athlete_ids': set()}
+    rows = 0
+    kind = None
+    for chunk in pd.read_csv(path, chunksize=chunk_size, dtype={'Split': str, 'Time': str, 'Behind': str}):
+        kind = kind or detect_kind(chunk.columns)
+        with conn:
+            ingesters[kind](conn, clean_chunk(chunk), changed)
+        rows += len(chunk)
+
+    with conn:
+        refresh_summary(conn, changed)
+        # Samantekt eftir ári og vegalengd fyrir hlauparana sem breytingarnar snerta
+        races = changed['hlaup_ids'] | changed['race_ids']
+        athlete_ids = changed['athlete_ids'] | timataka_db.athletes_in_races(conn, races)
+        if athlete_ids:
+            timataka_db.refresh_rollups(conn, athlete_ids)
+            timataka_db.refresh_speed_trends(conn, athlete_ids)
+            timataka_db.refresh_athlete_names(conn, athlete_ids)
+        if races:
+            timataka_db.refresh_progression(conn, races)
+        conn.execute("""
+            INSERT INTO ingested_file (path, sha256, kind, rows, ingested_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET sha256 = excluded.sha256, kind = excluded.kind,
+                rows = excluded.rows, ingested_at = excluded.ingested_at
+        """, (key, checksum, kind, rows, datetime.now(timezone.utc).isoformat()))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Setja CSV skrár frá timataka.net inn í gagnagrunninn")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--db', default=timataka_db.DB_PATH)
+    parser.add_argument('--force', action='store_true', help="setja skrár inn þó þær hafi ekki breyst")
+    args = parser.parse_args(argv)
+
+    timataka_db.migrate(args.db)
+    conn = sqlite3.connect(args.db)
+    try:
+        for path in args.files:
+            rows = ingest_file(conn, path, force=args.force)
+            if rows is None:
+                print(f"{path}: óbreytt, sleppt")
+            else:
+                print(f"{path}: {rows} línur")
+    finally:
+        conn.close()
+
+    # Öppin lesa úr dálkaskránni, svo hún er byggð aftur ef gagnagrunnurinn breyttist
+    if not snapshot.is_current(args.db):
+        print(f"Dálkaskrá: {snapshot.build_snapshot(args.db)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+# Einfalt LRU skyndiminni sem er óhætt að nota úr mörgum þráðum.
+# Þegar fleiri en 'maxsize' færslur eru komnar er sú elsta fjarlægð.
+class LRUCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    # Sækja gildi eða búa það til með 'create()' ef það er ekki til.
+    # 'create' er keyrt utan læsingarinnar svo hægar teikningar stoppi ekki aðra.
+    def get_or_create(self, key, create):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = create()
+            self.put(key, value)
+        return value
+
+    # Lyklarnir frá þeim elsta til þess sem var síðast notaður
+    def keys(self):
+        with self._lock:
+            return list(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,139 @@
+# Finna hlaupara sem eru líklega sami maðurinn undir ólíkum nöfnum (t.d.
+# 'Sigurjón Ernir' og 'Sigurjon Ernir Sturluson') og sameina þá.
+#
+# Keyrsla:  python merge_athletes.py                 sýna líklegar tvítekningar
+#           python merge_athletes.py --apply         sameina alla hópana sem eru sýndir
+#           python merge_athletes.py --merge 1 2 5   sameina hlaupara 2 og 5 við hlaupara 1
+#
+# Pör eru fundin með nafnaleitinni (timataka_db.search_athletes), svo hvert
+# nafn er aðeins borið saman við þau sem líkjast því mest. Par telst líklegt
+# ef líkindi lyklanna (name_similarity) eru a.m.k. '--min-similarity', eða ef
+# öll orð styttra nafnsins (a.m.k. tvö) eru í hinu, og hlaupararnir hafa
+# aldrei verið skráðir í sama hlaupið. Pörin eru tengd saman í hópa.
+#
+# Við sameiningu fá niðurstöðurnar 'athlete_id' fyrsta hlauparans í hópnum
+# (þess sem á flestar niðurstöður), nöfn hinna verða samnefni hans í
+# 'athlete_alias', svo að nýjar niðurstöður undir þeim tengjast honum við
+# innsetningu, og samantekt, framvinda, hallalína hraðans og nafnaleitin eru
+# reiknaðar aftur fyrir hlauparana.
+import argparse
+import json
+import sqlite3
+
+import snapshot
+import timataka_db
+
+# Fjöldi nafna sem hvert nafn er borið saman við
+candidate_count = 20
+
+def is_candidate(a, b, min_similarity):
+    if timataka_db.name_similarity(a, b) >= min_similarity:
+        return True
+    shorter, longer = sorted((a.split(), b.split()), key=len)
+    return len(shorter) >= 2 and set(shorter) <= set(longer)
+
+# Hvort tveir hlauparar hafa verið skráðir í sama hlaupið
+def shared_race(conn, a, b):
+    return conn.execute("""
+        SELECT 1 FROM timataka x JOIN timataka y ON y.athlete_id = ? AND y.hlaup_id = x.hlaup_id
+        WHERE x.athlete_id = ?
+        LIMIT 1
+    """, (b, a)).fetchone() is not None
+
+# Hópar líklegra tvítekninga, hver sem listi af (id, nafn, fjöldi niðurstaðna),
+# sá sem á flestar niðurstöður fremst
+def find_duplicates(conn, min_similarity=0.6):
+    athletes = {id_: (name, timataka_db.search_key(name)) for id_, name in conn.execute("SELECT id, name FROM athlete")}
+    parent = {}
+
+    def root(id_):
+        while parent.get(id_, id_) != id_:
+            id_ = parent[id_]
+        return id_
+
+    for athlete_id, (name, key) in athletes.items():
+        for other_id in timataka_db.search_athletes(name, candidate_count)['id']:
+            if root(other_id) == root(athlete_id):
+                continue
+            if is_candidate(key, athletes[other_id][1], min_similarity) and not shared_race(conn, athlete_id, other_id):
+                parent[root(other_id)] = root(athlete_id)
+
+    groups = {}
+    for athlete_id in athletes:
+        groups.setdefault(root(athlete_id), []).append(athlete_id)
+    counts = dict(conn.execute("SELECT athlete_id, COUNT(*) FROM timataka WHERE athlete_id IS NOT NULL GROUP BY athlete_id"))
+    clusters = []
+    for ids in groups.values():
+        if len(ids) > 1:
+            members = [(id_, athletes[id_][0], counts.get(id_, 0)) for id_ in ids]
+            clusters.append(sorted(members, key=lambda member: (-member[2], member[0])))
+    return sorted(clusters, key=lambda members: members[0][1])
+
+# Sameina hlauparana 'athlete_ids' við hlaupara 'target_id'
+def merge_athletes(conn, target_id, athlete_ids):
+    merged = sorted({int(id_) for id_ in athlete_ids} - {target_id})
+    ids = json.dumps(merged)
+    hlaup_ids = [hlaup_id for (hlaup_id,) in conn.execute(
+        "SELECT DISTINCT hlaup_id FROM timataka WHERE athlete_id IN (SELECT value FROM json_each(?))", (ids,)
+    )]
+    conn.execute("UPDATE timataka SET athlete_id = ? WHERE athlete_id IN (SELECT value FROM json_each(?))", (target_id, ids))
+    conn.execute("UPDATE athlete_alias SET athlete_id = ? WHERE athlete_id IN (SELECT value FROM json_each(?))", (target_id, ids))
+    conn.execute("""
+        INSERT OR REPLACE INTO athlete_alias (name, athlete_id)
+        SELECT name, ? FROM athlete WHERE id IN (SELECT value FROM json_each(?))
+    """, (target_id, ids))
+    for table in ('athlete_year_rollup', 'speed_trend', 'athlete_progression'):
+        conn.execute(f"DELETE FROM {table} WHERE athlete_id IN (SELECT value FROM json_each(?))", (ids,))
+    conn.execute("DELETE FROM athlete WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+
+    timataka_db.refresh_rollups(conn, [target_id])
+    timataka_db.refresh_speed_trends(conn, [target_id])
+    timataka_db.refresh_progression(conn, hlaup_ids)
+    timataka_db.refresh_athlete_names(conn, [target_id, *merged])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Finna og sameina hlaupara sem eru skráðir undir fleiri en einu nafni")
+    parser.add_argument('--db', default=timataka_db.DB_PATH)
+    parser.add_argument('--min-similarity', type=float, default=0.6, help="lægstu líkindi nafna í sama hópi (0-1)")
+    parser.add_argument('--apply', action='store_true', help="sameina alla hópana sem finnast")
+    parser.add_argument('--merge', type=int, nargs='+', metavar='ID', help="sameina hlauparana við þann fyrsta")
+    args = parser.parse_args(argv)
+
+    timataka_db.migrate(args.db)
+    timataka_db.pool = timataka_db.ConnectionPool(args.db)
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.merge:
+            known = {id_ for (id_,) in conn.execute(
+                "SELECT id FROM athlete WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(args.merge),)
+            )}
+            missing = [id_ for id_ in args.merge if id_ not in known]
+            if missing:
+                parser.error(f"Enginn hlaupari með id {', '.join(map(str, missing))}")
+            clusters = [[(id_, None, None) for id_ in args.merge]]
+        else:
+            clusters = find_duplicates(conn, args.min_similarity)
+            for number, members in enumerate(clusters, start=1):
+                print(f"Hópur {number}:")
+                for id_, name, count in members:
+                    print(f"  {id_:>8}  {name:<40} {count:>5} niðurstöður")
+            if not clusters:
+                print("Engar líklegar tvítekningar fundust")
+            if not args.apply:
+                return
+
+        for members in clusters:
+            target_id, *others = [id_ for id_, _, _ in members]
+            with conn:
+                merge_athletes(conn, target_id, others)
+            print(f"Sameinað við {target_id}: {', '.join(map(str, others))}")
+    finally:
+        conn.close()
+        timataka_db.pool.close_all()
+
+    # Öppin lesa úr dálkaskránni, svo hún er byggð aftur ef gagnagrunnurinn breyttist
+    if not snapshot.is_current(args.db):
+        print(f"Dálkaskrá: {snapshot.build_snapshot(args.db)}")
+
+if __name__ == '__main__':
+    main()
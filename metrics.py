@@ -0,0 +1,320 @@
+# Tímamælingar á úttökum og reactive.Calc föllum appanna, birtar á
+# Prometheus textasniði á /metrics.
+#
+#   @output
+#   @timed_output            # yfir @render.* / @render_plotly / @cached_plot
+#   @render.table
+#   def selected_data_table(): ...
+#
+#   @reactive.Calc
+#   @timed_calc              # undir @reactive.Calc
+#   def table_rows(): ...
+#
+# Verk sem keyra í bakgrunnsþræði (background.py) eru mæld sem kind="task".
+#
+# Fyrir hvert úttak er talið hversu oft það er reiknað, tímadreifing
+# (histogram), fjöldi lína sem fallið skilaði og stærð þess sem er sent í
+# vafrann. Sömu tölur eru geymdar fyrir hvert session á meðan það lifir.
+#
+# cProfile: ef umhverfisbreytan RENDER_PROFILE_DIR er sett er hægt að opna
+# appið með ?profile=1 og þá eru öll mæld föll þess session keyrð undir
+# cProfile. Niðurstaðan er skrifuð í <RENDER_PROFILE_DIR>/<app>-<session>.prof
+# þegar session lýkur. Önnur session sem keyra á meðan úttak bíður (await)
+# geta lent með í prófílnum.
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import parse_qs
+
+from shiny import reactive
+from shiny.render.renderer import AsyncValueFn
+from shiny.session import get_current_session
+from shiny.types import SilentException
+
+# Efri mörk (sekúndur) hólfanna í tímadreifingunni
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Stats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.payload_bytes = 0
+        self.bucket_counts = [0] * len(buckets)
+
+    def observe(self, seconds, rows, payload_bytes, error):
+        self.count += 1
+        self.errors += error
+        self.seconds += seconds
+        self.rows += rows or 0
+        self.payload_bytes += payload_bytes or 0
+        for i, bound in enumerate(buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+# Allar mælingar ferlisins. Lyklar eru (app, kind, name) og fyrir hvert
+# session (app, kind, name, session_id); session línum er eytt þegar það lýkur.
+# Mælingar utan session (session_id None, t.d. /api) eru aðeins í heildartölunum.
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outputs = {}
+        self._sessions = {}
+        self._profiles = {}
+
+    def observe(self, app, kind, name, session_id, seconds, rows=None, payload_bytes=None, error=False):
+        with self._lock:
+            targets = [(self._outputs, (app, kind, name))]
+            if session_id is not None:
+                targets.append((self._sessions, (app, kind, name, session_id)))
+            for stats, key in targets:
+                if key not in stats:
+                    stats[key] = _Stats()
+                stats[key].observe(seconds, rows, payload_bytes, error)
+
+    def forget_session(self, session_id):
+        with self._lock:
+            for key in [key for key in self._sessions if key[3] == session_id]:
+                del self._sessions[key]
+
+    # Mælingarnar á Prometheus textasniði
+    def render_prometheus(self):
+        with self._lock:
+            outputs = sorted(self._outputs.items())
+            sessions = sorted(self._sessions.items())
+
+        lines = [
+            '# HELP shiny_render_seconds Tími sem það tók að reikna úttak eða reactive.Calc',
+            '# TYPE shiny_render_seconds histogram',
+        ]
+        for (app, kind, name), stats in outputs:
+            labels = f'app="{app}",kind="{kind}",name="{name}"'
+            cumulative = 0
+            for bound, count in zip(buckets, stats.bucket_counts):
+                cumulative += count
+                lines.append(f'shiny_render_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'shiny_render_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f'shiny_render_seconds_sum{{{labels}}} {stats.seconds:.6f}')
+            lines.append(f'shiny_render_seconds_count{{{labels}}} {stats.count}')
+
+        for metric, help_text, attr in (
+            ('shiny_render_errors_total', 'Fjöldi útreikninga sem enduðu með villu', 'errors'),
+            ('shiny_render_rows_total', 'Fjöldi lína (eða punkta) sem föllin skiluðu', 'rows'),
+            ('shiny_render_payload_bytes_total', 'Stærð þess sem var sent í vafrann (bæti)', 'payload_bytes'),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} counter')
+            for (app, kind, name), stats in outputs:
+                lines.append(f'{metric}{{app="{app}",kind="{kind}",name="{name}"}} {getattr(stats, attr)}')
+
+        for metric, help_text, attr in (
+            ('shiny_session_renders_total', 'Fjöldi útreikninga í hverju virku session', 'count'),
+            ('shiny_session_render_seconds_total', 'Heildartími útreikninga í hverju virku session', 'seconds'),
+            ('shiny_session_payload_bytes_total', 'Bæti send í vafrann í hverju virku session', 'payload_bytes'),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} counter')
+            for (app, kind, name, session_id), stats in sessions:
+                value = getattr(stats, attr)
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'{metric}{{app="{app}",kind="{kind}",name="{name}",session="{session_id}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+# Fjöldi lína í gildi sem fall skilaði: DataFrame/fylki eða fjöldi punkta í Plotly mynd
+def count_rows(value):
+    if value is None or isinstance(value, (str, bytes, dict, tuple)):
+        return None
+    data = getattr(value, 'data', None)
+    if isinstance(data, tuple):
+        return sum(len(trace.x) for trace in data if getattr(trace, 'x', None) is not None)
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+# Stærð (bæti) þess sem úttakið sendir í vafrann. @render_plotly skilar
+# aðeins tilvísun í widget; myndin sjálf er send sér. Myndir úr
+# figure_cache bera stærð JSON úr skyndiminninu; aðrar myndir eru aðeins
+# umbreyttar í JSON til mælingar í session sem er prófílað, því það kostar
+# jafnmikið og að teikna þær.
+def payload_size(result, value, profiled=False):
+    if hasattr(value, 'to_plotly_json'):
+        cached = getattr(value, '_payload_bytes', None)
+        if cached is not None or not profiled:
+            return cached
+        from plotly.utils import PlotlyJSONEncoder
+
+        return len(json.dumps(value.to_plotly_json(), cls=PlotlyJSONEncoder))
+    try:
+        return len(json.dumps(result))
+    except TypeError:
+        return None
+
+# session_id núverandi session (None utan session)
+def _session_id(app):
+    session = get_current_session()
+    if session is None:
+        return None
+    _track_session(session, app)
+    return session.root_scope().id
+
+# ---- cProfile fyrir eitt session ----
+
+# Mappan sem prófílar eru skrifaðir í; ekkert er mælt ef hún er ekki sett
+def profile_dir():
+    return os.environ.get('RENDER_PROFILE_DIR')
+
+_tracked_sessions = set()
+
+# Fyrsta skipti sem session sést: eyða mælingum þess og skrifa prófíl
+# þegar því lýkur, og byrja prófíl ef beðið var um ?profile=1
+def _track_session(session, app):
+    root = session.root_scope()
+    if root.id in _tracked_sessions:
+        return
+    _tracked_sessions.add(root.id)
+
+    if profile_dir():
+        with reactive.isolate():
+            search = root.input['.clientdata_url_search']() if '.clientdata_url_search' in root.input else ''
+        if parse_qs(search.lstrip('?')).get('profile') == ['1']:
+            registry._profiles[root.id] = cProfile.Profile()
+
+    def ended():
+        _tracked_sessions.discard(root.id)
+        registry.forget_session(root.id)
+        profile = registry._profiles.pop(root.id, None)
+        if profile is not None:
+            os.makedirs(profile_dir(), exist_ok=True)
+            profile.dump_stats(os.path.join(profile_dir(), f'{app}-{root.id[:12]}.prof'))
+
+    root.on_ended(ended)
+
+_profiling_now = set()
+
+# Keyra það sem er innan 'with' undir cProfile ef session er prófílað.
+# Calc sem er reiknað inni í mældu úttaki er þegar innan prófílsins.
+@contextmanager
+def _profiling(session_id):
+    profile = registry._profiles.get(session_id)
+    if profile is None or session_id in _profiling_now:
+        yield
+        return
+    _profiling_now.add(session_id)
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        _profiling_now.discard(session_id)
+
+# ---- Skreytingar ----
+
+# Mæla úttak: sett ofan á @render.* (eða @render_plotly / @cached_plot)
+def timed_output(renderer):
+    original_fn = renderer.fn
+    original_render = renderer.render
+    # Heiti appsins er einingin sem fallið er skilgreint í
+    app = original_fn.get_sync_fn().__module__ if not original_fn.is_async() else ''
+    last = {}
+
+    # Gildið sem fallið skilaði, til að telja línur og mæla myndir
+    async def counted():
+        last['value'] = await original_fn()
+        return last['value']
+
+    renderer.fn = AsyncValueFn(counted)
+
+    @wraps(original_render)
+    async def render():
+        session_id = _session_id(app)
+        last.pop('value', None)
+        start = time.perf_counter()
+        error = False
+        try:
+            with _profiling(session_id):
+                value = await original_render()
+        except SilentException:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if error:
+                registry.observe(app, 'output', renderer.output_id, session_id, seconds, error=True)
+        user_value = last.pop('value', None)
+        payload_bytes = payload_size(value, user_value, profiled=session_id in registry._profiles)
+        registry.observe(app, 'output', renderer.output_id, session_id, seconds, count_rows(user_value), payload_bytes)
+        return value
+
+    renderer.render = render
+    return renderer
+
+# Mæla fall sem er sett undir @reactive.Calc
+def timed_calc(fn):
+    @wraps(fn)
+    def wrapper():
+        app = fn.__module__
+        session_id = _session_id(app)
+        start = time.perf_counter()
+        error = False
+        try:
+            with _profiling(session_id):
+                value = fn()
+        except SilentException:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if error:
+                registry.observe(app, 'calc', fn.__name__, session_id, seconds, error=True)
+        registry.observe(app, 'calc', fn.__name__, session_id, seconds, count_rows(value))
+        return value
+    return wrapper
+
+# Mæla fall sem er keyrt í bakgrunnsþræði (sjá background.py). Kallað í
+# session samhenginu; skilar falli sem má keyra í hvaða þræði sem er.
+def timed_task(app, name, fn):
+    session_id = _session_id(app)
+
+    @wraps(fn)
+    def wrapper():
+        start = time.perf_counter()
+        error = False
+        try:
+            value = fn()
+        except Exception:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            if error:
+                registry.observe(app, 'task', name, session_id, seconds, error=True)
+        registry.observe(app, 'task', name, session_id, seconds, count_rows(value))
+        return value
+    return wrapper
+
+# ---- /metrics ----
+
+async def metrics_endpoint(request):
+    from starlette.responses import PlainTextResponse
+
+    return PlainTextResponse(registry.render_prometheus(), media_type='text/plain; version=0.0.4')
+
+# Bæta /metrics við Starlette app Shiny appsins og skila því
+def with_metrics_route(app):
+    from starlette.routing import Route
+
+    app.starlette_app.router.routes.insert(0, Route('/metrics', metrics_endpoint))
+    return app
@@ -0,0 +1,314 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import timataka_db
+from data_grid import TableView
+from lru_cache import LRUCache
+from race_metrics import (
+    add_derived_metrics, apply_schema, ar_schema, hlaup_schema, join_race_tables, parse_times, progression_schema,
+    rank_metrics_schema,
+)
+from snapshot import open_snapshot
+from timataka_db import data_version, pool
+from trend import LinearTrend
+
+# Function to load data from SQLite database
+# Aðeins gögn eins hlaupara eru lesin, í gegnum vísinn á 'timataka(athlete_id, hlaup_id)'
+def load_data_from_db(athlete_id):
+    # Load data into DataFrames using SQL queries
+    summary_data = timataka_db.athlete_summary(athlete_id)
+    hlaup_data = timataka_db.athlete_results(athlete_id)
+    ar_data = timataka_db.athlete_race_years(athlete_id)
+    length_data = timataka_db.athlete_race_lengths(athlete_id)
+
+    return summary_data, hlaup_data, ar_data, length_data
+
+# Fjöldi hlaupa og hlaup_id eftir lengd, eins og timataka_db.athlete_summary
+def summarize_lengths(hlaup_data):
+    grouped = hlaup_data.dropna(subset=['Length']).groupby('Length', sort=True, observed=True)['hlaup_id']
+    return pd.DataFrame({
+        'Length': grouped.size().index,
+        'Count': grouped.size().to_numpy(),
+        'IDs': grouped.agg(lambda ids: ', '.join(sorted(str(id_) for id_ in ids))).to_numpy(),
+    })
+
+# Gögn eins hlaupara úr dálkaskránni: sneið af sameinuðu töflunni, án
+# SQL fyrirspurna og án þess að þátta tímana aftur
+def load_data_from_snapshot(snapshot, athlete_id):
+    hlaup_data = snapshot.table('hlaup_data', snapshot.athlete_rows(athlete_id))
+    hlaup_data = apply_schema(add_derived_metrics(hlaup_data), hlaup_schema)
+    ar_data = snapshot.table('ar_data')
+    ar_data = ar_data[ar_data['hlaup_id'].isin(hlaup_data['hlaup_id'])].reset_index(drop=True)
+    return summarize_lengths(hlaup_data), hlaup_data, apply_schema(ar_data, ar_schema)
+
+# Sameina hráu töflurnar í eina auðgaða 'hlaup_data' töflu
+def build_hlaup_data(hlaup_data, ar_data, length_data):
+    hlaup_data, ar_data = join_race_tables(hlaup_data, ar_data, length_data)
+
+    # Reikna hraða, hraða á km og vegalengdarflokka
+    hlaup_data = add_derived_metrics(hlaup_data)
+
+    return apply_schema(hlaup_data, hlaup_schema), apply_schema(ar_data, ar_schema)
+
+# Vegalengd millitímapunkts í metrum ef hún kemur fram í nafninu, t.d.
+# '5 km', '10.5K', '16,4 km', '220 m' eða 'Lambi (24km)'; annars NaN
+def checkpoint_distances(names):
+    match = names.str.extract(r'(?i)(\d+(?:[.,]\d+)?)\s*(km|k|m)\b')
+    value = match[0].str.replace(',', '.').astype(float)
+    return np.where(match[1].str.lower() == 'm', value, value * 1000)
+
+# Leggir á milli millitíma í 'splits' (úr timataka_db.race_splits): tími,
+# vegalengd og hraði (mín/km) hvers leggs fyrir hvern hlaupara, með síðasta
+# legg að marki. Sum hlaup skrá tíma hvers hrings í stað heildartíma; ef
+# tímarnir hækka ekki alltaf eru þeir lagðir saman.
+def split_segments(splits):
+    splits = splits.sort_values(['result_id', 'checkpoint_idx'])
+    splits['distance_m'] = checkpoint_distances(splits['checkpoint_name'])
+
+    finish = splits.drop_duplicates('result_id', keep='last').copy()
+    finish['checkpoint_idx'] += 1
+    finish['checkpoint_name'] = 'Mark'
+    finish['elapsed_s'] = parse_times(finish['Time'])
+    finish['distance_m'] = finish['Distance_m']
+
+    splits = splits.dropna(subset=['elapsed_s'])
+    laps = splits.groupby('result_id')['elapsed_s'].diff().le(0).groupby(splits['result_id']).transform('any')
+    splits.loc[laps, 'elapsed_s'] = splits[laps].groupby('result_id')['elapsed_s'].cumsum()
+
+    finish = finish.dropna(subset=['elapsed_s'])
+    columns = ['result_id', 'checkpoint_idx', 'checkpoint_name', 'elapsed_s', 'distance_m']
+    data = pd.DataFrame({
+        column: np.concatenate([splits[column].to_numpy(), finish[column].to_numpy()]) for column in columns
+    }).sort_values(['result_id', 'checkpoint_idx'])
+    data['elapsed_s'] = data['elapsed_s'].astype(float)
+    data['distance_m'] = data['distance_m'].astype(float)
+    grouped = data.groupby('result_id')
+    data['segment_s'] = data['elapsed_s'] - grouped['elapsed_s'].shift(fill_value=0)
+    data['segment_m'] = data['distance_m'] - grouped['distance_m'].shift(fill_value=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        data['segment_pace_min_km'] = np.where(
+            data['segment_m'] > 0, (data['segment_s'] / 60) / (data['segment_m'] / 1000), np.nan
+        )
+    return data.reset_index(drop=True)
+
+# Framvinda eins hlaupara (sjá timataka_db.refresh_progression): niðurstöður
+# hverrar lengdar í tímaröð með persónulegum metum, raðað eftir lengd svo að
+# hlaup af einni lengd eru samfelld sneið
+class Progression:
+    def __init__(self, data):
+        self.data = apply_schema(data, progression_schema)
+        self._labels = self.data['length_label'].to_numpy(dtype=str)
+
+    # Hlaup af tiltekinni lengd í tímaröð; sneið af töflunni, ekki afrit
+    def for_length(self, length_label):
+        start = np.searchsorted(self._labels, length_label, side='left')
+        stop = np.searchsorted(self._labels, length_label, side='right')
+        return self.data.iloc[start:stop]
+
+# Auðguðu gögnin fyrir einn hlaupara ásamt línunúmerum 'hlaup_data' röðuðum
+# eftir ('Length', 'hlaup_id'), svo að hlaup af einni lengd sé samfellt bil
+# í röðuninni. 'version' er útgáfa gagnagrunnsins sem gögnin voru lesin úr.
+# 'rank_metrics' eru sæti hlauparans miðað við fjölda keppenda í tímaröð
+# (sjá timataka_db.athlete_rank_metrics) og 'speed_trends' summur
+# hallalínu hraðans eftir vegalengdarflokki, {flokkur: trend.LinearTrend}.
+class RaceData:
+    def __init__(self, summary_data, hlaup_data, ar_data, version=None, athlete_id=None, progression=None,
+                 rank_metrics=None, speed_trends=None):
+        self.version = version
+        self.athlete_id = athlete_id
+        self.summary_data = summary_data
+        self.hlaup_data = hlaup_data
+        self.ar_data = ar_data
+        self.progression = progression
+        self.rank_metrics = rank_metrics
+        self.speed_trends = speed_trends or {}
+        codes = hlaup_data['Length'].cat.codes.to_numpy()
+        rows = np.flatnonzero(codes >= 0)
+        self._by_length = rows[np.lexsort((hlaup_data['hlaup_id'].to_numpy()[rows], codes[rows]))]
+        self._length_codes = codes[self._by_length]
+        self._table_views = {}
+
+    # Lykill fyrir skyndiminni sem eru byggð úr þessum gögnum
+    @property
+    def key(self):
+        return (self.athlete_id, self.version)
+
+    # Síðuskipt sýn á eina af töflunum ('hlaup_data', 'summary_data' eða
+    # 'ar_data'), búin til þegar fyrst er beðið um hana
+    def table_view(self, name):
+        if name not in ('hlaup_data', 'summary_data', 'ar_data'):
+            return None
+        view = self._table_views.get(name)
+        if view is None:
+            view = TableView(getattr(self, name), default_sort='hlaup_id')
+            self._table_views[name] = view
+        return view
+
+    # Hlaup af tiltekinni lengd, raðað eftir 'hlaup_id'. Tvíleit í
+    # röðuðu lengdunum, O(log n), í stað þess að skanna alla töfluna.
+    def for_length(self, length_label):
+        categories = self.hlaup_data['Length'].cat.categories
+        if length_label not in categories:
+            return self.hlaup_data.iloc[:0]
+        code = categories.get_loc(length_label)
+        start = np.searchsorted(self._length_codes, code, side='left')
+        stop = np.searchsorted(self._length_codes, code, side='right')
+        return self.hlaup_data.iloc[self._by_length[start:stop]]
+
+    # Hlaup með vegalengd, tíma og hraða, raðað eftir hlaup_id ('Hraði'
+    # flipinn og /api); aðeins einn vegalengdarflokkur ef 'distance_class' er gefinn
+    def speed_series(self, distance_class=None):
+        data = self.hlaup_data.dropna(subset=['Distance_m', 'Time_in_seconds', 'Speed_m_s'])
+        if distance_class is not None:
+            data = data[data['Distance_class'] == distance_class]
+        return data.sort_values(['hlaup_id', 'id'])
+
+# Sameiginleg gögn fyrir allt ferlið, deilt (read-only) á milli allra
+# session-a. Gögn hvers hlaupara eru lesin þegar fyrst er beðið um þau og
+# geymd í LRU skyndiminni; ný skyndiminni taka við þegar mtime
+# gagnagrunnsins breytist. Gögnin eru lesin úr dálkaskránni (sjá
+# snapshot.py) ef hún er til fyrir núverandi útgáfu gagnagrunnsins, annars
+# beint úr SQLite.
+class RaceDataStore:
+    def __init__(self, pool=pool, maxsize=32, use_snapshot=True):
+        self.pool = pool
+        self.use_snapshot = use_snapshot
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._mtime = None
+        self._cache = LRUCache(maxsize)
+        self._splits = LRUCache(maxsize)
+        self._rollups = LRUCache(maxsize)
+        self._snapshot = None
+        self._athletes = None
+        self._default_athlete = None
+
+    # Byggja nýja stöðu ef gagnagrunnurinn hefur breyst og skipta henni inn
+    # í einu lagi; skilar útgáfunni. Með 'preload' (sjá background.py) eru
+    # hlauparalistinn og gögn hlauparanna sem eru í skyndiminninu lesin áður
+    # en skipt er, svo að session-in fái ný gögn án þess að bíða eftir lestri.
+    # Ef annar þráður er að byggja nýja stöðu og 'wait' er False fást gömlu
+    # gögnin þangað til hann klárar.
+    def refresh(self, preload=False, wait=True):
+        mtime = data_version(self.pool.db_path)
+        if mtime == self._mtime:
+            return mtime
+        if not self._refresh_lock.acquire(blocking=wait):
+            return self._mtime
+        try:
+            if mtime == self._mtime:
+                return mtime
+            snapshot = open_snapshot(self.pool.db_path, mtime) if self.use_snapshot else None
+            cache = LRUCache(self._cache.maxsize)
+            athletes = default_athlete = None
+            if preload:
+                for athlete_id in dict.fromkeys(athlete_id for athlete_id, _ in self._cache.keys()):
+                    cache.put((athlete_id, mtime), self._load(snapshot, athlete_id, mtime))
+                athletes = self._read_athletes()
+                default_athlete = timataka_db.default_athlete_id()
+            with self._lock:
+                self._cache = cache
+                self._splits = LRUCache(self._splits.maxsize)
+                self._rollups = LRUCache(self._rollups.maxsize)
+                self._snapshot = snapshot
+                self._athletes = athletes
+                self._default_athlete = default_athlete
+                self._mtime = mtime
+            return mtime
+        finally:
+            self._refresh_lock.release()
+
+    # Útgáfa gagnanna sem á að lesa; aðeins fyrsti lesturinn bíður eftir nýrri stöðu
+    def _check_version(self):
+        return self.refresh(wait=self._mtime is None)
+
+    def _load(self, snapshot, athlete_id, mtime):
+        if snapshot is not None:
+            summary_data, hlaup_data, ar_data = load_data_from_snapshot(snapshot, athlete_id)
+        else:
+            summary_data, hlaup_data, ar_data, length_data = load_data_from_db(athlete_id)
+            hlaup_data, ar_data = build_hlaup_data(hlaup_data, ar_data, length_data)
+        # Framvindan er reiknuð við innsetningu og aðeins lesin hér
+        progression = Progression(timataka_db.athlete_progression(athlete_id))
+        rank_metrics = apply_schema(timataka_db.athlete_rank_metrics(athlete_id), rank_metrics_schema)
+        speed_trends = {
+            row.distance_class: LinearTrend(*(getattr(row, name) for name in LinearTrend.fields))
+            for row in timataka_db.athlete_speed_trends(athlete_id).itertuples()
+        }
+        return RaceData(summary_data, hlaup_data, ar_data, mtime, athlete_id, progression, rank_metrics, speed_trends)
+
+    def _read_athletes(self):
+        frame = timataka_db.athletes()
+        return dict(zip(frame['id'].tolist(), frame['name']))
+
+    def get(self, athlete_id=None):
+        mtime = self._check_version()
+        if athlete_id is None:
+            athlete_id = self.default_athlete()
+        key = (athlete_id, mtime)
+        data = self._cache.get(key)
+        if data is None:
+            with self._lock:
+                # Annar þráður gæti hafa lesið gögnin á meðan við biðum
+                data = self._cache.get(key)
+                if data is None:
+                    data = self._load(self._snapshot, athlete_id, mtime)
+                    self._cache.put(key, data)
+        return data
+
+    # Leggir allra hlaupara í einu hlaupi (sjá split_segments), lesnir einu
+    # sinni fyrir hvert hlaup og útgáfu gagnagrunnsins
+    def race_splits(self, hlaup_id):
+        mtime = self._check_version()
+        key = (hlaup_id, mtime)
+        data = self._splits.get(key)
+        if data is None:
+            data = split_segments(timataka_db.race_splits(hlaup_id))
+            self._splits.put(key, data)
+        return data
+
+    # Samantekt hlaupara eftir ári og vegalengdarflokki, reiknuð við
+    # innsetningu (timataka_db.refresh_rollups) og aðeins lesin hér
+    def rollups(self, athlete_id=None):
+        mtime = self._check_version()
+        if athlete_id is None:
+            athlete_id = self.default_athlete()
+        key = (athlete_id, mtime)
+        data = self._rollups.get(key)
+        if data is None:
+            data = timataka_db.athlete_rollup(athlete_id)
+            self._rollups.put(key, data)
+        return data
+
+    # Allir hlauparar sem {id: nafn}, raðað eftir nafni
+    def athletes(self):
+        self._check_version()
+        if self._athletes is None:
+            self._athletes = self._read_athletes()
+        return self._athletes
+
+    # Hlauparar sem passa við leitarstreng, bestu fyrst, sem {id: nafn}
+    # (sjá timataka_db.search_athletes)
+    def search_athletes(self, query, limit=20):
+        self._check_version()
+        found = timataka_db.search_athletes(query, limit)
+        return dict(zip(found['id'].tolist(), found['name']))
+
+    def default_athlete(self):
+        self._check_version()
+        if self._default_athlete is None:
+            self._default_athlete = timataka_db.default_athlete_id()
+        return self._default_athlete
+
+    @property
+    def version(self):
+        return self._mtime
+
+store = RaceDataStore()
+
+# Skilar sameiginlegu RaceData fyrir hlaupara (sjálfgefinn hlaupari ef
+# 'athlete_id' er None); kallendur mega ekki breyta töflunum
+def get_race_data(athlete_id=None):
+    return store.get(athlete_id)
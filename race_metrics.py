@@ -0,0 +1,227 @@
+# Dálkar hlaupagagnanna sem bæði gagnagrunnslagið (timataka_db, snapshot)
+# og öppin (race_data) nota: þáttun tímastrengja, afleiddar stærðir,
+# sameining hráu taflnanna og gagnagerðir dálkanna. Einingin flytur aðeins
+# inn numpy og pandas, svo flutningarnir ráðast ekki af öppunum.
+import numpy as np
+import pandas as pd
+
+# Lengsti tímastrengur sem við reynum að þátta; lengri strengir eru ógildir
+max_time_length = 24
+
+# Þátta einstaka tímastrengi yfir í sekúndur. Strengirnir eru settir í
+# fylki af stöfum (ein lína á streng) og við förum dálk fyrir dálk yfir
+# það með numpy, svo engin Python-lykkja er keyrð á hverja línu.
+# Leyfð snið: 'HH:MM:SS', 'MM:SS', brot úr sekúndu ('00:36:16.10') og '+'
+# fremst eins og í 'Behind' dálkinum ('+15:12').
+def _parse_unique_times(uniques):
+    chars = np.asarray(uniques, dtype=str)
+    too_long = np.zeros(len(chars), dtype=bool)
+    if chars.dtype.itemsize // 4 > max_time_length:
+        too_long = np.char.str_len(chars) > max_time_length
+        chars = chars.astype(f'U{max_time_length}')
+    n, width = len(chars), chars.dtype.itemsize // 4
+    matrix = chars.view(np.uint32).reshape(n, width).astype(np.int32)
+
+    total = np.zeros(n)
+    field = np.zeros(n)
+    fraction = np.zeros(n)
+    scale = np.full(n, 0.1)
+    colons = np.zeros(n, dtype=np.int8)
+    digits = np.zeros(n, dtype=np.int8)
+    in_fraction = np.zeros(n, dtype=bool)
+    started = np.zeros(n, dtype=bool)
+    ended = np.zeros(n, dtype=bool)
+    valid = ~too_long
+
+    for j in range(width):
+        c = matrix[:, j]
+        d = c - ord('0')
+        is_digit = (d >= 0) & (d <= 9)
+        is_colon = c == ord(':')
+        is_dot = c == ord('.')
+        is_plus = c == ord('+')
+        is_space = (c == ord(' ')) | (c == 0)
+
+        # Tölustafur bætist við núverandi reit eða við brot úr sekúndu
+        whole = is_digit & ~in_fraction
+        field = np.where(whole, field * 10 + d, field)
+        digits = np.where(whole, digits + 1, digits)
+        frac = is_digit & in_fraction
+        fraction = np.where(frac, fraction + d * scale, fraction)
+        scale = np.where(frac, scale / 10, scale)
+
+        # Tvípunktur lokar reitnum: klst -> mín -> sek
+        colon = is_colon & (digits > 0) & ~in_fraction
+        total = np.where(colon, total * 60 + field, total)
+        field = np.where(colon, 0, field)
+        digits = np.where(colon, 0, digits)
+        colons += colon
+
+        # Punktur er aðeins leyfður í síðasta reitnum
+        dot = is_dot & (digits > 0) & ~in_fraction & (colons > 0)
+        in_fraction |= dot
+
+        # '+' aðeins fremst og bil aðeins fremst eða aftast
+        plus = is_plus & ~started
+        ended |= is_space & started
+        known = is_digit | colon | dot | plus | is_space
+        valid &= known & ~(ended & ~is_space)
+        started |= ~is_space
+
+    valid &= (colons >= 1) & (colons <= 2) & (digits > 0)
+    return np.where(valid, total * 60 + field + fraction, np.nan)
+
+# Umbreyta heilum dálki af tímastrengjum ('Time', 'Race Time', 'Behind') í
+# sekúndur í einni umferð. Skilar float64 fylki með NaN fyrir ógild gildi.
+def parse_times(values):
+    # Sömu tímarnir koma oft fyrir, svo við þáttum aðeins einstök gildi
+    codes, uniques = pd.factorize(pd.Series(values, copy=False), use_na_sentinel=True)
+    result = np.full(len(codes), np.nan, dtype='float64')
+    if len(uniques) == 0:
+        return result
+
+    unique_seconds = _parse_unique_times(uniques)
+    valid = codes >= 0
+    result[valid] = unique_seconds[codes[valid]]
+    return result
+
+# Vegalengdarflokkar (í metrum) sem 'Hraði' flipinn síar eftir
+distance_classes = {
+    1: (1 * 1000, 9.9 * 1000),
+    2: (10 * 1000, 19.9 * 1000),
+    3: (20 * 1000, 39.9 * 1000),
+    4: (40 * 1000, 100 * 1000),
+}
+
+# Reikna afleiddar stærðir úr 'Distance_m' og 'Time_in_seconds' sem numpy
+# fylkjaaðgerðir: hraða (m/s), hraða á km (mín/km), vegalengdarflokk
+# (0 ef utan allra flokka) og hraða miðað við miðgildi flokksins.
+# Notað af báðum öppunum og skýrslunni.
+def add_derived_metrics(data):
+    distance = data['Distance_m'].to_numpy(dtype='float64', na_value=np.nan)
+    seconds = data['Time_in_seconds'].to_numpy(dtype='float64', na_value=np.nan)
+
+    valid = ~np.isnan(distance) & (seconds > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.where(valid, distance / seconds, np.nan)
+        pace = np.where(valid & (distance > 0), (seconds / 60) / (distance / 1000), np.nan)
+
+    distance_class = np.zeros(len(distance), dtype='int8')
+    for class_id, (min_dist, max_dist) in distance_classes.items():
+        distance_class[(distance >= min_dist) & (distance <= max_dist)] = class_id
+
+    class_median = pd.Series(speed).groupby(distance_class).transform('median').to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = np.where(distance_class > 0, speed / class_median, np.nan)
+
+    # Grunnt afrit svo dálkarnir sem fyrir eru séu ekki afritaðir (þeir
+    # geta verið memmap fylki úr dálkaskránni)
+    data = data.copy(deep=False)
+    data['Speed_m_s'] = speed
+    data['Pace_min_km'] = pace
+    data['Distance_class'] = distance_class
+    data['Speed_normalized'] = normalized
+    return data
+
+# Sameina hráu töflurnar og þátta 'Time'; afleiddu stærðirnar eru reiknaðar
+# sér í build_hlaup_data því þær ráðast af gögnum hvers hlaupara
+def join_race_tables(hlaup_data, ar_data, length_data):
+    # Endurnefna 'id' í 'hlaup_id' ef nauðsyn krefur
+    if 'id' in ar_data.columns:
+        ar_data = ar_data.rename(columns={'id': 'hlaup_id'})
+    elif 'hlaupID' in ar_data.columns:
+        ar_data = ar_data.rename(columns={'hlaupID': 'hlaup_id'})
+    else:
+        # Ef 'hlaup_id' dálkurinn finnst ekki
+        raise KeyError("'hlaup_id' column not found in ar_data")
+
+    # Gakktu úr skugga um að 'hlaup_id' sé til staðar í hlaup_data
+    if 'hlaup_id' not in hlaup_data.columns:
+        raise KeyError("'hlaup_id' column not found in hlaup_data")
+
+    # Gera 'hlaup_id' dálkinn að sama gagnagerð
+    hlaup_data['hlaup_id'] = hlaup_data['hlaup_id'].astype(int)
+    ar_data['hlaup_id'] = ar_data['hlaup_id'].astype(int)
+
+    # Sameina hlaup_data og ar_data til að fá 'ar' fyrir hvert 'hlaup_id'
+    hlaup_data = hlaup_data.merge(ar_data[['hlaup_id', 'ar']], on='hlaup_id', how='left')
+
+    # Sameina við 'race_length' töfluna á 'hlaup_id'
+    hlaup_data = hlaup_data.merge(length_data, on='hlaup_id', how='left')
+
+    # Umbreyta 'Time' í sekúndur
+    hlaup_data['Time_in_seconds'] = parse_times(hlaup_data['Time'])
+
+    # Millitímarnir sjálfir eru í 'split' töflunni; hér þarf aðeins að vita hvort þeir eru til
+    hlaup_data['Has_split'] = hlaup_data['Split'].fillna('').astype(str).str.strip() != ''
+
+    return hlaup_data, ar_data
+
+# Gagnagerðir dálkanna í 'hlaup_data' og 'ar_data', settar einu sinni þegar
+# gögnin eru lesin (sjá apply_schema). Nöfn og lengdir eru flokkar
+# (category), auðkenni og ár heiltölur og mælingar float32. Textadálkar sem
+# ekkert úttak les ('BIB', 'Split', 'Time', 'Behind', 'Race Time') eru ekki
+# geymdir: 'Time_in_seconds' og 'Has_split' koma í stað 'Time' og 'Split'.
+# 'Int16' leyfir gildi sem vantar (ár og hringir eru ekki til fyrir öll hlaup).
+hlaup_schema = {
+    'id': 'int32',
+    'hlaup_id': 'int32',
+    'athlete_id': 'int32',
+    'Name': 'category',
+    'Rank': 'float32',
+    'Laps': 'Int16',
+    'ar': 'Int16',
+    'Length': 'category',
+    'Has_split': 'bool',
+    'Distance_m': 'float32',
+    'Time_in_seconds': 'float32',
+    'Speed_m_s': 'float32',
+    'Pace_min_km': 'float32',
+    'Distance_class': 'int8',
+    'Speed_normalized': 'float32',
+}
+ar_schema = {
+    'ar': 'Int16',
+    'hlaup_id': 'int32',
+}
+progression_schema = {
+    'length_label': 'category',
+    'seq': 'int32',
+    'result_id': 'int32',
+    'hlaup_id': 'int32',
+    'year': 'Int16',
+    'time_s': 'float32',
+    'laps': 'Int16',
+    'rank': 'float32',
+    'field_size': 'int32',
+    'is_pb': 'bool',
+    'best_time_s': 'float32',
+    'best_laps': 'Int16',
+    'delta_time_s': 'float32',
+    'delta_laps': 'Int16',
+}
+rank_metrics_schema = {
+    'result_id': 'int32',
+    'hlaup_id': 'int32',
+    'race_number': 'int32',
+    'rank': 'float32',
+    'field_size': 'float32',
+    'percentile': 'float32',
+    'gap_s': 'float32',
+    'rank_change': 'float32',
+    'streak': 'int16',
+}
+
+# Tafla með dálkunum í 'schema' (þeim sem eru til í 'data') og gerðum
+# þeirra. Textagildi í talnadálkum (t.d. '' í 'Rank') verða NaN. Dálkar sem
+# hafa þegar rétta gerð, t.d. memmap fylki úr dálkaskránni, eru ekki afritaðir.
+def apply_schema(data, schema):
+    columns = {}
+    for name, dtype in schema.items():
+        if name not in data.columns:
+            continue
+        values = data[name]
+        if values.dtype == object and dtype != 'category':
+            values = pd.to_numeric(values, errors='coerce')
+        columns[name] = values.astype(dtype, copy=False)
+    return pd.DataFrame(columns, copy=False)
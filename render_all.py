@@ -0,0 +1,252 @@
+# Flytja allar myndir og töflur mælaborðanna út sem fastar skrár fyrir
+# skýrsluna, án þess að Shiny þjónn sé í gangi. Sömu föllin og öppin nota
+# (activeapp.figure_builders, siggi_app.draw_* og töflurnar) eru keyrð fyrir
+# öll gildi inntakanna: hverja lengd, vegalengdarbil, grafgerð, millitíma og
+# töflu. Úttökin eru búin til samhliða í ferlasafni (process pool).
+#
+#   Plotly myndir   -> .html (plotly.min.js er ein skrá í möppunni) og .json,
+#                      og .png ef 'kaleido' er sett upp
+#   matplotlib      -> .png
+#   töflur          -> .html og .json
+#
+# Skráarnöfnin enda á SHA-256 af innihaldinu, svo vafri og vefþjónn mega
+# geyma þær að eilífu. 'manifest.json' geymir fyrir hvert úttak hash af
+# inntökunum (úttak, gildi, hlaupari, útgáfa gagnagrunnsins og kóðans); ef
+# það er óbreytt frá síðustu keyrslu er úttakinu sleppt. 'index.html'
+# vísar á allar skrárnar.
+#
+# Keyrsla:  python render_all.py [--out report_assets] [--athlete ID] [--jobs N]
+import argparse
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import activeapp
+import siggi_app
+import timataka_db
+from figure_cache import new_figure
+from race_data import get_race_data, store
+
+# Stærð matplotlib myndanna í pixlum
+png_size = (1000, 500)
+
+# matplotlib mynd teiknuð með 'draw(fig, race, *args)'
+def draw(draw_fn, race, *args):
+    fig = new_figure(*png_size)
+    draw_fn(fig, race, *args)
+    return fig
+
+# Öll úttök sem eru flutt út: nafn -> (tegund, gildi inntaksins, fall sem
+# býr til myndina eða töfluna úr (race, gildi)). Tegundin er 'plotly',
+# 'matplotlib' eða 'table'.
+def export_outputs(race):
+    lengths = list(race.summary_data['Length'])
+    splits = [int(id_) for id_ in activeapp.split_choices(race)]
+    outputs = {
+        f'activeapp/{name}': ('plotly', values, activeapp.figure_builders[name])
+        for name, values in activeapp.figure_choices(race).items()
+    }
+    outputs.update({
+        'activeapp/year_chart': ('plotly', [None], lambda race, _: activeapp.build_year_chart(store.rollups(race.athlete_id))),
+        'activeapp/split_chart': ('plotly', splits, lambda race, id_: activeapp.build_split_chart(activeapp.split_table(race, id_))),
+        'activeapp/improvement_time_table': ('table', lengths, lambda race, length: activeapp.improvement_table(race.progression.for_length(length))),
+        'activeapp/pb_history_table': ('table', lengths, lambda race, length: activeapp.pb_history(race.progression.for_length(length))),
+        'activeapp/year_table': ('table', [None], lambda race, _: activeapp.year_summary(store.rollups(race.athlete_id))),
+        'activeapp/split_time_table': ('table', splits, lambda race, id_: activeapp.split_summary(activeapp.split_table(race, id_))),
+        'activeapp/data_table': ('table', ['hlaup_data', 'summary_data', 'ar_data'], lambda race, name: getattr(race, name)),
+        'siggi_app/rank_plot': ('matplotlib', [None], lambda race, _: draw(siggi_app.draw_rank_plot, race)),
+        'siggi_app/summary_plot': ('matplotlib', [None], lambda race, _: draw(siggi_app.draw_summary_plot, race)),
+        'siggi_app/improvement_plot': ('matplotlib', lengths, lambda race, length: draw(siggi_app.draw_improvement_plot, race, length)),
+    })
+    return outputs
+
+# Skrár verkefnisins sem úttökin ráðast af: allar einingar í möppunni sem
+# eru hlaðnar eftir að öppin hafa verið flutt inn (activeapp, siggi_app og
+# allt sem þau nota, t.d. figure_cache, snapshot og data_grid)
+def source_files():
+    root = os.path.dirname(os.path.abspath(__file__))
+    files = {os.path.abspath(module.__file__) for module in list(sys.modules.values())
+             if getattr(module, '__file__', None)}
+    return sorted(path for path in files if os.path.dirname(path) == root and path.endswith('.py'))
+
+# Hash af kóðanum og útgáfum teiknisafnanna; ef einhver skráin breytist er
+# allt búið til aftur
+def code_version():
+    import matplotlib
+    import plotly
+
+    digest = hashlib.sha256(f'{plotly.__version__} {matplotlib.__version__}'.encode())
+    for path in source_files():
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def input_hash(output, value, athlete_id, version, code):
+    return hashlib.sha256(json.dumps([output, value, athlete_id, version, code]).encode()).hexdigest()
+
+# Lykill úttaks og gildis í manifest.json, t.d. 'activeapp/home_chart[Pie Chart]'
+def asset_key(output, value):
+    return output if value is None else f'{output}[{value}]'
+
+# Byrjun skráarnafns úr lyklinum, t.d. 'activeapp-home_chart-Pie_Chart'
+def file_stem(output, value):
+    return re.sub(r'[^\w.-]+', '_', output.replace('/', '-') + ('' if value is None else f'-{value}'))
+
+# Nöfn skránna sem write_asset býr til
+asset_name = re.compile(r'[\w.-]+-[0-9a-f]{16}\.(html|json|png)')
+
+# Skrifa 'content' sem '<stem>-<hash>.<ext>' og skila nafninu; skráin er
+# aðeins skrifuð ef hún er ekki þegar til
+def write_asset(out_dir, stem, ext, content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    name = f'{stem}-{hashlib.sha256(content).hexdigest()[:16]}.{ext}'
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+    return name
+
+# Innihald skránna fyrir eitt úttak sem {endi: innihald}
+def render_assets(kind, result, div_id):
+    if kind == 'plotly':
+        assets = {
+            'html': result.to_html(include_plotlyjs='directory', full_html=True, div_id=div_id),
+            'json': result.to_json(),
+        }
+        try:
+            assets['png'] = result.to_image(format='png', width=png_size[0], height=png_size[1])
+        except (ImportError, ValueError):
+            # 'kaleido' er ekki sett upp; HTML og JSON duga
+            pass
+        return assets
+    if kind == 'matplotlib':
+        with io.BytesIO() as buf:
+            result.savefig(buf, format='png')
+            return {'png': buf.getvalue()}
+    return {
+        'html': result.astype(object).where(result.notna(), '').to_html(index=False, classes='dataframe'),
+        'json': result.to_json(orient='split', index=False, force_ascii=False),
+    }
+
+# Staða hvers vinnuferlis: gögn hlauparans og úttökin
+_worker = {}
+
+def start_worker(athlete_id, out_dir):
+    race = get_race_data(athlete_id)
+    _worker.update(race=race, outputs=export_outputs(race), out_dir=out_dir)
+
+# Búa til eitt úttak í vinnuferli og skila nöfnum skránna
+def render_job(job):
+    output, value = job
+    kind, _, build = _worker['outputs'][output]
+    stem = file_stem(output, value)
+    assets = render_assets(kind, build(_worker['race'], value), div_id=stem)
+    return [write_asset(_worker['out_dir'], stem, ext, content) for ext, content in assets.items()]
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Hvort óhætt er að skrifa í og hreinsa 'out_dir': hún er ekki til, er tóm
+# eða hefur manifest.json frá fyrri keyrslu
+def is_asset_dir(out_dir):
+    return (not os.path.isdir(out_dir) or not os.listdir(out_dir)
+            or os.path.exists(os.path.join(out_dir, 'manifest.json')))
+
+# Yfirlitssíða með tenglum á allar skrárnar og PNG myndunum
+def write_index(out_dir, assets):
+    lines = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>Mælaborð</title></head><body>']
+    for key, entry in assets.items():
+        lines.append(f'<h3>{html.escape(key)}</h3>')
+        for name in entry['files']:
+            if name.endswith('.png'):
+                lines.append(f'<img src="{name}" style="max-width: 100%">')
+            lines.append(f'<a href="{name}">{name}</a><br>')
+    lines.append('</body></html>')
+    with open(os.path.join(out_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+def render_all(out_dir, athlete_id=None, jobs=None):
+    if not is_asset_dir(out_dir):
+        raise ValueError(f"{out_dir} er hvorki tóm né með manifest.json frá render_all.py")
+    os.makedirs(out_dir, exist_ok=True)
+    race = get_race_data(athlete_id)
+    athlete_id = race.athlete_id
+    version = timataka_db.data_version()
+    code = code_version()
+
+    previous = read_manifest(out_dir).get('assets', {})
+    assets = {}
+    todo = []
+    for output, (kind, values, _) in export_outputs(race).items():
+        for value in values:
+            key = asset_key(output, value)
+            hash_ = input_hash(output, value, athlete_id, version, code)
+            entry = previous.get(key)
+            if (entry and entry['input_hash'] == hash_
+                    and all(os.path.exists(os.path.join(out_dir, name)) for name in entry['files'])):
+                assets[key] = entry
+            else:
+                assets[key] = {'input_hash': hash_}
+                todo.append((output, value))
+
+    workers = jobs or os.cpu_count() or 1
+    if todo:
+        # Vinnuferlin opna sínar eigin tengingar við gagnagrunninn
+        timataka_db.pool.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=start_worker, initargs=(athlete_id, out_dir)) as executor:
+            chunksize = max(1, len(todo) // (4 * workers))
+            for (output, value), files in zip(todo, executor.map(render_job, todo, chunksize=chunksize)):
+                assets[asset_key(output, value)]['files'] = files
+
+    # plotly.min.js einu sinni fyrir allar HTML myndirnar
+    plotly_js = os.path.join(out_dir, 'plotly.min.js')
+    if not os.path.exists(plotly_js):
+        from plotly.offline import get_plotlyjs
+
+        with open(plotly_js, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    # Skrár úr fyrri manifest.json sem engin færsla vísar lengur á eru
+    # fjarlægðar; aðrar skrár í möppunni eru aldrei snertar
+    keep = {name for entry in assets.values() for name in entry['files']}
+    for entry in previous.values():
+        for name in entry.get('files', []):
+            path = os.path.join(out_dir, name)
+            if name not in keep and asset_name.fullmatch(name) and os.path.isfile(path):
+                os.remove(path)
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'athlete_id': athlete_id, 'version': version, 'jobs': workers, 'assets': assets},
+                  f, ensure_ascii=False, indent=1)
+    write_index(out_dir, assets)
+    return len(assets), len(todo)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flytja allar myndir og töflur mælaborðanna út sem fastar skrár")
+    parser.add_argument('--out', default='report_assets')
+    parser.add_argument('--athlete', type=int, default=None, help="id hlaupara (sjálfgefinn hlaupari ef sleppt)")
+    parser.add_argument('--jobs', type=int, default=None, help="fjöldi vinnuferla (sjálfgefið fjöldi kjarna)")
+    args = parser.parse_args(argv)
+
+    if not is_asset_dir(args.out):
+        parser.error(f"{args.out} er hvorki tóm né með manifest.json; veldu aðra möppu fyrir --out")
+
+    start = time.perf_counter()
+    total, rendered = render_all(args.out, args.athlete, args.jobs)
+    print(f"{args.out}: {rendered} af {total} úttökum búin til, {total - rendered} óbreytt ({time.perf_counter() - start:.1f} s)")
+
+if __name__ == '__main__':
+    main()
@@ -1,37 +1,27 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import sqlite3
-from shiny import App, render, ui
+from shiny import App, reactive, req, ui
 
-# Tengjast gagnagrunninum
-conn = sqlite3.connect("siggi_timataka.db")
+import timataka_db
+from background import background_calc, db_version, watch_db_version
+from figure_cache import cached_plot
+from metrics import timed_output, with_metrics_route
+from race_data import get_race_data
+from race_metrics import parse_times
 
-# Hlaða gögnin úr rank_table og siggi_hlaup_summary
-rank_df = pd.read_sql_query("SELECT Rank FROM rank_table", conn)
-summary_df = pd.read_sql_query("SELECT Length, Count, IDs FROM siggi_hlaup_summary", conn)
+# Gögnin eru sótt þegar fyrsta session byrjar en ekki þegar einingin er
+# sótt, svo að 'shiny run' og hver worker ræsi sig án þess að lesa gagnagrunninn.
+# get_race_data() les sjálfgefna hlauparann úr dálkaskránni ef hún er til
+# (sjá snapshot.py) og geymir gögnin á milli session-a. Gögnin eru lesin og
+# myndirnar teiknaðar í bakgrunnsþráðum (sjá background.py).
 
-# Loka tengingunni
-conn.close()
+# Sæti hlauparans í tímaröð
+def rank_data(race):
+    # 'Rank' er tala (NaN fyrir tóm eða ógild sæti) frá því gögnin voru lesin
+    rank = race.hlaup_data['Rank'].dropna()
 
-# Hreinsa tómar eða ógildar raðir úr 'Rank' dálknum
-rank_df = rank_df[rank_df['Rank'].apply(pd.to_numeric, errors='coerce').notnull()]
-
-# Breyta 'Rank' dálknum í tölur
-rank_df['Rank'] = pd.to_numeric(rank_df['Rank'])
-
-# Búa til tilbúna "Time" dálk með smá millibili fyrir Rank línuritið
-rank_df['Time'] = range(1, len(rank_df) + 1)
-
-# Helper function to convert time strings to seconds
-def convert_to_seconds(time_str):
-    try:
-        if '.' in time_str:  # Handle times with fractional seconds like '00:36:16.10'
-            h, m, s = map(float, time_str.split(':'))
-        else:
-            h, m, s = map(int, time_str.split(':'))
-        return h * 3600 + m * 60 + s
-    except Exception:
-        return None
+    # Búa til tilbúna "Time" dálk með smá millibili fyrir Rank línuritið
+    return pd.DataFrame({'Rank': rank.to_numpy(), 'Time': np.arange(1, len(rank) + 1)})
 
 # Shiny app uppsetning
 app_ui = ui.page_fluid(
@@ -47,72 +37,97 @@ app_ui = ui.page_fluid(
 
     # Þriðja mælaborðið - Hlaupa tegund og tímarit
     ui.panel_title("Bæting eftir hlaupa tegund"),
-    ui.input_select("length_choice", "Veldu hlaupa tegund", choices=list(summary_df['Length'].unique())),
+    ui.input_select("length_choice", "Veldu hlaupa tegund", choices=[]),
     ui.output_plot("improvement_plot")
 )
 
+# Teikniföll fyrir myndirnar; hvert fall teiknar á tóma mynd frá figure_cache
+
+# Línurit - Sæti eftir tímaröð
+def draw_rank_plot(fig, race):
+    rank_df = rank_data(race)
+    ax = fig.subplots()
+    ax.plot(rank_df['Time'], rank_df['Rank'], marker='o')
+    ax.set_xlabel('Tími (tilbúið)')
+    ax.set_ylabel('Sæti')
+    ax.set_title('Sæti hlaupara eftir tímaröð')
+    ax.invert_yaxis()  # Sætin verða betri ef við snúum þeim við
+    ax.grid(True)
+
+# Súlurit - Lengdir hlaupa og fjöldi þátttaka
+def draw_summary_plot(fig, race):
+    summary_df = race.summary_data
+    ax = fig.subplots()
+    ax.bar(summary_df['Length'], summary_df['Count'], color='skyblue')
+    ax.set_xlabel('Lengdir hlaupa')
+    ax.set_ylabel('Fjöldi þátttaka')
+    ax.set_title('Lengdir hlaupa og fjöldi þátttaka')
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+
+# Línurit - Bæting eftir hlaupa tegund
+def draw_improvement_plot(fig, race, selected_length):
+    # Sækja 'Time' eða 'Laps' hlauparans úr 'timataka' töflunni fyrir hlaup af valinni lengd
+    timataka_df = timataka_db.results_for_length(selected_length, race.athlete_id)
+
+    # Umbreyta 'Time' gögnum í sekúndur og bæta við sem 'Time_in_seconds'
+    timataka_df['Time_in_seconds'] = parse_times(timataka_df['Time'])
+
+    # Nota 'Time_in_seconds' ef það er til staðar annars 'Laps'
+    timataka_df['Improvement'] = timataka_df['Time_in_seconds'].fillna(timataka_df['Laps'])
+
+    # Búa til tímarað fyrir línuritið
+    timataka_df = timataka_df.dropna(subset=['Improvement'])
+    timataka_df['Time_series'] = range(1, len(timataka_df) + 1)
+
+    # Teikna línuritið
+    ax = fig.subplots()
+    ax.plot(timataka_df['Time_series'], timataka_df['Improvement'], marker='o')
+    ax.set_xlabel('Keppnir í tímaröð')
+    ax.set_ylabel('Tími í sekúndum eða Laps')
+    ax.set_title(f"Bæting í hlaupa tegund: {selected_length}")
+    ax.grid(True)
+
 # Server hlutinn fyrir Shiny appið
+# Myndirnar eru teiknaðar einu sinni fyrir hver inntök og útgáfu gagnagrunnsins
+# og PNG myndinni deilt á milli session-a í gegnum figure_cache.png_cache
 def server(input, output, session):
-    # Línurit - Sæti eftir tímaröð
+    watch_db_version()
+
+    def load_race_data(version):
+        return get_race_data()
+
+    # Sótt aftur þegar gagnagrunnurinn breytist
+    race_data = background_calc(lambda: (db_version(),), load_race_data)
+
+    # Velja hlaupa tegund úr samantekt hlauparans
+    @reactive.Effect
+    def update_length_choice():
+        ui.update_select("length_choice", choices=list(race_data().summary_data['Length'].unique()))
+
     @output
-    @render.plot
+    @timed_output
+    @cached_plot
     def rank_plot():
-        plt.figure(figsize=(10, 6))
-        plt.plot(rank_df['Time'], rank_df['Rank'], marker='o')
-        plt.xlabel('Tími (tilbúið)')
-        plt.ylabel('Sæti')
-        plt.title('Sæti hlaupara eftir tímaröð')
-        plt.gca().invert_yaxis()  # Sætin verða betri ef við snúum þeim við
-        plt.grid(True)
-        return plt.gcf()
-
-    # Súlurit - Lengdir hlaupa og fjöldi þátttaka
+        race = race_data()
+        return ('rank_plot', race.key), lambda fig: draw_rank_plot(fig, race)
+
     @output
-    @render.plot
+    @timed_output
+    @cached_plot
     def summary_plot():
-        plt.figure(figsize=(10, 6))
-        plt.bar(summary_df['Length'], summary_df['Count'], color='skyblue')
-        plt.xlabel('Lengdir hlaupa')
-        plt.ylabel('Fjöldi þátttaka')
-        plt.title('Lengdir hlaupa og fjöldi þátttaka')
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        return plt.gcf()
-
-    # Línurit - Bæting eftir hlaupa tegund
+        race = race_data()
+        return ('summary_plot', race.key), lambda fig: draw_summary_plot(fig, race)
+
     @output
-    @render.plot
+    @timed_output
+    @cached_plot
     def improvement_plot():
-        # Velja hlaupa tegund úr 'siggi_hlaup_summary'
-        selected_length = input.length_choice()
-        selected_ids = summary_df[summary_df['Length'] == selected_length]['IDs'].values[0]
-        
-        # Sækja 'Time' eða 'Laps' úr 'timataka' töflunni fyrir viðkomandi hlaupa IDs
-        ids_list = selected_ids.split(", ")
-        query = f"SELECT Time, Laps FROM timataka WHERE hlaup_id IN ({','.join(ids_list)})"
-        
-        conn = sqlite3.connect("siggi_timataka.db")
-        timataka_df = pd.read_sql_query(query, conn)
-        conn.close()
-
-        # Umbreyta 'Time' gögnum í sekúndur og bæta við sem 'Time_in_seconds'
-        timataka_df['Time_in_seconds'] = timataka_df['Time'].apply(convert_to_seconds)
-        
-        # Nota 'Time_in_seconds' ef það er til staðar annars 'Laps'
-        timataka_df['Improvement'] = timataka_df['Time_in_seconds'].fillna(timataka_df['Laps'])
-        
-        # Búa til tímarað fyrir línuritið
-        timataka_df = timataka_df.dropna(subset=['Improvement'])
-        timataka_df['Time_series'] = range(1, len(timataka_df) + 1)
-        
-        # Teikna línuritið
-        plt.figure(figsize=(10, 6))
-        plt.plot(timataka_df['Time_series'], timataka_df['Improvement'], marker='o')
-        plt.xlabel('Keppnir í tímaröð')
-        plt.ylabel('Tími í sekúndum eða Laps')
-        plt.title(f"Bæting í hlaupa tegund: {selected_length}")
-        plt.grid(True)
-        return plt.gcf()
+        race = race_data()
+        selected_length = req(input.length_choice())
+        key = ('improvement_plot', selected_length, race.key)
+        return key, lambda fig: draw_improvement_plot(fig, race, selected_length)
 
 # Setja upp app-ið
-app = App(app_ui, server)
+app = with_metrics_route(App(app_ui, server))
@@ -0,0 +1,174 @@
+# Dálkaskrá (snapshot) af auðguðu gögnunum við hliðina á gagnagrunninum,
+# t.d. siggi_timataka.snapshot/<útgáfa>/. Hver dálkur er ein .npy skrá sem
+# öppin opna með np.load(mmap_mode='r'): tölur eru lesnar beint úr skránni
+# án afritunar og stýrikerfið deilir síðunum á milli allra worker ferla.
+# Textadálkar eru geymdir sem kóðar (int32) ásamt lista af gildum í
+# manifest.json og eru byggðir upp aftur þegar sneið er lesin.
+#
+# 'útgáfa' er data_version() gagnagrunnsins þegar skráin var byggð. Ef
+# gagnagrunninum hefur verið breytt síðan er skráin úrelt og öppin lesa
+# beint úr SQLite þar til hún er byggð aftur með:
+#
+#   python snapshot.py
+import json
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import timataka_db
+from race_metrics import apply_schema, hlaup_schema, join_race_tables
+
+# Hækkað ef snið skráarinnar breytist; eldri skrár eru þá hunsaðar
+snapshot_format = 2
+
+# Mappan sem geymir útgáfur dálkaskrárinnar fyrir tiltekinn gagnagrunn
+def snapshot_root(db_path=timataka_db.DB_PATH):
+    return os.path.splitext(db_path)[0] + '.snapshot'
+
+# Gildi úr numpy (t.d. np.int64) yfir í gildi sem json getur skrifað
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+def _write_table(directory, table, frame):
+    columns = []
+    for number, (name, values) in enumerate(frame.items()):
+        file_name = f'{table}_{number}.npy'
+        # Dálkar pandas (t.d. 'Int16' með gildum sem vantar eða 'category') eru
+        # geymdir eins og textadálkar
+        if values.dtype.kind in 'biuf' and isinstance(values.dtype, np.dtype):
+            np.save(os.path.join(directory, file_name), values.to_numpy())
+            columns.append({'name': name, 'file': file_name})
+        else:
+            codes, uniques = pd.factorize(values, use_na_sentinel=True)
+            np.save(os.path.join(directory, file_name), codes.astype('int32'))
+            # Gildi sem vantar eru None úr SQLite en NaN eftir merge í pandas
+            missing = values[values.isna()]
+            missing = 'nan' if len(missing) and missing.iloc[0] is not None else 'none'
+            columns.append({'name': name, 'file': file_name, 'values': [_json_value(v) for v in uniques], 'missing': missing})
+    return {'rows': len(frame), 'columns': columns}
+
+# Skrifa töflurnar ({nafn: DataFrame}) sem nýja útgáfu og fjarlægja eldri
+# útgáfur. Skrifað er fyrst í bráðabirgðamöppu sem er síðan færð á sinn
+# stað, svo að lesandi sér aldrei hálfskrifaða útgáfu.
+def write_snapshot(root, version, tables):
+    directory = os.path.join(root, str(version))
+    tmp_directory = f'{directory}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    manifest = {'format': snapshot_format, 'version': version, 'tables': {}}
+    for table, frame in tables.items():
+        manifest['tables'][table] = _write_table(tmp_directory, table, frame)
+    with open(os.path.join(tmp_directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    for name in os.listdir(root):
+        if name != str(version):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return directory
+
+# Opin dálkaskrá. Dálkarnir eru memmap fylki sem má aðeins lesa.
+class Snapshot:
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.version = manifest['version']
+        self._tables = manifest['tables']
+        self._arrays = {}
+        self._dictionaries = {}
+
+        # 'hlaup_data' er raðað eftir (athlete_id, id), svo niðurstöður
+        # hvers hlaupara eru samfelld sneið; mörkin finnast í einni umferð
+        athlete_ids = self._column('hlaup_data', 'athlete_id')
+        self._starts = np.concatenate(([0], np.flatnonzero(athlete_ids[1:] != athlete_ids[:-1]) + 1))
+        self._stops = np.append(self._starts[1:], len(athlete_ids))
+        self._athlete_ids = np.asarray(athlete_ids[self._starts])
+
+    def _column(self, table, name):
+        for column in self._tables[table]['columns']:
+            if column['name'] == name:
+                return self._array(column)
+        raise KeyError(name)
+
+    def _array(self, column):
+        array = self._arrays.get(column['file'])
+        if array is None:
+            array = np.load(os.path.join(self.directory, column['file']), mmap_mode='r')
+            self._arrays[column['file']] = array
+        return array
+
+    # Gildi textadálks; kóði -1 (síðasta stakið) er gildi sem vantar
+    def _dictionary(self, column):
+        values = self._dictionaries.get(column['file'])
+        if values is None:
+            missing = np.nan if column['missing'] == 'nan' else None
+            values = np.array(column['values'] + [missing], dtype=object)
+            self._dictionaries[column['file']] = values
+        return values
+
+    # Línur í 'hlaup_data' fyrir einn hlaupara (tóm sneið ef hann er ekki til)
+    def athlete_rows(self, athlete_id):
+        i = np.searchsorted(self._athlete_ids, athlete_id)
+        if i < len(self._athlete_ids) and self._athlete_ids[i] == athlete_id:
+            return slice(int(self._starts[i]), int(self._stops[i]))
+        return slice(0, 0)
+
+    # DataFrame úr línunum 'rows' í töflunni. Talnadálkar eru sneiðar af
+    # memmap fylkjunum (engin afritun); textadálkar eru byggðir úr kóðunum
+    # og fá sömu gerð og pandas hefði gefið þeim við lestur úr SQLite.
+    def table(self, table, rows=slice(None)):
+        data = {}
+        for column in self._tables[table]['columns']:
+            array = self._array(column)[rows]
+            if 'values' in column:
+                array = self._dictionary(column).take(array)
+            data[column['name']] = array
+        return pd.DataFrame(data, copy=False).infer_objects(copy=False)
+
+# Opna dálkaskrána fyrir útgáfu 'version' gagnagrunnsins, eða None ef hún
+# er ekki til (t.d. úrelt eða aldrei byggð)
+def open_snapshot(db_path=timataka_db.DB_PATH, version=None):
+    if version is None:
+        version = timataka_db.data_version(db_path)
+    directory = os.path.join(snapshot_root(db_path), str(version))
+    try:
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != snapshot_format or manifest.get('version') != version:
+        return None
+    return Snapshot(directory, manifest)
+
+def is_current(db_path=timataka_db.DB_PATH):
+    version = timataka_db.data_version(db_path)
+    return os.path.exists(os.path.join(snapshot_root(db_path), str(version), 'manifest.json'))
+
+# Lesa allar niðurstöður, sameina töflurnar og þátta tímana einu sinni og
+# skrifa dálkaskrá fyrir núverandi útgáfu gagnagrunnsins
+def build_snapshot(db_path=timataka_db.DB_PATH):
+    version = timataka_db.data_version(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        hlaup_data = pd.read_sql_query(
+            "SELECT * FROM timataka WHERE athlete_id IS NOT NULL ORDER BY athlete_id, id", conn
+        )
+        ar_data = pd.read_sql_query("SELECT * FROM ar_id_table", conn)
+        length_data = pd.read_sql_query(
+            "SELECT hlaup_id, length_label AS Length, distance_m AS Distance_m FROM race_length", conn
+        )
+    finally:
+        conn.close()
+    if timataka_db.data_version(db_path) != version:
+        raise RuntimeError("Gagnagrunninum var breytt á meðan dálkaskráin var byggð")
+
+    hlaup_data, ar_data = join_race_tables(hlaup_data, ar_data, length_data)
+    hlaup_data = apply_schema(hlaup_data, hlaup_schema)
+    return write_snapshot(snapshot_root(db_path), version, {'hlaup_data': hlaup_data, 'ar_data': ar_data})
+
+if __name__ == '__main__':
+    print(build_snapshot())
@@ -0,0 +1,1000 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import unicodedata
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+import numpy as np
+import pandas as pd
+
+from race_metrics import add_derived_metrics, parse_times
+
+DB_PATH = 'siggi_timataka.db'
+
+# Hlauparinn sem er sýndur ef enginn annar er valinn
+default_athlete = 'Sigurjón Ernir Sturluson'
+
+# Búa til 'Distance_m' úr 'Length' (t.d. '17.5KM' -> 17500.0)
+def length_to_meters(length_str):
+    try:
+        match = re.search(r'(\d+(?:\.\d+)?)', length_str)
+        if match:
+            distance_km = float(match.group(1))
+            distance_m = distance_km * 1000
+            return distance_m
+        else:
+            return None
+    except:
+        return None
+
+# Flutningur 1: 'race_length' tafla með einni línu á hvert hlaup í stað
+# kommuaðgreindra 'IDs' strengja í 'siggi_hlaup_summary'
+def create_race_length(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS race_length (
+            hlaup_id INTEGER PRIMARY KEY,
+            length_label TEXT NOT NULL,
+            distance_m REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_race_length_label ON race_length(length_label, hlaup_id)")
+
+    rows = []
+    for length_label, ids_str in conn.execute("SELECT Length, IDs FROM siggi_hlaup_summary"):
+        for id_ in str(ids_str or '').split(','):
+            if id_.strip():
+                rows.append((int(id_), length_label, length_to_meters(length_label)))
+    conn.executemany("INSERT OR REPLACE INTO race_length VALUES (?, ?, ?)", rows)
+
+# Flutningur 2: vísir á 'timataka(hlaup_id)' svo að leit eftir hlaupi
+# þurfi ekki að skanna alla töfluna
+def index_timataka_hlaup_id(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_timataka_hlaup_id ON timataka(hlaup_id)")
+
+# Einkvæmir lyklar á niðurstöðum fyrir innsetningu með ingest.py. Rásnúmer
+# vantar ('') hjá sumum hlaupurum, svo (hlaup_id, BIB) er aðeins lykill
+# þegar það er til, og annars (hlaup_id, Name, Time); annars lentu allar
+# niðurstöður án rásnúmers í sama hlaupi á sömu línunni.
+def create_result_keys(conn):
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_timataka_hlaup_bib
+        ON timataka(hlaup_id, BIB) WHERE BIB <> ''
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_timataka_hlaup_name_time
+        ON timataka(hlaup_id, "Name", "Time") WHERE BIB = ''
+    """)
+
+# Flutningur 3: einkvæmur lykill á niðurstöðum fyrir innsetningu með ingest.py
+# og tafla yfir skrár sem hafa verið settar inn
+def create_ingest_tables(conn):
+    create_result_keys(conn)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingested_file (
+            path TEXT PRIMARY KEY,
+            sha256 TEXT NOT NULL,
+            kind TEXT,
+            rows INTEGER,
+            ingested_at TEXT
+        )
+    """)
+
+# Nafn hlaupara án auka bila og dálkabila (t.d. 'Sigurjón Ernir\tSturluson')
+def normalize_name(name):
+    return ' '.join(str(name).split())
+
+# Stafir sem sundrast ekki í grunnstaf og brodd (NFKD)
+search_folds = str.maketrans({'ð': 'd', 'þ': 'th', 'æ': 'ae', 'ø': 'o'})
+
+# Leitarlykill nafns: lágstafir án broddstafa og greinarmerkja, með ð, þ og
+# æ sem d, th og ae, svo að 'Sigurjón Ernir' og 'sigurjon  ernir' fá sama
+# lykil (t.d. 'Þórður Ægisson' -> 'thordur aegisson')
+def search_key(name):
+    folded = unicodedata.normalize('NFKD', str(name).lower().translate(search_folds))
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[\W_]+', ' ', folded).split())
+
+# Þrístafa bútar lykils, með bilum fremst og aftast svo að upphaf og endir
+# vegi þyngra (t.d. 'jon' -> '  j', ' jo', 'jon', 'on ')
+def name_trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+# Líkindi tveggja lykla, 0-1: hlutfall sameiginlegra þrístafa búta
+def name_similarity(a, b):
+    return jaccard(name_trigrams(a), name_trigrams(b))
+
+# Tengja niðurstöður sem hafa ekki 'athlete_id' við hlaupara eftir nafni og
+# bæta við nýjum hlaupurum. Nöfn sem hafa verið sameinuð öðrum hlaupara
+# (sjá merge_athletes.py) eru tengd við hann í gegnum 'athlete_alias'.
+# Notað af flutningi 4 og ingest.py; aðeins línur með 'athlete_id IS NULL'
+# eru skoðaðar og vísirinn finnur þær beint.
+def assign_athletes(conn):
+    conn.create_function('normalize_name', 1, normalize_name, deterministic=True)
+    # 'athlete_alias' verður til í flutningi 10, á eftir flutningi 4
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'athlete_alias'").fetchone():
+        conn.execute("""
+            UPDATE timataka
+            SET athlete_id = (SELECT athlete_id FROM athlete_alias WHERE name = normalize_name(timataka.Name))
+            WHERE athlete_id IS NULL AND normalize_name(Name) IN (SELECT name FROM athlete_alias)
+        """)
+    conn.execute("""
+        INSERT OR IGNORE INTO athlete (name)
+        SELECT DISTINCT normalize_name(Name) FROM timataka
+        WHERE athlete_id IS NULL AND trim(coalesce(Name, '')) != ''
+    """)
+    conn.execute("""
+        UPDATE timataka
+        SET athlete_id = (SELECT id FROM athlete WHERE name = normalize_name(timataka.Name))
+        WHERE athlete_id IS NULL AND trim(coalesce(Name, '')) != ''
+    """)
+
+# Flutningur 4: 'athlete' tafla með einni línu á hvern hlaupara og
+# 'timataka.athlete_id' með vísi á (athlete_id, hlaup_id), svo að gögn eins
+# hlaupara eru sótt beint óháð því hversu margar niðurstöður eru í töflunni
+def create_athlete(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS athlete (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(timataka)")]
+    if 'athlete_id' not in columns:
+        conn.execute("ALTER TABLE timataka ADD COLUMN athlete_id INTEGER REFERENCES athlete(id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_timataka_athlete ON timataka(athlete_id, hlaup_id)")
+    assign_athletes(conn)
+
+# Einn millitími í 'Split' dálkinum, t.d. '00:44:22 (Hafravatn)', '01:04:49.21 (S1)',
+# '00:54:02 (Súlubílastæði (10km))' eða '00:17:31' án nafns. '*Steinn' er
+# millitímapunktur þar sem enginn tími var skráður.
+split_pattern = r"""
+    (?P<hours>\d+):(?P<minutes>\d{2}):(?P<seconds>\d{2}(?:\.\d+)?)
+    (?:\s*\((?P<name>(?:[^()]|\([^()]*\))*)\))?
+  | \*(?P<missed>[^*]*?)(?=\d+:\d{2}:\d{2}|\*|$)
+"""
+
+# Þátta 'Split' strengi í eina línu á hvern millitímapunkt. Allir strengirnir
+# eru þáttaðir í einni umferð með str.extractall; 'elapsed_s' er NaN fyrir
+# punkta sem vantar tíma. 'checkpoint_idx' er röð punktsins í strengnum (frá 0).
+def parse_splits(results):
+    splits = results['Split'].fillna('').astype(str)
+    matches = splits.str.extractall(split_pattern, flags=re.VERBOSE)
+    if matches.empty:
+        return pd.DataFrame(columns=['hlaup_id', 'result_id', 'checkpoint_idx', 'checkpoint_name', 'elapsed_s'])
+
+    rows = matches.index.get_level_values(0)
+    elapsed = (
+        matches['hours'].astype(float) * 3600
+        + matches['minutes'].astype(float) * 60
+        + matches['seconds'].astype(float)
+    )
+    name = matches['name'].fillna(matches['missed']).fillna('').str.strip()
+    return pd.DataFrame({
+        'hlaup_id': results['hlaup_id'].to_numpy()[rows],
+        'result_id': results['id'].to_numpy()[rows],
+        'checkpoint_idx': matches.index.get_level_values(1),
+        'checkpoint_name': name.to_numpy(),
+        'elapsed_s': elapsed.to_numpy(),
+    })
+
+# Þátta millitíma hlaupanna 'hlaup_ids' (allra hlaupa ef None) aftur og setja
+# í 'split' töfluna. Notað af flutningi 5 og ingest.py.
+def refresh_splits(conn, hlaup_ids=None):
+    ids = None if hlaup_ids is None else json.dumps(sorted(int(id_) for id_ in hlaup_ids))
+    results = pd.read_sql_query("""
+        SELECT id, hlaup_id, Split FROM timataka
+        WHERE coalesce(Split, '') != '' AND (?1 IS NULL OR hlaup_id IN (SELECT value FROM json_each(?1)))
+    """, conn, params=(ids,))
+    conn.execute("DELETE FROM split WHERE ?1 IS NULL OR hlaup_id IN (SELECT value FROM json_each(?1))", (ids,))
+
+    splits = parse_splits(results)
+    rows = zip(
+        splits['hlaup_id'].tolist(),
+        splits['result_id'].tolist(),
+        splits['checkpoint_idx'].tolist(),
+        splits['checkpoint_name'].tolist(),
+        splits['elapsed_s'].astype(object).where(splits['elapsed_s'].notna(), None).tolist(),
+    )
+    conn.executemany("INSERT INTO split VALUES (?, ?, ?, ?, ?)", rows)
+    return len(splits)
+
+# Flutningur 5: 'split' tafla með einni línu á hvern millitíma, þáttuð einu
+# sinni úr 'timataka.Split' í stað þess að þátta strengina við hverja teikningu
+def create_split(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS split (
+            hlaup_id INTEGER NOT NULL,
+            result_id INTEGER NOT NULL REFERENCES timataka(id),
+            checkpoint_idx INTEGER NOT NULL,
+            checkpoint_name TEXT,
+            elapsed_s REAL,
+            PRIMARY KEY (result_id, checkpoint_idx)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_split_hlaup_checkpoint ON split(hlaup_id, checkpoint_idx)")
+    refresh_splits(conn)
+
+# Ártal úr nafni hlaups, t.d. 'Dyrfjallahlaup 2024 - ...' -> 2024
+def year_from_name(nafn):
+    match = re.search(r'\b(20\d\d)\b', str(nafn))
+    return int(match.group(1)) if match else None
+
+# Setja 'hlaup.year' fyrir hlaupin 'hlaup_ids' (öll ef None): ártalið úr
+# 'ar_id_table' ef það er skráð, annars úr nafni hlaupsins
+def refresh_race_years(conn, hlaup_ids=None):
+    ids = None if hlaup_ids is None else json.dumps(sorted(int(id_) for id_ in hlaup_ids))
+    conn.create_function('year_from_name', 1, year_from_name, deterministic=True)
+    conn.execute("""
+        UPDATE hlaup
+        SET year = coalesce((SELECT max(ar) FROM ar_id_table WHERE ar_id_table.id = hlaup.id), year_from_name(nafn))
+        WHERE ?1 IS NULL OR id IN (SELECT value FROM json_each(?1))
+    """, (ids,))
+
+# Hlauparar sem eiga niðurstöður í hlaupunum 'hlaup_ids'
+def athletes_in_races(conn, hlaup_ids):
+    ids = json.dumps(sorted(int(id_) for id_ in hlaup_ids))
+    return {athlete_id for (athlete_id,) in conn.execute("""
+        SELECT DISTINCT athlete_id FROM timataka
+        WHERE hlaup_id IN (SELECT value FROM json_each(?)) AND athlete_id IS NOT NULL
+    """, (ids,))}
+
+# Niðurstöður hlauparanna 'athlete_ids' (allra ef None) með vegalengd, ári og
+# afleiddu stærðunum úr race_metrics.add_derived_metrics (hraða og
+# vegalengdarflokki), eins og öppin reikna þær. Notað af refresh_rollups og
+# refresh_speed_trends.
+def results_with_metrics(conn, athlete_ids=None):
+    ids = None if athlete_ids is None else json.dumps(sorted(int(id_) for id_ in athlete_ids))
+    results = pd.read_sql_query("""
+        SELECT t.athlete_id, t.hlaup_id, t.Rank, t.Time, r.distance_m AS Distance_m,
+               coalesce(h.year, (SELECT max(ar) FROM ar_id_table a WHERE a.id = t.hlaup_id)) AS year
+        FROM timataka t
+        LEFT JOIN race_length r ON r.hlaup_id = t.hlaup_id
+        LEFT JOIN hlaup h ON h.id = t.hlaup_id
+        WHERE t.athlete_id IS NOT NULL AND (?1 IS NULL OR t.athlete_id IN (SELECT value FROM json_each(?1)))
+    """, conn, params=(ids,))
+    results['Time_in_seconds'] = parse_times(results['Time'])
+    results['Rank'] = pd.to_numeric(results['Rank'], errors='coerce')
+    return add_derived_metrics(results)
+
+# Reikna samantekt hlauparanna 'athlete_ids' (allra ef None) eftir ári og
+# vegalengdarflokki aftur: fjöldi hlaupa, besti tími, miðgildi hraða og
+# besta sæti. Notað af flutningi 6 og ingest.py; öppin lesa aðeins töfluna.
+def refresh_rollups(conn, athlete_ids=None):
+    ids = None if athlete_ids is None else json.dumps(sorted(int(id_) for id_ in athlete_ids))
+    results = results_with_metrics(conn, athlete_ids).dropna(subset=['year'])
+    conn.execute("DELETE FROM athlete_year_rollup WHERE ?1 IS NULL OR athlete_id IN (SELECT value FROM json_each(?1))", (ids,))
+
+    rollup = results.groupby(['athlete_id', 'year', 'Distance_class']).agg(
+        races=('Rank', 'size'),
+        best_time_s=('Time_in_seconds', 'min'),
+        median_speed_m_s=('Speed_m_s', 'median'),
+        best_rank=('Rank', 'min'),
+    ).reset_index()
+    rollup = rollup.astype({'athlete_id': int, 'year': int, 'Distance_class': int, 'races': int}).astype(object)
+    conn.executemany(
+        "INSERT INTO athlete_year_rollup VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rollup.where(rollup.notna(), None).itertuples(index=False, name=None),
+    )
+    return len(rollup)
+
+# Flutningur 6: 'hlaup.year' með vísi í stað þess að 'ordered_hlaup' þátti
+# nöfnin í hvert skipti, og 'athlete_year_rollup' tafla með samantekt hvers
+# hlaupara eftir (ári, vegalengdarflokki) sem er uppfærð við innsetningu
+def create_year_rollups(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(hlaup)")]
+    if 'year' not in columns:
+        conn.execute("ALTER TABLE hlaup ADD COLUMN year INTEGER")
+    refresh_race_years(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hlaup_year ON hlaup(year, id)")
+    conn.execute("DROP VIEW IF EXISTS ordered_hlaup")
+    conn.execute("CREATE VIEW ordered_hlaup AS SELECT * FROM hlaup WHERE year IS NOT NULL ORDER BY year")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS athlete_year_rollup (
+            athlete_id INTEGER NOT NULL REFERENCES athlete(id),
+            year INTEGER NOT NULL,
+            distance_class INTEGER NOT NULL,
+            races INTEGER NOT NULL,
+            best_time_s REAL,
+            median_speed_m_s REAL,
+            best_rank INTEGER,
+            PRIMARY KEY (athlete_id, year, distance_class)
+        )
+    """)
+    refresh_rollups(conn)
+
+# Tímaröð hlaupa: eftir ári og svo lækkandi hlaup_id (timataka.net gefur
+# nýrri hlaupum lægri númer), sem ein heiltala. Hlaup án árs eru fremst.
+race_order = """
+    coalesce(
+        (SELECT year FROM hlaup h WHERE h.id = {hlaup_id}),
+        (SELECT max(ar) FROM ar_id_table a WHERE a.id = {hlaup_id}),
+        0
+    ) * 1000000000 - {hlaup_id}
+"""
+
+# Reikna framvindu hlaupara ('athlete_progression') aftur eftir að hlaupin
+# 'hlaup_ids' (öll ef None) breyttust. Fyrir hvern (hlaupara, lengd) sem
+# breytingin snertir eru aðeins línurnar frá fyrsta breytta hlaupinu (í
+# tímaröð) reiknaðar aftur, út frá bestu gildunum í línunni á undan. Ný
+# hlaup eru yfirleitt þau nýjustu, svo línum þeirra er þá aðeins bætt
+# aftast. Notað af flutningi 7 og ingest.py.
+def refresh_progression(conn, hlaup_ids=None):
+    ids = None if hlaup_ids is None else json.dumps(sorted(int(id_) for id_ in hlaup_ids))
+    params = () if ids is None else (ids,)
+    # Án 'hlaup_ids' er allt reiknað; annars eru aðeins línur hlaupanna lesnar í gegnum vísana
+    changed = '' if ids is None else 'AND t.hlaup_id IN (SELECT value FROM json_each(?1))'
+    indexed = '' if ids is None else 'WHERE hlaup_id IN (SELECT value FROM json_each(?1))'
+    conn.execute("DROP TABLE IF EXISTS temp.progression_start")
+    conn.execute(f"""
+        CREATE TEMP TABLE progression_start AS
+        SELECT athlete_id, length_label, MIN(start) AS start FROM (
+            SELECT t.athlete_id, r.length_label, MIN({race_order.format(hlaup_id='t.hlaup_id')}) AS start
+            FROM timataka t
+            JOIN race_length r ON r.hlaup_id = t.hlaup_id
+            WHERE t.athlete_id IS NOT NULL {changed}
+            GROUP BY t.athlete_id, r.length_label
+            UNION ALL
+            SELECT athlete_id, length_label, MIN(race_order) FROM athlete_progression {indexed}
+            GROUP BY athlete_id, length_label
+        )
+        GROUP BY athlete_id, length_label
+    """, params)
+
+    # Síðasta línan á undan fyrsta breytta hlaupinu í hverjum hópi
+    prior = pd.read_sql_query("""
+        SELECT p.athlete_id, p.length_label, p.seq, p.best_time_s AS time_s, p.best_laps AS laps
+        FROM progression_start s
+        JOIN athlete_progression p ON p.athlete_id = s.athlete_id AND p.length_label = s.length_label
+        WHERE p.seq = (
+            SELECT MAX(q.seq) FROM athlete_progression q
+            WHERE q.athlete_id = s.athlete_id AND q.length_label = s.length_label AND q.race_order < s.start
+        )
+    """, conn)
+    conn.execute("""
+        DELETE FROM athlete_progression WHERE rowid IN (
+            SELECT p.rowid FROM progression_start s
+            JOIN athlete_progression p ON p.athlete_id = s.athlete_id AND p.length_label = s.length_label
+            WHERE p.race_order >= s.start
+        )
+    """)
+    results = pd.read_sql_query(f"""
+        SELECT * FROM (
+            SELECT t.athlete_id, r.length_label, {race_order.format(hlaup_id='t.hlaup_id')} AS race_order,
+                   t.id AS result_id, t.hlaup_id,
+                   coalesce(h.year, (SELECT max(ar) FROM ar_id_table a WHERE a.id = t.hlaup_id)) AS year,
+                   t.Time, t.Laps, t.Rank,
+                   -- Eldri innsetningar skrifuðu '' ef fjöldann vantaði
+                   coalesce(CASE WHEN typeof(h.fjoldi) = 'integer' THEN h.fjoldi END,
+                            (SELECT COUNT(*) FROM timataka f WHERE f.hlaup_id = t.hlaup_id)) AS field_size,
+                   s.start
+            FROM progression_start s
+            JOIN timataka t ON t.athlete_id = s.athlete_id
+            JOIN race_length r ON r.hlaup_id = t.hlaup_id AND r.length_label = s.length_label
+            LEFT JOIN hlaup h ON h.id = t.hlaup_id
+        )
+        WHERE race_order >= start
+        ORDER BY athlete_id, length_label, race_order, result_id
+    """, conn)
+    conn.execute("DROP TABLE temp.progression_start")
+    if results.empty:
+        return 0
+
+    results['seq'] = np.nan
+    results['time_s'] = parse_times(results['Time'])
+    results['laps'] = pd.to_numeric(results['Laps'], errors='coerce')
+    results['rank'] = pd.to_numeric(results['Rank'], errors='coerce')
+
+    # Línan á undan fer fremst í sinn hóp með bestu gildin hingað til, svo
+    # að sömu útreikningarnir dugi hvort sem hópurinn er reiknaður allur eða að hluta
+    keys = ['athlete_id', 'length_label']
+    frames = [prior.astype({'seq': float, 'time_s': float, 'laps': float}).assign(prior=True), results.assign(prior=False)]
+    data = pd.concat([frame for frame in frames if len(frame)], ignore_index=True)
+    data = data.sort_values(keys + ['prior'], ascending=[True, True, False], kind='stable').reset_index(drop=True)
+    groups = [data[key] for key in keys]
+
+    # Besti tími (lægstur) og flestir hringir (hæst) til og með hverri línu
+    data['best_time_s'] = data['time_s'].fillna(np.inf).groupby(groups).cummin().replace(np.inf, np.nan)
+    data['best_laps'] = data['laps'].fillna(-np.inf).groupby(groups).cummax().replace(-np.inf, np.nan)
+    previous_time = data['best_time_s'].groupby(groups).shift()
+    previous_laps = data['best_laps'].groupby(groups).shift()
+    data['is_pb'] = (
+        (data['time_s'].notna() & ~(data['time_s'] >= previous_time))
+        | (data['laps'].notna() & ~(data['laps'] <= previous_laps))
+    )
+    data['delta_time_s'] = data['time_s'] - previous_time
+    data['delta_laps'] = data['laps'] - previous_laps
+    # Númer línunnar í hópnum heldur áfram frá línunni á undan
+    data['seq'] = data['seq'].groupby(groups).transform('first').fillna(0) + data.groupby(keys).cumcount()
+    data = data[~data['prior']]
+
+    columns = ['athlete_id', 'length_label', 'seq', 'race_order', 'result_id', 'hlaup_id', 'year', 'time_s', 'laps',
+               'rank', 'field_size', 'is_pb', 'best_time_s', 'best_laps', 'delta_time_s', 'delta_laps']
+    rows = data[columns].astype({'athlete_id': int, 'seq': int, 'race_order': int, 'result_id': int, 'hlaup_id': int, 'is_pb': int})
+    rows = rows.astype(object)
+    conn.executemany(
+        f"INSERT INTO athlete_progression ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        rows.where(rows.notna(), None).itertuples(index=False, name=None),
+    )
+    return len(rows)
+
+# Flutningur 7: 'athlete_progression' tafla með niðurstöðum hvers hlaupara
+# eftir lengd í tímaröð ásamt persónulegum metum, svo að 'Bætingar' flipinn
+# les aðeins tilbúnar línur í stað þess að sía, þátta og raða við hvert val
+def create_progression(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS athlete_progression (
+            athlete_id INTEGER NOT NULL REFERENCES athlete(id),
+            length_label TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            race_order INTEGER NOT NULL,
+            result_id INTEGER NOT NULL,
+            hlaup_id INTEGER NOT NULL,
+            year INTEGER,
+            time_s REAL,
+            laps INTEGER,
+            rank INTEGER,
+            field_size INTEGER,
+            is_pb INTEGER NOT NULL,
+            best_time_s REAL,
+            best_laps INTEGER,
+            delta_time_s REAL,
+            delta_laps INTEGER,
+            PRIMARY KEY (athlete_id, length_label, seq)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_athlete_progression_hlaup ON athlete_progression(hlaup_id)")
+    refresh_progression(conn)
+
+# Þátta 'Time' og 'Behind' niðurstaðna í hlaupunum 'hlaup_ids' (öllum ef
+# None) í sekúndur ('timataka.time_s' og 'timataka.behind_s'), svo að
+# gluggaföllin í athlete_rank_metrics geti reiknað með tímunum í SQL.
+# Notað af flutningi 8 og ingest.py.
+def refresh_result_seconds(conn, hlaup_ids=None):
+    ids = None if hlaup_ids is None else json.dumps(sorted(int(id_) for id_ in hlaup_ids))
+    results = pd.read_sql_query("""
+        SELECT id, Time, Behind FROM timataka
+        WHERE ?1 IS NULL OR hlaup_id IN (SELECT value FROM json_each(?1))
+    """, conn, params=(ids,))
+    seconds = pd.DataFrame({
+        'time_s': parse_times(results['Time']),
+        'behind_s': parse_times(results['Behind']),
+        'id': results['id'],
+    }).astype(object)
+    conn.executemany(
+        "UPDATE timataka SET time_s = ?, behind_s = ? WHERE id = ?",
+        seconds.where(seconds.notna(), None).itertuples(index=False, name=None),
+    )
+    return len(seconds)
+
+# Flutningur 8: tímar í sekúndum í 'timataka' og vísir sem gluggaföllin í
+# athlete_rank_metrics lesa hlaup fyrir hlaup í röð sætanna, án þess að
+# sækja línurnar sjálfar (id er rowid og fylgir vísinum). Framvindan er
+# reiknuð aftur því fjöldi keppenda þar kemur nú úr 'hlaup.fjoldi'.
+def add_result_seconds(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(timataka)")]
+    for column in ('time_s', 'behind_s'):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE timataka ADD COLUMN {column} REAL")
+    refresh_result_seconds(conn)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_timataka_hlaup_rank
+        ON timataka(hlaup_id, Rank, time_s, behind_s, athlete_id)
+    """)
+    refresh_progression(conn)
+
+# Summur aðfallslínu hraða (m/s) eftir hlaup_id (sjá trend.LinearTrend) fyrir
+# hvern hlaupara í 'athlete_ids' (alla ef None) og vegalengdarflokk, úr sömu
+# hlaupum og 'Hraði' flipinn sýnir. Notað af flutningi 9 og ingest.py.
+def refresh_speed_trends(conn, athlete_ids=None):
+    ids = None if athlete_ids is None else json.dumps(sorted(int(id_) for id_ in athlete_ids))
+    results = results_with_metrics(conn, athlete_ids).dropna(subset=['Distance_m', 'Time_in_seconds', 'Speed_m_s'])
+    conn.execute("DELETE FROM speed_trend WHERE ?1 IS NULL OR athlete_id IN (SELECT value FROM json_each(?1))", (ids,))
+
+    x = results['hlaup_id'].astype(float)
+    y = results['Speed_m_s']
+    sums = pd.DataFrame({
+        'athlete_id': results['athlete_id'], 'distance_class': results['Distance_class'],
+        'n': 1, 'sum_x': x, 'sum_y': y, 'sum_xy': x * y, 'sum_xx': x * x,
+    }).groupby(['athlete_id', 'distance_class']).sum().reset_index()
+    sums = sums.astype({'athlete_id': int, 'distance_class': int, 'n': int}).astype(object)
+    conn.executemany("INSERT INTO speed_trend VALUES (?, ?, ?, ?, ?, ?, ?)", sums.itertuples(index=False, name=None))
+    return len(sums)
+
+# Flutningur 9: 'speed_trend' tafla með summum hallalínunnar í 'Hraði'
+# flipanum, svo að línan er teiknuð úr stuðlum í stað þess að statsmodels
+# reikni hana við hverja teikningu
+def create_speed_trend(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS speed_trend (
+            athlete_id INTEGER NOT NULL REFERENCES athlete(id),
+            distance_class INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            sum_x REAL NOT NULL,
+            sum_y REAL NOT NULL,
+            sum_xy REAL NOT NULL,
+            sum_xx REAL NOT NULL,
+            PRIMARY KEY (athlete_id, distance_class)
+        )
+    """)
+    refresh_speed_trends(conn)
+
+# Leitarlyklar (search_key) nafns og samnefna hlauparanna 'athlete_ids'
+# (allra ef None) í 'athlete_name' og FTS5 vísinum 'athlete_search' (eftir
+# orðum), og ný orð lyklanna í orðasafninu 'search_word' með þrístafa
+# vísinum 'search_word_trigram'. Orðum er ekki eytt úr orðasafninu; orð
+# sem á ekki lengur við neinn lykil finnur einfaldlega enga hlaupara.
+# Notað af flutningi 10, ingest.py og merge_athletes.py.
+def refresh_athlete_names(conn, athlete_ids=None):
+    conn.create_function('search_key', 1, search_key, deterministic=True)
+    ids = None if athlete_ids is None else json.dumps(sorted(int(id_) for id_ in athlete_ids))
+    selected = "?1 IS NULL OR athlete_id IN (SELECT value FROM json_each(?1))"
+    # Vísarnir lesa úr töflunum (external content), svo gömlu lyklarnir eru
+    # teknir úr vísinum áður en línunum er eytt
+    conn.execute(f"""
+        INSERT INTO athlete_search (athlete_search, rowid, key)
+        SELECT 'delete', id, key FROM athlete_name WHERE {selected}
+    """, (ids,))
+    conn.execute(f"DELETE FROM athlete_name WHERE {selected}", (ids,))
+    conn.execute(f"""
+        INSERT INTO athlete_name (athlete_id, name, key)
+        SELECT athlete_id, name, search_key(name) FROM (
+            SELECT id AS athlete_id, name FROM athlete
+            UNION
+            SELECT athlete_id, name FROM athlete_alias
+        )
+        WHERE {selected}
+    """, (ids,))
+    conn.execute(f"INSERT INTO athlete_search (rowid, key) SELECT id, key FROM athlete_name WHERE {selected}", (ids,))
+
+    words = {word for (key,) in conn.execute(f"SELECT key FROM athlete_name WHERE {selected}", (ids,)) for word in key.split()}
+    last_id = conn.execute("SELECT coalesce(max(id), 0) FROM search_word").fetchone()[0]
+    conn.executemany("INSERT OR IGNORE INTO search_word (word) VALUES (?)", ((word,) for word in sorted(words)))
+    conn.execute("INSERT INTO search_word_trigram (rowid, word) SELECT id, word FROM search_word WHERE id > ?", (last_id,))
+
+# Flutningur 10: nafnaleit sem tekur ekki eftir broddstöfum, ð/þ/æ eða
+# stafsetningarvillum (sjá search_athletes) í stað nákvæms samanburðar á
+# nafni, og 'athlete_alias' fyrir nöfn sem hafa verið sameinuð öðrum hlaupara
+def create_athlete_search(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS athlete_alias (
+            name TEXT PRIMARY KEY,
+            athlete_id INTEGER NOT NULL REFERENCES athlete(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS athlete_name (
+            id INTEGER PRIMARY KEY,
+            athlete_id INTEGER NOT NULL REFERENCES athlete(id),
+            name TEXT NOT NULL,
+            key TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_athlete_name_key ON athlete_name(key, athlete_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_athlete_name_athlete ON athlete_name(athlete_id)")
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS athlete_search
+        USING fts5(key, content='athlete_name', content_rowid='id')
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_word (
+            id INTEGER PRIMARY KEY,
+            word TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_word_trigram
+        USING fts5(word, content='search_word', content_rowid='id', tokenize='trigram')
+    """)
+    refresh_athlete_names(conn)
+
+# Flutningur 11: fyrri lykillinn (hlaup_id, BIB) náði einnig yfir
+# niðurstöður án rásnúmers; honum er skipt út fyrir lyklana í create_result_keys
+def split_result_keys(conn):
+    conn.execute("DROP INDEX IF EXISTS idx_timataka_hlaup_bib")
+    create_result_keys(conn)
+
+# Flutningur 12: ingest.py skrifaði tóman streng í talnadálka þar sem gildi
+# vantaði (t.d. 'hlaup.fjoldi'), og '' er stærra en allar tölur í SQLite;
+# þau verða NULL eins og nýjar línur fá
+def null_missing_numbers(conn):
+    conn.execute("UPDATE hlaup SET fjoldi = NULL WHERE fjoldi = ''")
+    conn.execute("UPDATE timataka SET Rank = NULL WHERE Rank = ''")
+    conn.execute("UPDATE timataka SET Laps = NULL WHERE Laps = ''")
+
+# Flutningar í röð; 'PRAGMA user_version' geymir hversu margir hafa verið keyrðir
+migrations = [
+    create_race_length,
+    index_timataka_hlaup_id,
+    create_ingest_tables,
+    create_athlete,
+    create_split,
+    create_year_rollups,
+    create_progression,
+    add_result_seconds,
+    create_speed_trend,
+    create_athlete_search,
+    split_result_keys,
+    null_missing_numbers,
+]
+
+# Keyra þá flutninga sem hafa ekki enn verið keyrðir á gagnagrunninn
+def migrate(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(migrations[version:], start=version + 1):
+            conn.execute("BEGIN")
+            try:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except:
+                conn.execute("ROLLBACK")
+                raise
+            print(f"Flutningur {number}: {migration.__name__}")
+    finally:
+        conn.close()
+
+# Safn af lesaðgangs-tengingum (mode=ro) sem öll session deila.
+# 'immutable=1' sleppir öllum læsingum og er aðeins notað ef beðið er um
+# það og gagnagrunnurinn er ekki í WAL ham, því þá gæti annað ferli verið
+# að skrifa í hann á meðan.
+class ConnectionPool:
+    def __init__(self, db_path=DB_PATH, size=4, immutable=False):
+        self.db_path = db_path
+        self.size = size
+        self.immutable = immutable
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _uri(self, immutable=False):
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        if immutable:
+            uri += "&immutable=1"
+        return uri
+
+    def _connect(self):
+        conn = sqlite3.connect(self._uri(), uri=True, check_same_thread=False)
+        if self.immutable:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            if journal_mode.lower() != 'wal':
+                conn.close()
+                conn = sqlite3.connect(self._uri(immutable=True), uri=True, check_same_thread=False)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                # Allar tengingarnar eru í notkun; bíða eftir að ein losni
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    # Loka öllum lausum tengingum, t.d. ef skipt hefur verið um gagnagrunnsskrána
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+pool = ConnectionPool()
+
+# Útgáfa gagnanna: breytist í hvert skipti sem skrifað er í gagnagrunnsskrána
+def data_version(db_path=None):
+    return os.stat(db_path or pool.db_path).st_mtime_ns
+
+# Keyra SQL fyrirspurn með bundnum færibreytum og skila DataFrame
+def read_frame(query, params=()):
+    with pool.connection() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+# 'Time' og 'Laps' fyrir öll hlaup af tiltekinni lengd, í innsetningarröð,
+# aðeins fyrir einn hlaupara ef 'athlete_id' er gefið
+def results_for_length(length_label, athlete_id=None):
+    return read_frame("""
+        SELECT t.Time, t.Laps
+        FROM race_length r
+        JOIN timataka t ON t.hlaup_id = r.hlaup_id
+        WHERE r.length_label = ? AND (? IS NULL OR t.athlete_id = ?)
+        ORDER BY t.id
+    """, (length_label, athlete_id, athlete_id))
+
+# Allir hlauparar, raðað eftir nafni
+def athletes():
+    return read_frame("SELECT id, name FROM athlete ORDER BY name")
+
+# 'id' hlaupara með tiltekið nafn eða samnefni, eða None
+def athlete_id_for(name):
+    with pool.connection() as conn:
+        row = conn.execute("""
+            SELECT id FROM athlete WHERE name = ?1
+            UNION ALL
+            SELECT athlete_id FROM athlete_alias WHERE name = ?1
+        """, (normalize_name(name),)).fetchone()
+    return row[0] if row else None
+
+# Hámarksfjöldi orða sem hvert leitarorð getur átt við, og lykla sem eru
+# lesnir úr 'athlete_search' í hverri leit
+search_expansions = 10
+search_candidates = 100
+# Lægstu líkindi (name_similarity) orðs við rangt stafsett leitarorð
+min_word_similarity = 0.3
+
+def fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+# FTS5 fyrirspurn sem finnur orð sem eru lítillega frábrugðin 'word': ef
+# einum staf er breytt, bætt við eða sleppt er annar helmingur orðsins
+# óbreyttur. Orð styttri en sex stafir eru leituð eftir stökum þrístafa bútum.
+def fuzzy_match_query(word):
+    if len(word) >= 6:
+        pieces = [word[:len(word) // 2], word[len(word) // 2:]]
+    else:
+        pieces = [word[i:i + 3] for i in range(len(word) - 2)]
+    return ' OR '.join(fts_phrase(piece) for piece in pieces)
+
+# Orð í orðasafninu ('search_word') sem leitarorðið 'word' á við, þau líkustu
+# fyrst: orðið sjálft, eða orð sem byrja á því ef það er síðasta orðið
+# ('partial', gæti verið hálfskrifað); ef ekkert slíkt er til, orð sem
+# innihalda það; og annars orð sem líkjast því (stafsetningarvillur).
+# Orðasafnið er miklu minna en nafnalistinn, svo leitin í því er fljótleg.
+def word_expansions(conn, word, partial):
+    if partial:
+        words = [w for (w,) in conn.execute(
+            "SELECT word FROM search_word WHERE word >= ? AND word < ? ORDER BY word LIMIT ?",
+            (word, word + '\U0010ffff', search_candidates),
+        )]
+    else:
+        words = [w for (w,) in conn.execute("SELECT word FROM search_word WHERE word = ?", (word,))]
+    trigram_match = "SELECT word FROM search_word_trigram WHERE search_word_trigram MATCH ? LIMIT ?"
+    if not words and len(word) >= 3:
+        words = [w for (w,) in conn.execute(trigram_match, (fts_phrase(word), search_candidates))]
+    word_trigrams = name_trigrams(word)
+    if not words and len(word) >= 3:
+        words = [w for (w,) in conn.execute(trigram_match, (fuzzy_match_query(word), search_candidates))
+                 if jaccard(word_trigrams, name_trigrams(w)) >= min_word_similarity]
+    return sorted(words, key=lambda w: -jaccard(word_trigrams, name_trigrams(w)))[:search_expansions]
+
+# Hlauparar sem passa við leitarstrenginn 'query', bestu 'limit' fyrst, sem
+# DataFrame (id, name, score). Leitað er í lyklum (search_key) nafna og
+# samnefna: fyrst að lyklum sem byrja á leitarstrengnum, og síðan er hvert
+# orð hans borið saman við orðasafnið (word_expansions) og lyklar sem
+# innihalda eitthvert orðanna fyrir hvert leitarorð sóttir úr FTS5 vísinum
+# 'athlete_search'. Hvert skref les aðeins takmarkaðan fjölda lína í gegnum
+# vísa, svo tíminn vex lítið með fjölda hlaupara. Lyklunum er raðað eftir
+# name_similarity við leitarstrenginn og þeir sem byrja á honum fá forgang.
+def search_athletes(query, limit=20):
+    key = search_key(query)
+    words = key.split()
+    key_trigrams = name_trigrams(key)
+    found = {}
+    with pool.connection() as conn:
+        groups = [word_expansions(conn, word, partial=i == len(words) - 1) for i, word in enumerate(words)]
+
+        def add_candidates(sql, params):
+            for athlete_id, name_key in conn.execute(sql, params):
+                score = jaccard(key_trigrams, name_trigrams(name_key)) + name_key.startswith(key)
+                found[athlete_id] = max(score, found.get(athlete_id, 0))
+
+        if key:
+            add_candidates(
+                "SELECT athlete_id, key FROM athlete_name WHERE key >= ? AND key < ? ORDER BY key LIMIT ?",
+                (key, key + '\U0010ffff', limit),
+            )
+        # Fyrst aðeins með líkasta orðinu fyrir hvert leitarorð, nema öllum
+        # orðum sem byrja á síðasta orðinu (sem gæti verið hálfskrifað), og
+        # með öllum orðunum ef enginn hefur fundist
+        if words and all(groups):
+            narrow = [group[:1] for group in groups[:-1]]
+            narrow.append(groups[-1] if groups[-1][0].startswith(words[-1]) else groups[-1][:1])
+            for attempt in [narrow] if narrow == groups else [narrow, groups]:
+                if len(found) >= limit or (found and attempt is groups):
+                    break
+                match = ' AND '.join('(' + ' OR '.join(fts_phrase(w) for w in group) + ')' for group in attempt)
+                add_candidates("""
+                    SELECT n.athlete_id, n.key FROM athlete_search s
+                    JOIN athlete_name n ON n.id = s.rowid
+                    WHERE athlete_search MATCH ?
+                    LIMIT ?
+                """, (match, search_candidates))
+        best = sorted(found.items(), key=lambda item: -item[1])[:limit]
+        names = dict(conn.execute(
+            "SELECT id, name FROM athlete WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps([athlete_id for athlete_id, _ in best]),),
+        ))
+    return pd.DataFrame(
+        [(athlete_id, names[athlete_id], score) for athlete_id, score in best if athlete_id in names],
+        columns=['id', 'name', 'score'],
+    )
+
+# Sjálfgefinn hlaupari, eða sá fyrsti í töflunni ef hann er ekki til
+def default_athlete_id():
+    athlete_id = athlete_id_for(default_athlete)
+    if athlete_id is None:
+        with pool.connection() as conn:
+            row = conn.execute("SELECT min(id) FROM athlete").fetchone()
+        athlete_id = row[0]
+    return athlete_id
+
+# Allar niðurstöður eins hlaupara, í innsetningarröð
+def athlete_results(athlete_id):
+    return read_frame("SELECT * FROM timataka WHERE athlete_id = ? ORDER BY id", (athlete_id,))
+
+# Fjöldi hlaupa og hlaup_id eftir lengd fyrir einn hlaupara (kemur í stað
+# 'siggi_hlaup_summary'). Aðeins línur hlauparans eru lesnar í gegnum vísinn.
+def athlete_summary(athlete_id):
+    return read_frame("""
+        SELECT Length, COUNT(*) AS Count, group_concat(hlaup_id, ', ') AS IDs
+        FROM (
+            SELECT r.length_label AS Length, t.hlaup_id
+            FROM timataka t
+            JOIN race_length r ON r.hlaup_id = t.hlaup_id
+            WHERE t.athlete_id = ?
+            ORDER BY r.length_label, CAST(t.hlaup_id AS TEXT)
+        )
+        GROUP BY Length
+        ORDER BY Length
+    """, (athlete_id,))
+
+# Töflur yfir hlaupin sem hlaupari tók þátt í
+def athlete_race_years(athlete_id):
+    return read_frame("""
+        SELECT * FROM ar_id_table
+        WHERE id IN (SELECT hlaup_id FROM timataka WHERE athlete_id = ?)
+    """, (athlete_id,))
+
+def athlete_race_lengths(athlete_id):
+    return read_frame("""
+        SELECT hlaup_id, length_label AS Length, distance_m AS Distance_m
+        FROM race_length
+        WHERE hlaup_id IN (SELECT hlaup_id FROM timataka WHERE athlete_id = ?)
+    """, (athlete_id,))
+
+# Millitímar allra hlaupara í einu hlaupi ásamt lokatíma og vegalengd
+# hlaupsins, lesnir í gegnum vísinn á 'split(hlaup_id, checkpoint_idx)'
+def race_splits(hlaup_id):
+    return read_frame("""
+        SELECT s.result_id, s.checkpoint_idx, s.checkpoint_name, s.elapsed_s, t.Time, r.distance_m AS Distance_m
+        FROM split s
+        JOIN timataka t ON t.id = s.result_id
+        LEFT JOIN race_length r ON r.hlaup_id = s.hlaup_id
+        WHERE s.hlaup_id = ?
+        ORDER BY s.result_id, s.checkpoint_idx
+    """, (hlaup_id,))
+
+# Samantekt eins hlaupara eftir ári og vegalengdarflokki (0 = utan flokka)
+def athlete_rollup(athlete_id):
+    return read_frame("""
+        SELECT year, distance_class, races, best_time_s, median_speed_m_s, best_rank
+        FROM athlete_year_rollup
+        WHERE athlete_id = ?
+        ORDER BY year, distance_class
+    """, (athlete_id,))
+
+# Framvinda eins hlaupara, raðað eftir lengd og svo tímaröð
+def athlete_progression(athlete_id):
+    return read_frame("""
+        SELECT length_label, seq, race_order, result_id, hlaup_id, year, time_s, laps, rank, field_size,
+               is_pb, best_time_s, best_laps, delta_time_s, delta_laps
+        FROM athlete_progression
+        WHERE athlete_id = ?
+        ORDER BY length_label, seq
+    """, (athlete_id,))
+
+# Summur hallalínunnar í 'Hraði' flipanum fyrir einn hlaupara eftir vegalengdarflokki
+def athlete_speed_trends(athlete_id):
+    return read_frame("""
+        SELECT distance_class, n, sum_x, sum_y, sum_xy, sum_xx
+        FROM speed_trend
+        WHERE athlete_id = ?
+        ORDER BY distance_class
+    """, (athlete_id,))
+
+# Sæti hlaupara miðað við fjölda keppenda, reiknað með gluggaföllum í einni
+# fyrirspurn. Aðeins hlaupin sem hlauparinn tók þátt í eru lesin, í gegnum
+# vísana á 'timataka(athlete_id, hlaup_id)' og 'timataka(hlaup_id, Rank, ...)'.
+#   percentile   hlutfall keppenda sem hlauparinn var á undan (100 = sigur),
+#                út frá 'hlaup.fjoldi'; PERCENT_RANK yfir skráðu línurnar ef
+#                fjöldinn er ekki skráður en öll sætin eru í töflunni, annars NULL
+#   gap_s        sekúndur á eftir sigurvegaranum ('Behind', annars mismunur
+#                á tíma hlauparans og sigurvegarans ef hann er skráður)
+#   rank_change  sætum ofar en í hlaupinu á undan (LAG)
+#   streak       fjöldi hlaupa í röð sem 'percentile' hefur hækkað (+) eða
+#                lækkað (-) til og með þessu hlaupi, 0 ef óbreytt
+# Hlaupin eru í tímaröð ('race_order'), þ.e. eftir ári og svo lækkandi hlaup_id.
+rank_metrics_query = f"""
+        WITH field AS (
+            SELECT t.id, t.hlaup_id, t.athlete_id, t.Rank AS rank, t.time_s, t.behind_s,
+                   PERCENT_RANK() OVER (race ORDER BY t.Rank) AS field_percent_rank,
+                   FIRST_VALUE(t.time_s) OVER (race ORDER BY t.Rank) AS winner_s,
+                   COUNT(*) OVER race AS stored_field,
+                   MIN(t.Rank) OVER race AS best_stored_rank,
+                   MAX(t.Rank) OVER race AS worst_stored_rank
+            FROM timataka t
+            WHERE t.hlaup_id IN (SELECT hlaup_id FROM timataka WHERE athlete_id = ?1)
+              AND typeof(t.Rank) IN ('integer', 'real') AND t.Rank >= 1
+            WINDOW race AS (PARTITION BY t.hlaup_id)
+        ),
+        athlete AS (
+            SELECT f.id AS result_id, f.hlaup_id, f.rank,
+                   CASE WHEN h.fjoldi >= f.rank THEN h.fjoldi WHEN complete THEN f.stored_field END AS field_size,
+                   CASE WHEN h.fjoldi >= f.rank THEN (f.rank - 1.0) / max(h.fjoldi - 1, 1)
+                        WHEN complete THEN f.field_percent_rank END AS percent_rank,
+                   CASE WHEN f.behind_s IS NOT NULL THEN f.behind_s
+                        WHEN f.rank = 1 THEN CASE WHEN f.time_s IS NOT NULL THEN 0.0 END
+                        WHEN f.best_stored_rank = 1 THEN f.time_s - f.winner_s END AS gap_s,
+                   {race_order.format(hlaup_id='f.hlaup_id')} AS race_order
+            FROM (
+                -- Öll sætin frá 1 eru skráð, svo skráðu línurnar eru allur hópurinn
+                SELECT *, best_stored_rank = 1 AND worst_stored_rank = stored_field AS complete FROM field
+            ) f
+            -- Aðeins tölur: eldri innsetningar skrifuðu '' ef fjöldann vantaði
+            -- og '' er stærra en allar tölur í SQLite
+            LEFT JOIN (
+                SELECT id, CASE WHEN typeof(fjoldi) = 'integer' THEN fjoldi END AS fjoldi FROM hlaup
+            ) h ON h.id = f.hlaup_id
+            WHERE f.athlete_id = ?1
+        ),
+        ordered AS (
+            SELECT *,
+                   ROW_NUMBER() OVER previous AS race_number,
+                   LAG(rank) OVER previous AS previous_rank,
+                   LAG(percent_rank) OVER previous AS previous_percent_rank
+            FROM athlete
+            WINDOW previous AS (ORDER BY race_order, result_id)
+        ),
+        changes AS (
+            SELECT *,
+                   CASE WHEN percent_rank < previous_percent_rank THEN 1
+                        WHEN percent_rank > previous_percent_rank THEN -1
+                        ELSE 0 END AS direction
+            FROM ordered
+        ),
+        -- Hlaup í röð með sömu stefnu fá sama 'run' númer
+        runs AS (
+            SELECT *, race_number - ROW_NUMBER() OVER (PARTITION BY direction ORDER BY race_number) AS run
+            FROM changes
+        )
+        SELECT result_id, hlaup_id, race_number, rank, field_size,
+               100 * (1 - percent_rank) AS percentile, gap_s,
+               previous_rank - rank AS rank_change,
+               direction * ROW_NUMBER() OVER (PARTITION BY direction, run ORDER BY race_number) AS streak
+        FROM runs
+        ORDER BY race_number
+"""
+
+def athlete_rank_metrics(athlete_id):
+    return read_frame(rank_metrics_query, (athlete_id,))
+
+if __name__ == '__main__':
+    migrate()
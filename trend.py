@@ -0,0 +1,88 @@
+# Hallalínur fyrir 'Hraði' flipann án statsmodels. Aðfallslína (minnstu
+# kvaðrata) y = intercept + slope * x ræðst aðeins af summunum n, Σx, Σy,
+# Σxy og Σx², svo þær eru reiknaðar við innsetningu fyrir hvern hlaupara og
+# vegalengdarflokk (timataka_db.refresh_speed_trends) og myndin les aðeins
+# stuðlana. Summurnar leggjast saman, svo lína fyrir allar vegalengdir er
+# summa flokkanna, og nýjum niðurstöðum má bæta við án þess að lesa hinar.
+#
+# Einnig eru hér tvö afbrigði sem eru reiknuð úr punktunum sjálfum:
+#   rolling_trend   aðfallslína síðustu 'window' punkta við hvern punkt
+#   theil_sen       miðgildi hallatalna milli punktapara, sem útlagar
+#                   (t.d. hlaup með mjög ólíkri vegalengd) hnika lítið;
+#                   reiknað úr í mesta lagi 'sample' punktum
+import numpy as np
+
+class LinearTrend:
+    fields = ('n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx')
+
+    def __init__(self, n=0, sum_x=0.0, sum_y=0.0, sum_xy=0.0, sum_xx=0.0):
+        self.n = int(n)
+        self.sum_x = float(sum_x)
+        self.sum_y = float(sum_y)
+        self.sum_xy = float(sum_xy)
+        self.sum_xx = float(sum_xx)
+
+    # Summur punktanna (x, y); NaN gildi eru ekki tekin með
+    @classmethod
+    def fit(cls, x, y):
+        return cls().add(x, y)
+
+    def add(self, x, y, sign=1):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        keep = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[keep], y[keep]
+        self.n += sign * len(x)
+        self.sum_x += sign * x.sum()
+        self.sum_y += sign * y.sum()
+        self.sum_xy += sign * (x * y).sum()
+        self.sum_xx += sign * (x * x).sum()
+        return self
+
+    def remove(self, x, y):
+        return self.add(x, y, sign=-1)
+
+    def __add__(self, other):
+        return LinearTrend(*(getattr(self, name) + getattr(other, name) for name in self.fields))
+
+    # (slope, intercept), eða None ef punktarnir eru færri en tveir eða allir með sama x
+    def coefficients(self):
+        denominator = self.n * self.sum_xx - self.sum_x ** 2
+        if self.n < 2 or denominator <= 1e-12 * self.n * self.sum_xx:
+            return None
+        slope = (self.n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+        return slope, (self.sum_y - slope * self.sum_x) / self.n
+
+# Gildi aðfallslínu síðustu 'window' punkta (til og með punkti i) við x[i],
+# reiknað úr uppsöfnuðum summum í einni umferð. 'x' á að vera raðað.
+def rolling_trend(x, y, window):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Miðjað svo að uppsöfnuðu summurnar haldist litlar
+    x0, y0 = x.mean(), y.mean()
+    dx, dy = x - x0, y - y0
+    sums = [np.concatenate(([0.0], np.cumsum(values))) for values in (np.ones_like(dx), dx, dy, dx * dy, dx * dx)]
+    end = np.arange(1, len(x) + 1)
+    start = np.maximum(end - window, 0)
+    n, sx, sy, sxy, sxx = (total[end] - total[start] for total in sums)
+    denominator = n * sxx - sx ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator > 0, (n * sxy - sx * sy) / denominator, 0.0)
+    return y0 + (sy - slope * sx) / n + slope * dx
+
+# (slope, intercept) Theil–Sen línu, eða None ef ekki eru tveir punktar með
+# ólík x. Ef punktarnir eru fleiri en 'sample' eru jafndreifðir punktar
+# valdir (alltaf þeir sömu, svo myndin breytist ekki milli teikninga).
+def theil_sen(x, y, sample=200):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) > sample:
+        index = np.linspace(0, len(x) - 1, sample).astype(int)
+        x, y = x[index], y[index]
+    i, j = np.triu_indices(len(x), k=1)
+    dx = x[j] - x[i]
+    pairs = dx != 0
+    if not pairs.any():
+        return None
+    slope = np.median((y[j] - y[i])[pairs] / dx[pairs])
+    return slope, np.median(y - slope * x)